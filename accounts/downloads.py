@@ -0,0 +1,134 @@
+"""
+Delivery of the purchased digital files.
+
+`download_file` checks the order once and redirects to a signed URL that
+names the file and expires after DOWNLOAD_URL_MAX_AGE. The signed URL is
+served without any further lookups, so a download manager can resume or
+split the download with Range requests against it.
+
+The file is streamed from the storage in chunks, with ETag/Last-Modified
+and single byte range support. With DOWNLOAD_OFFLOAD set the response only
+carries an X-Sendfile or X-Accel-Redirect header and the front-end server
+sends the file (and handles the ranges) without holding a Python worker.
+"""
+import mimetypes
+import os
+import re
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import http_date, quote_etag
+
+
+DOWNLOAD_SALT = 'accounts.downloads'
+DOWNLOAD_URL_MAX_AGE = getattr(settings, 'DOWNLOAD_URL_MAX_AGE', 60 * 30)
+# None, 'x-sendfile' (apache mod_xsendfile) or 'x-accel-redirect' (nginx)
+DOWNLOAD_OFFLOAD = getattr(settings, 'DOWNLOAD_OFFLOAD', None)
+# the nginx `internal` location that maps to MEDIA_ROOT
+DOWNLOAD_ACCEL_PREFIX = getattr(settings, 'DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def signed_url(user_id, name):
+    token = signing.dumps({'u': user_id, 'f': name}, salt=DOWNLOAD_SALT, compress=True)
+    return reverse('accounts:download-signed', args=[token])
+
+
+def unsign(token):
+    # the stored file name, or None for a bad or expired token
+    try:
+        return signing.loads(token, salt=DOWNLOAD_SALT, max_age=DOWNLOAD_URL_MAX_AGE)['f']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def file_etag(size, modified):
+    return quote_etag(f'{size:x}-{int(modified):x}')
+
+
+def parse_range(header, size):
+    # (start, end) of a single satisfiable range, None to send everything,
+    # False when the range can not be satisfied
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(fh, start, length):
+    fh.seek(start)
+    try:
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def offload_response(name):
+    response = HttpResponse()
+    if DOWNLOAD_OFFLOAD == 'x-sendfile':
+        response['X-Sendfile'] = default_storage.path(name)
+    else:
+        response['X-Accel-Redirect'] = DOWNLOAD_ACCEL_PREFIX + name
+    # let the front-end server pick the type from the file
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, name):
+    filename = os.path.basename(name)
+    if DOWNLOAD_OFFLOAD:
+        response = offload_response(name)
+    else:
+        size = default_storage.size(name)
+        modified = default_storage.get_modified_time(name).timestamp()
+        etag = file_etag(size, modified)
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+        byte_range = None
+        header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # a changed file is sent whole instead of patching the old one
+        if header and (not if_range or if_range in (etag, http_date(modified))):
+            byte_range = parse_range(header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        fh = default_storage.open(name, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(fh, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = StreamingHttpResponse(
+                FileWrapper(fh, CHUNK_SIZE), content_type=content_type)
+            response['Content-Length'] = size
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private'
+    return response
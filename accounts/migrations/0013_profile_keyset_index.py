@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_auto_20220814_0432'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['status', 'date', 'id'], name='profile_status_date_id_idx'),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from PIL import Image
 from django.utils.translation import ugettext_lazy as _
 from django.utils.text import slugify
 from .utils import code_generator, create_shortcode
+from project.counts import invalidate_vendors_count
+from project.pagecache import receiver_for
 
 
 class Profile(models.Model):
@@ -48,6 +50,11 @@ class Profile(models.Model):
     slug = models.SlugField(
         blank=True, null=True, allow_unicode=True, unique=True, verbose_name=_("Slugfiy"))
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'date', 'id'], name='profile_status_date_id_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
 
@@ -80,6 +87,8 @@ def create_profile(sender, **kwargs):
 
 
 post_save.connect(create_profile, sender=User)
+post_save.connect(invalidate_vendors_count, sender=Profile)
+post_delete.connect(invalidate_vendors_count, sender=Profile)
 
 
 
@@ -108,3 +117,9 @@ class SocialLink(models.Model):
     twitter = models.CharField(max_length=200, blank=True, null=True, )
     instagram = models.CharField(max_length=200, blank=True, null=True, )
     pinterest = models.CharField(max_length=200, blank=True, null=True, )
+
+
+# anonymous page cache (project.pagecache)
+for page_model in (Profile, SocialLink):
+    post_save.connect(receiver_for('vendors'), sender=page_model, weak=False)
+    post_delete.connect(receiver_for('vendors'), sender=page_model, weak=False)
@@ -1,3 +1,117 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import downloads
+from .downloads import parse_range, serve_file, signed_url, unsign
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=10-5000', 1000), (10, 999))
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertIs(parse_range('bytes=-0', 1000), False)
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range('bytes=1000-', 1000), False)
+        self.assertIs(parse_range('bytes=5-2', 1000), False)
+
+    def test_unsupported_headers_send_everything(self):
+        self.assertIsNone(parse_range('bytes=-', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+
+
+class SignedUrlTests(TestCase):
+
+    def token(self, name):
+        return signed_url(1, name).rstrip('/').rsplit('/', 1)[-1]
+
+    def test_token_names_the_file(self):
+        self.assertEqual(unsign(self.token('products/files/a.zip')), 'products/files/a.zip')
+
+    def test_tampered_token(self):
+        token = self.token('products/files/a.zip')
+        self.assertIsNone(unsign(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+
+    def test_expired_token(self):
+        token = self.token('products/files/a.zip')
+        later = time.time() + downloads.DOWNLOAD_URL_MAX_AGE + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertIsNone(unsign(token))
+
+
+class ServeFileTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media)
+        self.settings_override.enable()
+        self.name = default_storage.save('products/files/a.zip', ContentFile(b'0123456789'))
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def serve(self, **headers):
+        return serve_file(self.factory.get('/', **headers), self.name)
+
+    def test_whole_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="a.zip"')
+
+    def test_range(self):
+        response = self.serve(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+    def test_suffix_range(self):
+        response = self.serve(HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_match_and_mismatch(self):
+        etag = self.serve()['ETag']
+        response = self.serve(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        # the file changed since the client started, it gets the whole file
+        response = self.serve(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_not_modified(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_accel_redirect_offload(self):
+        with mock.patch.object(downloads, 'DOWNLOAD_OFFLOAD', 'x-accel-redirect'):
+            response = self.serve()
+        self.assertEqual(response['X-Accel-Redirect'], downloads.DOWNLOAD_ACCEL_PREFIX + self.name)
+        self.assertNotIn('Content-Type', response)
+        self.assertEqual(response.content, b'')
+
+    def test_sendfile_offload(self):
+        with mock.patch.object(downloads, 'DOWNLOAD_OFFLOAD', 'x-sendfile'):
+            response = self.serve()
+        self.assertEqual(response['X-Sendfile'], default_storage.path(self.name))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="a.zip"')
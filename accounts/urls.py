@@ -34,6 +34,7 @@ urlpatterns = [
     path('download-list/', views.download_list, name="download-list"),
     path('download_file/<int:order_id>/<str:filename>/',
          views.download_file, name="download-file"),
+    path('download/<str:token>/', views.download_signed, name="download-signed"),
 
 
 ]
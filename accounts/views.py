@@ -3,7 +3,8 @@ from .forms import UserCreationForm, LoginForm
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from orders.models import Order, OrderDetails
+from orders.models import Order, OrderDetails, DigitalEntitlement, ArchivedOrder
+from orders.archive import archived_count, archived_order, paginate_with_archive
 from django.views.generic import View, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.http import JsonResponse
@@ -11,17 +12,14 @@ from django.http import HttpResponseRedirect
 from django.db.models import Q
 from django.contrib.auth.decorators import login_required
 from .models import Profile
+from project.counts import user_orders_count
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from PIL import Image
 from django.conf import settings
-from wsgiref.util import FileWrapper
-# Import mimetypes module
-import mimetypes
-# import os module
-import os
-# Import HttpResponse module
-from django.http.response import HttpResponse
+from django.core.files.storage import default_storage
+from django.http import Http404
+from .downloads import serve_file, signed_url, unsign
 
 # Create your views here.
 
@@ -234,13 +232,15 @@ def change_password(request):
 class MyOrdersJsonListView(LoginRequiredMixin, View):
     def get(self, *args, **kwargs):
 
-        upper = int(self.request.GET.get("num_products"))
-        lower = upper - 10
-        orders = list(Order.objects.all().filter(
-            user=self.request.user).values().order_by("-order_date")[lower:upper])
-        orders_size = len(Order.objects.all().filter(user=self.request.user))
-        max_size = True if upper >= orders_size else False
-        return JsonResponse({"data": orders,  "max": max_size, "orders_size": orders_size, }, safe=False)
+        orders = Order.objects.all().filter(user=self.request.user)
+        # older orders are read from the archive once these run out
+        archived = ArchivedOrder.objects.filter(user=self.request.user).values(
+            'id', 'order_date', 'amount', 'weight', 'is_finished', 'status', 'email_client')
+        page = paginate_with_archive(self.request, orders.values(), archived, "-order_date", 10)
+        orders_size = user_orders_count(orders, self.request.user.id) + archived_count(
+            f'orders:user:{self.request.user.id}', archived)
+        max_size = not page.has_next
+        return JsonResponse({"data": page.data,  "max": max_size, "orders_size": orders_size, "next_cursor": page.next_cursor, }, safe=False)
 
 
 def order(request, order_id):
@@ -262,25 +262,24 @@ def order(request, order_id):
         elif Order.objects.all().filter(id=order_id, user=request.user, is_finished=False):
             return redirect('orders:cart')
         else:
-            messages.warning(
-                request, "You don't have access to this page !")
-            return redirect('accounts:dashboard_customer')
+            archived = archived_order(order_id, request.user)
+            if archived is None:
+                messages.warning(
+                    request, "You don't have access to this page !")
+                return redirect('accounts:dashboard_customer')
+            order, order_details = archived
+            context = {
+                "order": order,
+                "order_details": order_details,
+                "total": sum(sub.price * sub.quantity for sub in order_details),
+            }
     return render(request, "accounts/order-archive.html", context)
 
 
 @login_required(login_url='accounts:login')
 def download_list(request):
-    order_list = Order.objects.all().filter(
-        user=request.user, is_finished=True).order_by("-order_date")
-    files = {}
-    for order in order_list:
-        print(order.id)
-        order_details = OrderDetails.objects.all().filter(order=order)
-        for file in order_details:
-            if file.product.digital_file:
-                files[int(order.id)] = str(
-                    file.product.digital_file.name.split('/')[-1])
-        print(files)
+    files = DigitalEntitlement.objects.filter(
+        user=request.user).values('order_id', 'filename')
     context = {
         "files": files,
     }
@@ -289,30 +288,27 @@ def download_list(request):
 
 @login_required(login_url='accounts:login')
 def download_file(request, order_id, filename):
-    if request.user.is_authenticated and not request.user.is_anonymous:
-        if Order.objects.all().filter(id=order_id, user=request.user, is_finished=True):
-            # Define Django project base directory
-            # BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            BASE_DIR = settings.MEDIA_ROOT
-            # Define the full file path
-            filepath = BASE_DIR + '/products/files/' + filename
-            # filepath = os.path.join(settings.MEDIA_ROOT, filename)
-            print(filepath)
-            # Open the file for reading content
-            # path = open(filepath, 'rb')
-            path = FileWrapper(open(filepath, 'rb'))
-            # Set the mime type
-            mime_type, _ = mimetypes.guess_type(filepath)
-            # Set the return value of the HttpResponse
-            response = HttpResponse(path, content_type=mime_type)
-            # Set the HTTP header for sending to browser
-            response['Content-Disposition'] = f"attachment; filename={filename}"
-            # Return the response value
-            return response
-
-        elif Order.objects.all().filter(id=order_id, user=request.user, is_finished=False):
-            return redirect('orders:cart')
-        else:
-            messages.warning(
-                request, "You don't have access to this page !")
-            return redirect('accounts:dashboard_customer')
+    # the purchase is checked here once, the file itself is sent from the
+    # signed url so resumed and split downloads skip the order lookups
+    name = DigitalEntitlement.objects.filter(
+        user=request.user, order_id=order_id, filename=filename,
+    ).values_list('file', flat=True).first()
+    if name:
+        return redirect(signed_url(request.user.id, name))
+    elif Order.objects.all().filter(id=order_id, user=request.user, is_finished=False):
+        return redirect('orders:cart')
+    else:
+        messages.warning(
+            request, "You don't have access to this page !")
+        return redirect('accounts:dashboard_customer')
+
+
+def download_signed(request, token):
+    name = unsign(token)
+    if name is None:
+        messages.warning(
+            request, "This download link has expired, please start the download again.")
+        return redirect('accounts:download-list')
+    if not default_storage.exists(name):
+        raise Http404
+    return serve_file(request, name)
@@ -4,11 +4,12 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from .utils import code_generator, create_shortcode
 from categories.models import SuperCategory
 from ckeditor.fields import RichTextField
 from accounts.models import Profile
+from project.pagecache import invalidate_pages
 # Create your models here.
 
 
@@ -81,4 +82,15 @@ class Comment (models.Model):
         ordering = ('-comment_date',)
 
 
+def blog_pages_receiver(sender, instance, *args, **kwargs):
+    # post_detail saves the view counter on every new visitor, that alone
+    # should not drop the cached blog pages
+    if kwargs.get('update_fields') == frozenset(['views']):
+        return
+    invalidate_pages('blog')
 
+
+post_save.connect(blog_pages_receiver, sender=Post)
+post_delete.connect(blog_pages_receiver, sender=Post)
+post_save.connect(blog_pages_receiver, sender=Comment)
+post_delete.connect(blog_pages_receiver, sender=Comment)
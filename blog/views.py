@@ -12,6 +12,8 @@ from reports.models import PostReport, PostView
 from django_user_agents.utils import get_user_agent
 # import requests
 from accounts.models import Profile
+from project.sampling import sample
+from project.pagecache import cache_anonymous_page
 # Create your views here.
 
 
@@ -27,6 +29,7 @@ def get_ip(request):
 
     return ip
 
+@cache_anonymous_page('blog')
 def home(request):
     posts = Post.objects.all()
     paginator = Paginator(posts, 16)
@@ -47,6 +50,7 @@ def home(request):
 
 
 
+@cache_anonymous_page('blog')
 def super_category(request, slug):
 
     super_category_obj = SuperCategory.objects.get(slug=slug)
@@ -72,7 +76,7 @@ def super_category(request, slug):
 
 def post_detail(request, slug):
     post = get_object_or_404(Post, post_Slug=slug)
-    random_posts = Post.objects.all().order_by("-post_date").order_by("?")[0:4]
+    random_posts = sample("posts", 4)
     user_agent = get_user_agent(request)  
     try:
 
@@ -96,7 +100,7 @@ def post_detail(request, slug):
         if not PostView.objects.filter(post=post,ip=get_ip(request)).exists() and user_agent.is_bot != True :
 
             post.views = post.views + 1
-            post.save()
+            post.save(update_fields=['views'])
             view_report.save()
 
             try:
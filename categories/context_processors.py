@@ -1,14 +1,10 @@
-
-from .models import SubCategory, MainCategory, SuperCategory, MiniCategory
+from .tree import get_tree
 
 
 def category_obj(request):
-    supercategory = SuperCategory.objects.all()
-    maincategory = MainCategory.objects.all()
-    subcategory = SubCategory.objects.all()
-    minicategory = MiniCategory.objects.all()
+    tree = get_tree()
     return {
-        'supercategory': supercategory,
-        'maincategory': maincategory,
-        'subcategory': subcategory,
-        'minicategory': minicategory, }
+        'supercategory': tree.supers,
+        'maincategory': tree.mains,
+        'subcategory': tree.subs,
+        'minicategory': tree.minis, }
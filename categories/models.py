@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 from .utils import code_generator, create_shortcode
@@ -136,3 +136,14 @@ class MiniCategory(models.Model):
                 self.slug = create_shortcode(self)
 
         super(MiniCategory, self).save(*args, **kwargs)
+
+
+def category_tree_receiver(sender, instance, *args, **kwargs):
+    # every worker rebuilds its category tree on the next request
+    from .tree import invalidate_tree
+    invalidate_tree()
+
+
+for category_model in (SuperCategory, MainCategory, SubCategory, MiniCategory):
+    post_save.connect(category_tree_receiver, sender=category_model)
+    post_delete.connect(category_tree_receiver, sender=category_model)
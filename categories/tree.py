@@ -0,0 +1,195 @@
+"""
+In-process category tree shared by the context processor, the category
+list page and the supplier panel category pickers.
+
+Every page used to get four full category querysets, and the templates
+nested them with `main.super_category == super`, which loaded the parent
+of each main category again. The tree is loaded once per process with one
+query per level (plus one grouped count per level), the parent and child
+links are resolved in python and the result is reused by every request.
+
+A category save or delete bumps a version number in the shared cache so
+every worker process rebuilds its copy on the next request. Product
+counts are only refreshed when the tree is rebuilt or after TREE_TIMEOUT.
+"""
+import threading
+import time
+
+from django.db.models import Count
+
+from project.cacheversion import bump_version, get_version
+from .models import SuperCategory, MainCategory, SubCategory, MiniCategory
+
+
+TREE_TIMEOUT = 60 * 15
+TREE_VERSION_KEY = 'category-tree'
+
+
+class CategoryImage:
+    # behaves like the ImageField file in templates: truthy, .name and .url
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+
+    def __bool__(self):
+        return bool(self.url)
+
+    def __str__(self):
+        return self.url
+
+
+class CategoryList(list):
+    # templates call `supercategory.count` like on the old querysets
+    def count(self):
+        return len(self)
+
+
+class CategoryNode:
+
+    def __init__(self, level, obj, parent_id):
+        self.level = level
+        self.id = obj.id
+        self.pk = obj.id
+        self.name = obj.name
+        self.slug = obj.slug
+        self.image_url = obj.category_image.url if obj.category_image else ''
+        self.category_image = CategoryImage(
+            obj.category_image.name if obj.category_image else '', self.image_url)
+        self.parent_id = parent_id
+        self.parent = None
+        self.children = CategoryList()
+        self.product_count = 0
+
+    def __str__(self):
+        return self.name or ''
+
+    def __repr__(self):
+        return f'<CategoryNode {self.level} {self.id}: {self.name}>'
+
+    # the old foreign key names, so `main.super_category` keeps working
+    @property
+    def super_category(self):
+        return self.parent if self.level == 'main' else None
+
+    @property
+    def main_category(self):
+        return self.parent if self.level == 'sub' else None
+
+    @property
+    def sub_category(self):
+        return self.parent if self.level == 'mini' else None
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'slug': self.slug,
+            'category_image': self.image_url,
+            'parent_id': self.parent_id,
+            'product_count': self.product_count,
+        }
+
+
+# (level name, model, parent foreign key, product foreign key)
+LEVELS = (
+    ('super', SuperCategory, None, 'product_supercategory'),
+    ('main', MainCategory, 'super_category', 'product_maincategory'),
+    ('sub', SubCategory, 'main_category', 'product_subcategory'),
+    ('mini', MiniCategory, 'sub_category', 'product_minicategor'),
+)
+
+
+class CategoryTree:
+
+    def __init__(self):
+        self.levels = {}
+        self.by_id = {}
+        self.by_slug = {}
+        parents = {}
+        for level, model, parent_field, _ in LEVELS:
+            nodes = CategoryList()
+            by_id = {}
+            for obj in model.objects.order_by('id'):
+                parent_id = getattr(obj, f'{parent_field}_id') if parent_field else None
+                node = CategoryNode(level, obj, parent_id)
+                parent = parents.get(parent_id)
+                if parent is not None:
+                    node.parent = parent
+                    parent.children.append(node)
+                nodes.append(node)
+                by_id[node.id] = node
+            self.levels[level] = nodes
+            self.by_id[level] = by_id
+            self.by_slug[level] = {node.slug: node for node in nodes if node.slug}
+            parents = by_id
+        self.count_products()
+
+    def count_products(self):
+        from products.models import Product
+
+        listed = Product.objects.filter(PRDISactive=True, PRDISDeleted=False).order_by()
+        for level, _, _, product_field in LEVELS:
+            nodes = self.by_id[level]
+            rows = listed.values(product_field).annotate(total=Count('id'))
+            for row in rows:
+                node = nodes.get(row[product_field])
+                if node is not None:
+                    node.product_count = row['total']
+
+    @property
+    def supers(self):
+        return self.levels['super']
+
+    @property
+    def mains(self):
+        return self.levels['main']
+
+    @property
+    def subs(self):
+        return self.levels['sub']
+
+    @property
+    def minis(self):
+        return self.levels['mini']
+
+    def get(self, level, pk):
+        try:
+            return self.by_id[level].get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def get_by_slug(self, level, slug):
+        return self.by_slug[level].get(slug)
+
+    def children_of(self, level, pk):
+        node = self.get(level, pk)
+        return node.children if node is not None else CategoryList()
+
+
+def tree_version():
+    return get_version(TREE_VERSION_KEY)
+
+
+def invalidate_tree(*args, **kwargs):
+    bump_version(TREE_VERSION_KEY)
+
+
+_loaded = None
+_lock = threading.Lock()
+
+
+def get_tree():
+    """
+    Returns the CategoryTree of this process, rebuilding it when another
+    process changed a category or the counts are older than TREE_TIMEOUT.
+    """
+    global _loaded
+    version = tree_version()
+    loaded = _loaded
+    if loaded is None or loaded[0] != version or loaded[1] < time.monotonic():
+        with _lock:
+            loaded = _loaded
+            if loaded is None or loaded[0] != version or loaded[1] < time.monotonic():
+                loaded = (version, time.monotonic() + TREE_TIMEOUT, CategoryTree())
+                _loaded = loaded
+    return loaded[2]
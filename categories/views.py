@@ -4,6 +4,11 @@ from .models import SubCategory, MainCategory, SuperCategory, MiniCategory
 from django.views.generic import View, TemplateView
 from products.models import Product
 from django.http import JsonResponse
+from project.pagination import paginate, clean_order_by
+from products.derivatives import add_srcset
+from project.counts import product_count
+from .tree import get_tree
+from project.pagecache import cache_anonymous_page
 # Create your views here.
 
 
@@ -12,6 +17,7 @@ def shop(request):
     return render(request, "categories/shop-grid-left.html")
 
 
+@cache_anonymous_page()
 def super_category(request, slug):
 
     super_category_obj = SuperCategory.objects.get(slug=slug)
@@ -27,6 +33,7 @@ def super_category(request, slug):
     return render(request, "categories/shop-super-category.html", context)
 
 
+@cache_anonymous_page()
 def main_category(request, slug):
 
     main_category_obj = MainCategory.objects.get(slug=slug)
@@ -41,6 +48,7 @@ def main_category(request, slug):
     return render(request, "categories/shop-main-category.html", context)
 
 
+@cache_anonymous_page()
 def sub_category(request, slug):
 
     sub_category_obj = SubCategory.objects.get(slug=slug)
@@ -56,15 +64,12 @@ def sub_category(request, slug):
 
 
 def category_list(request):
-    supercategory = SuperCategory.objects.all()
-    maincategory = MainCategory.objects.all()
-    subcategory = SubCategory.objects.all()
-    minicategory = MiniCategory.objects.all()
+    tree = get_tree()
     context = {
-        'supercategory': supercategory,
-        'maincategory': maincategory,
-        'subcategory': subcategory,
-        'minicategory': minicategory,
+        'supercategory': tree.supers,
+        'maincategory': tree.mains,
+        'subcategory': tree.subs,
+        'minicategory': tree.minis,
     }
 
     return render(request, "categories/category-list.html", context)
@@ -73,45 +78,25 @@ def category_list(request):
 class CategoryJsonListView(View):
     def get(self, *args, **kwargs):
 
-        upper = int(self.request.GET.get("num_products"))
-        orderd_by = self.request.GET.get("order_by")
+        orderd_by = clean_order_by(
+            self.request.GET.get("order_by"), ("date", "PRDPrice"), "-date")
         CAT_id = self.request.GET.get("CAT_id")
         CAT_type = self.request.GET.get("cat_type")
 
-        if CAT_type == "all":
-            lower = upper - 10
-            # print(lower, upper)
-            products = list(
-                Product.objects.all().filter(PRDISDeleted = False , PRDISactive = True ).values().order_by(orderd_by)[lower:upper])
-            products_size = len(Product.objects.all().filter(PRDISDeleted = False , PRDISactive = True ))
-            max_size = True if upper >= products_size else False
-            return JsonResponse({"data": products,  "max": max_size, "products_size": products_size, }, safe=False)
-
-        else:      # 3
-            lower = upper - 10
-            # print(lower, upper)
-            if CAT_type == "super":
-
-                products = list(
-                    Product.objects.all().filter(product_supercategory=int(CAT_id), PRDISDeleted = False , PRDISactive = True ).values().order_by(orderd_by)[lower:upper])
-                products_size = len(
-                    Product.objects.all().filter(product_supercategory=int(CAT_id), PRDISDeleted = False , PRDISactive = True ))
-            elif CAT_type == "main":
-                products = list(
-                    Product.objects.all().filter(product_maincategory=int(CAT_id), PRDISDeleted = False , PRDISactive = True ).values().order_by(orderd_by)[lower:upper])
-                products_size = len(
-                    Product.objects.all().filter(product_maincategory=int(CAT_id), PRDISDeleted = False , PRDISactive = True ))
-            elif CAT_type == "sub":
-                products = list(
-                    Product.objects.all().filter(product_subcategory=int(CAT_id), PRDISDeleted = False , PRDISactive = True ).values().order_by(orderd_by)[lower:upper])
-                products_size = len(
-                    Product.objects.all().filter(product_subcategory=int(CAT_id), PRDISDeleted = False , PRDISactive = True ))
-
-            else:
-                products = list(
-                    Product.objects.all().filter(product_minicategor=int(CAT_id), PRDISDeleted = False , PRDISactive = True ).values().order_by(orderd_by)[lower:upper])
-                products_size = len(
-                    Product.objects.all().filter(product_minicategor=int(CAT_id), PRDISDeleted = False , PRDISactive = True ))
-
-            max_size = True if upper >= products_size else False
-            return JsonResponse({"data": products, "max": max_size, "products_size": products_size, }, safe=False)
+        products = Product.objects.all().filter(PRDISDeleted = False , PRDISactive = True )
+        if CAT_type == "super":
+            products = products.filter(product_supercategory=int(CAT_id))
+        elif CAT_type == "main":
+            products = products.filter(product_maincategory=int(CAT_id))
+        elif CAT_type == "sub":
+            products = products.filter(product_subcategory=int(CAT_id))
+        elif CAT_type != "all":
+            CAT_type = "mini"
+            products = products.filter(product_minicategor=int(CAT_id))
+        products_size = product_count(
+            products, CAT_type, None if CAT_type == "all" else int(CAT_id))
+
+        page = paginate(self.request, products.values(), orderd_by, 10)
+        add_srcset(page.data, 'product_image')
+        max_size = not page.has_next
+        return JsonResponse({"data": page.data, "max": max_size, "products_size": products_size, "next_cursor": page.next_cursor, }, safe=False)
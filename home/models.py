@@ -1,6 +1,9 @@
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from accounts.models import Profile
+from django.db.models.signals import post_save, post_delete
+from project.chrome import invalidate_chrome
+from project.pagecache import receiver_for
 # Create your models here.
 
 
@@ -238,4 +241,16 @@ class HeadTextAd(models.Model):
         verbose_name_plural = _("Head Text Ads")
 
     def __str__(self):
-        return str(self.id)
\ No newline at end of file
+        return str(self.id)
+
+
+# the site chrome snapshot (project.chrome) holds these rows
+for chrome_model in (HomeAdDealTime, VendorDetailsAdImage, ShopAdSidebar, HotDealAd, HeadTextAd):
+    post_save.connect(invalidate_chrome, sender=chrome_model)
+    post_delete.connect(invalidate_chrome, sender=chrome_model)
+
+
+# anonymous page cache (project.pagecache)
+for page_model in (Carousel, HomeAdSidebar, HomeAdMiddlebar, HomeAdSupplier, HomeAdDaily, HomeAdDealTime):
+    post_save.connect(receiver_for('home'), sender=page_model, weak=False)
+    post_delete.connect(receiver_for('home'), sender=page_model, weak=False)
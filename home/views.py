@@ -1,32 +1,34 @@
 
 from django.shortcuts import render
-from categories.models import SuperCategory, MainCategory
-from .models import (Carousel, HomeAdSidebar, HomeAdMiddlebar,
-                     HomeAdSupplier, HomeAdDaily, HomeAdDealTime)
+from .models import Carousel, HomeAdSidebar
 from products.models import Product
 from django.http import HttpResponseRedirect
 from django.conf import settings
-from settings.models import HomePageTheme
 import random
+from project.sampling import sample
+from project.chrome import get_snapshot
+from project.pagecache import cache_anonymous_page
 # Create your views here.
 
 
+@cache_anonymous_page('home', 'products')
 def home_page(request):
     if not request.session.has_key('currency'):
         request.session['currency'] = settings.DEFAULT_CURRENCY
-    super_category = SuperCategory.objects.all().order_by("?")
+    super_category = sample("super_categories")
     carousels = Carousel.objects.all()
     home_ads_left = HomeAdSidebar.objects.all().filter(
         image_position="Left")[0:1]
     home_ads_right = HomeAdSidebar.objects.all().filter(
         image_position="Right")[0:1]
-    home_ad_middlebar = HomeAdMiddlebar.objects.all().order_by("?")
-    main_category = MainCategory.objects.all().order_by("?")
-    products = Product.objects.all().filter(PRDISactive=True).order_by("?")
-    home_ad_suppliers = HomeAdSupplier.objects.all().order_by("?")
-    home_ad_daily = HomeAdDaily.objects.all().order_by("?")
-    home_ads_deal_time = HomeAdDealTime.objects.all().order_by("?")
-    index = str(HomePageTheme.objects.all().filter(active=True).first())
+    home_ad_middlebar = sample("home_ad_middlebar", 3)
+    main_category = sample("main_categories")
+    products = sample("products", 10, Product.objects.select_related(
+        "product_vendor", "product_supercategory"))
+    home_ad_suppliers = sample("home_ad_supplier", 4)
+    home_ad_daily = sample("home_ad_daily", 1)
+    home_ads_deal_time = sample("home_ad_deal_time", 4)
+    index = get_snapshot()['home_theme']
     context = {
         "super_category": super_category,
         "carousels": carousels,
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Order, OrderDetails, Payment, Coupon, OrderSupplier, OrderDetailsSupplier
+from .models import Order, OrderDetails, Payment, Coupon, OrderSupplier, OrderDetailsSupplier, OutboxJob
 
 
 class Inline_OrderDetails(admin.StackedInline):
@@ -92,3 +92,17 @@ class OrderAdminSupplier(admin.ModelAdmin):
 
 
 admin.site.register(OrderSupplier, OrderAdminSupplier)
+
+
+class OutboxJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'dedupe_key', 'status',
+                    'attempts', 'run_after', 'date', 'done_at')
+    list_filter = ('kind', 'status')
+    # a FAILED job is retried by setting it back to PENDING
+    list_editable = ("status",)
+    readonly_fields = ('kind', 'payload', 'dedupe_key', 'attempts', 'last_error', 'date', 'done_at')
+    search_fields = ('dedupe_key', )
+    list_per_page = 10
+
+
+admin.site.register(OutboxJob, OutboxJobAdmin)
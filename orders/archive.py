@@ -0,0 +1,187 @@
+"""
+Housekeeping of the order tables.
+
+Every visit that reached the checkout left an unfinished Order behind, and
+finished orders stayed in the tables the admin, the dashboards and the
+webhooks scan forever. `purge_abandoned_carts` deletes carts nobody touched
+for ABANDONED_CART_DAYS, `archive_finished_orders` moves finished orders
+older than ORDER_ARCHIVE_DAYS into ArchivedOrder / ArchivedOrderSupplier,
+one JSON document per order and vendor order. Both work in batches of
+short transactions, from the archive_orders command or the nightly beat
+task.
+
+The customer and vendor order pages fall back to the archive: the rows are
+rebuilt as unsaved model instances, so the templates render them as
+before, and the "load more" lists page into the archive once the live
+orders are exhausted.
+"""
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from project.counts import listing_count
+from project.pagination import InvalidCursor, KeysetPage, KeysetPaginator, paginate
+from .cart import CartLines
+from .models import (
+    ArchivedOrder, ArchivedOrderSupplier, Order, OrderDetails, OrderDetailsSupplier,
+    OrderSupplier, Payment)
+
+
+ABANDONED_CART_DAYS = getattr(settings, 'ABANDONED_CART_DAYS', 30)
+ORDER_ARCHIVE_DAYS = getattr(settings, 'ORDER_ARCHIVE_DAYS', 365 * 2)
+BATCH_SIZE = 500
+
+# cursors of the archive pages, never part of a base64 keyset cursor
+ARCHIVE_CURSOR = 'a~'
+
+_state = threading.local()
+
+
+def is_archiving(order_id):
+    return order_id in getattr(_state, 'archiving', ())
+
+
+def purge_abandoned_carts(days=ABANDONED_CART_DAYS, batch_size=BATCH_SIZE):
+    # returns the number of carts deleted
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = Order.objects.filter(is_finished=False, date_update__lt=cutoff).order_by('id')
+    deleted = 0
+    while True:
+        ids = list(stale.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            # a cart touched since the select is no longer abandoned
+            _, per_model = Order.objects.filter(
+                pk__in=ids, is_finished=False, date_update__lt=cutoff).delete()
+        deleted += per_model.get(Order._meta.label, 0)
+
+
+def grouped(queryset, key):
+    rows = defaultdict(list)
+    for row in queryset.values():
+        rows[row[key]].append(row)
+    return rows
+
+
+def archive_batch(ids):
+    orders = list(Order.objects.filter(pk__in=ids, is_finished=True).values())
+    ids = [order['id'] for order in orders]
+    details = grouped(OrderDetails.objects.filter(order_id__in=ids), 'order_id')
+    payments = grouped(Payment.objects.filter(order_id__in=ids), 'order_id')
+    suppliers = grouped(OrderSupplier.objects.filter(order_id__in=ids), 'order_id')
+    supplier_lines = grouped(
+        OrderDetailsSupplier.objects.filter(order_id__in=ids), 'order_supplier_id')
+
+    archived = []
+    archived_suppliers = []
+    for order in orders:
+        archived.append(ArchivedOrder(
+            id=order['id'], user_id=order['user_id'], email_client=order['email_client'],
+            order_date=order['order_date'], amount=order['amount'], weight=order['weight'],
+            status=order['status'], data={
+                'order': order,
+                'details': details[order['id']],
+                'payment': (payments[order['id']] or [None])[0],
+            }))
+        for supplier in suppliers[order['id']]:
+            archived_suppliers.append(ArchivedOrderSupplier(
+                id=supplier['id'], order_id=order['id'], vendor_id=supplier['vendor_id'],
+                email_client=supplier['email_client'], order_date=supplier['order_date'],
+                amount=supplier['amount'], weight=supplier['weight'],
+                is_finished=supplier['is_finished'], status=supplier['status'], data={
+                    'order_supplier': supplier,
+                    'lines': supplier_lines[supplier['id']],
+                }))
+
+    with transaction.atomic():
+        ArchivedOrder.objects.bulk_create(archived, ignore_conflicts=True)
+        ArchivedOrderSupplier.objects.bulk_create(archived_suppliers, ignore_conflicts=True)
+        _state.archiving = set(ids)
+        try:
+            Order.objects.filter(pk__in=ids).delete()
+        finally:
+            _state.archiving = set()
+    return len(ids)
+
+
+def archive_finished_orders(days=ORDER_ARCHIVE_DAYS, batch_size=BATCH_SIZE):
+    # returns the number of orders moved to the archive
+    cutoff = timezone.now() - timedelta(days=days)
+    old = Order.objects.filter(is_finished=True, order_date__lt=cutoff).order_by('id')
+    moved = 0
+    while True:
+        ids = list(old.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return moved
+        moved += archive_batch(ids)
+
+
+def restore(model, values):
+    # an unsaved instance of `model` from a row stored in the archive
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    return model(**{name: fields[name].to_python(value)
+                    for name, value in values.items() if name in fields})
+
+
+def restore_lines(model, rows):
+    lines = CartLines(restore(model, row) for row in rows)
+    products = Product.objects.in_bulk({line.product_id for line in lines if line.product_id})
+    for line in lines:
+        if line.product_id in products:
+            line.product = products[line.product_id]
+    return lines
+
+
+def archived_order(order_id, user):
+    # (order, lines) of an archived order of `user`, or None
+    archived = ArchivedOrder.objects.filter(id=order_id, user=user).first()
+    if archived is None:
+        return None
+    return (restore(Order, archived.data['order']),
+            restore_lines(OrderDetails, archived.data['details']))
+
+
+def archived_supplier_order(order_supplier_id, vendor, supplier):
+    # (order supplier, lines of `supplier`, payment) of an archived vendor order, or None
+    archived = ArchivedOrderSupplier.objects.select_related('order').filter(
+        id=order_supplier_id, vendor=vendor).first()
+    if archived is None:
+        return None
+    lines = [row for row in archived.data['lines'] if row['supplier_id'] == supplier.id]
+    payment = archived.order.data['payment']
+    return (restore(OrderSupplier, archived.data['order_supplier']),
+            restore_lines(OrderDetailsSupplier, lines),
+            restore(Payment, payment) if payment else None)
+
+
+def paginate_with_archive(request, queryset, archived, order_by, page_size):
+    """
+    Pages `queryset` and then `archived`, the same listing in the archive.
+    Archive cursors carry ARCHIVE_CURSOR in front, so the "load more"
+    scripts walk into the archive without knowing about it.
+    """
+    cursor = request.GET.get('cursor') or ''
+    if not cursor.startswith(ARCHIVE_CURSOR):
+        page = paginate(request, queryset, order_by, page_size)
+        if page.has_next or not archived.exists():
+            return page
+        return KeysetPage(page.data, True, ARCHIVE_CURSOR)
+    paginator = KeysetPaginator(archived, order_by, page_size)
+    try:
+        page = paginator.page(cursor[len(ARCHIVE_CURSOR):] or None)
+    except InvalidCursor:
+        page = paginator.page()
+    if page.next_cursor:
+        page.next_cursor = ARCHIVE_CURSOR + page.next_cursor
+    return page
+
+
+def archived_count(namespace, queryset, *parts):
+    # counted next to the live orders, invalidated with them
+    return listing_count(namespace, queryset, 'archived', *parts)
@@ -0,0 +1,447 @@
+"""
+Request scoped access to the open cart (the unfinished Order).
+
+The header shows the cart on every page, so the context processor used to
+run three or four queries per request, for anonymous visitors too. The
+item count for the badge is now kept in the cache and only recounted after
+the cart changed; the order and its lines (with their products) are loaded
+in a single query, and only when a template actually reads them. A visitor
+without a cart costs nothing.
+
+Visitors without an account get a SessionCart: the items live in their
+session until checkout starts, and only then (`start_checkout`) are the
+order, vendor order and line rows written, with bulk inserts. A login
+merges the session cart into the user's cart the same way.
+
+`add_item` and `remove_line` change the cart inside one transaction that
+holds a lock on the order row. The totals of the order and of its
+per-vendor OrderSupplier rows are written back with one UPDATE each from
+aggregates, so a click costs the same number of queries for one
+line or a hundred.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    CharField, DecimalField, Exists, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value)
+from django.db.models.functions import Cast, Coalesce
+from decimal import Decimal
+
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from products.models import Product
+from .models import Coupon, Order, OrderDetails, OrderDetailsSupplier, OrderSupplier
+
+
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def cart_count_key(user_id=None, order_id=None):
+    if user_id is not None:
+        return f'cart-count:user:{user_id}'
+    return f'cart-count:order:{order_id}'
+
+
+def invalidate_cart_count(user_id=None, order_id=None):
+    keys = [cart_count_key(order_id=order_id)]
+    if user_id is not None:
+        keys.append(cart_count_key(user_id=user_id))
+    cache.delete_many(keys)
+
+
+def open_orders(user_id=None, order_id=None):
+    if user_id is not None:
+        return Order.objects.filter(user_id=user_id, is_finished=False).order_by('-id')
+    return Order.objects.filter(id=order_id, is_finished=False)
+
+
+def current_order(user_id=None, order_id=None):
+    if user_id is None and order_id is None:
+        return None
+    return open_orders(user_id, order_id).first()
+
+
+def cart_lines(user_id=None, order_id=None):
+    # the subquery keeps it to one query for logged in users as well
+    open_order = open_orders(user_id, order_id).values('id')[:1]
+    return OrderDetails.objects.filter(order_id=Subquery(open_order))
+
+
+def cart_count(user_id=None, order_id=None):
+    if user_id is None and order_id is None:
+        return 0
+    key = cart_count_key(user_id, order_id)
+    count = cache.get(key)
+    if count is None:
+        count = cart_lines(user_id, order_id).count()
+        cache.set(key, count, CART_COUNT_TIMEOUT)
+    return count
+
+
+SESSION_CART_KEY = 'cart'
+
+
+class CartLines(list):
+    # templates call `order_details.count` like on the queryset
+    def count(self):
+        return len(self)
+
+
+class SessionLine:
+    # reads like an OrderDetails row in the templates, `id` is the product id
+
+    def __init__(self, product, quantity, size):
+        self.id = product.id
+        self.product = product
+        self.quantity = quantity
+        self.size = size
+        self.price = product.PRDPrice
+        self.weight = product.PRDWeight
+
+
+class SessionOrder:
+    # the order fields the templates read, for a cart that has no Order yet
+    id = None
+
+    def __init__(self, lines):
+        self.sub_total = sum(line.price * line.quantity for line in lines)
+        self.weight = sum(line.weight * line.quantity for line in lines)
+        self.amount = self.sub_total
+
+
+class SessionCart:
+    """
+    The cart of a visitor without an account. The session stores
+    {product id: {'quantity': n, 'size': size}} and is read through the
+    cache (cached_db sessions), so adding to it costs no order rows.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.items = dict(session.get(SESSION_CART_KEY) or {})
+
+    def __len__(self):
+        return len(self.items)
+
+    def save(self):
+        if self.items:
+            self.session[SESSION_CART_KEY] = self.items
+        else:
+            self.session.pop(SESSION_CART_KEY, None)
+        self.__dict__.pop('lines', None)
+
+    def add(self, product, quantity, size=None):
+        # the same rules as add_item, returns (ADDED or LIMIT, quantity)
+        item = self.items.get(str(product.id))
+        current = item['quantity'] if item else 0
+        if item and current >= product.available:
+            return LIMIT, current
+        quantity = min(current + quantity, product.available)
+        self.items[str(product.id)] = {
+            'quantity': quantity, 'size': item['size'] if item else size}
+        self.save()
+        return ADDED, quantity
+
+    def remove(self, product_id):
+        if self.items.pop(str(product_id), None) is None:
+            return False
+        self.save()
+        return 'order' if not self.items else True
+
+    def clear(self):
+        self.items = {}
+        self.save()
+
+    @cached_property
+    def lines(self):
+        if not self.items:
+            return CartLines()
+        products = Product.objects.in_bulk([int(product_id) for product_id in self.items])
+        return CartLines(
+            SessionLine(products[int(product_id)], item['quantity'], item['size'])
+            for product_id, item in self.items.items() if int(product_id) in products)
+
+    def order(self):
+        return SessionOrder(self.lines)
+
+
+class RequestCart:
+
+    def __init__(self, request):
+        user = request.user
+        self.user_id = user.id if user.is_authenticated else None
+        self.order_id = None if self.user_id else request.session.get('cart_id')
+        self.session_cart = None
+        if self.user_id is None and self.order_id is None:
+            self.session_cart = SessionCart(request.session)
+
+    @property
+    def exists(self):
+        if self.session_cart is not None:
+            return bool(self.session_cart)
+        return self.user_id is not None or self.order_id is not None
+
+    @cached_property
+    def count(self):
+        if self.session_cart is not None:
+            return len(self.session_cart)
+        return cart_count(self.user_id, self.order_id)
+
+    @cached_property
+    def lines(self):
+        if not self.exists or not self.count:
+            return []
+        if self.session_cart is not None:
+            return self.session_cart.lines
+        return list(cart_lines(self.user_id, self.order_id).select_related(
+            'order', 'product'))
+
+    @cached_property
+    def order(self):
+        if self.lines:
+            if self.session_cart is not None:
+                return self.session_cart.order()
+            return self.lines[0].order
+        return None
+
+
+LINE_TOTAL = ExpressionWrapper(
+    F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+LINE_WEIGHT = ExpressionWrapper(
+    F('weight') * F('quantity'), output_field=DecimalField(max_digits=13, decimal_places=3))
+
+
+def summed(model, group, expression):
+    # the sum of `expression` over the lines of the outer row
+    lines = model.objects.filter(**{group: OuterRef('pk')}).order_by().values(group)
+    total = lines.annotate(total=Sum(expression)).values('total')
+    return Coalesce(Subquery(total), Value(0), output_field=expression.output_field)
+
+
+def as_text(expression):
+    # sub_total and amount are char columns
+    return Cast(expression, output_field=CharField(max_length=50))
+
+
+def recompute_totals(order_id):
+    """
+    Writes sub_total, amount, discount and weight of the order and amount
+    and weight of each of its vendor orders from the lines. The applied
+    coupon stays applied: amount and discount come from store_totals, as
+    on the cart page.
+    """
+    sub_total, weight = order_totals(order_id)
+    coupon = Coupon.objects.filter(order=order_id).first()
+    store_totals(order_id, sub_total, weight, coupon)
+    OrderSupplier.objects.filter(order_id=order_id, is_finished=False).update(
+        amount=as_text(summed(OrderDetailsSupplier, 'order_supplier', LINE_TOTAL)),
+        weight=summed(OrderDetailsSupplier, 'order_supplier', LINE_WEIGHT))
+
+
+def order_totals(order_id):
+    # (sub total, weight) of the cart lines in one aggregate query
+    totals = OrderDetails.objects.filter(order_id=order_id).aggregate(
+        sub_total=Sum(LINE_TOTAL), weight=Sum(LINE_WEIGHT))
+    return totals['sub_total'] or 0, totals['weight'] or 0
+
+
+def coupon_totals(sub_total, coupon):
+    # (amount, discount) after the coupon, the discount is None without one
+    if coupon is None:
+        return sub_total, None
+    value = (coupon.discount / Decimal("100")) * sub_total
+    return sub_total - value, value
+
+
+def store_totals(order_id, sub_total, weight, coupon=None):
+    # one UPDATE without signals, returns (amount, discount)
+    total, value = coupon_totals(sub_total, coupon)
+    # update() skips auto_now, date_update tells the cart purge it is in use
+    Order.objects.filter(pk=order_id).update(
+        amount=total, discount=value or 0, sub_total=sub_total, weight=weight,
+        coupon=coupon, date_update=timezone.now())
+    return total, value
+
+
+def lock_order(order_id):
+    # concurrent clicks on the same cart are applied one after the other
+    return list(Order.objects.select_for_update().filter(pk=order_id).values_list('pk', flat=True))
+
+
+def create_order(user=None):
+    order = Order(amount=0)
+    if user is not None:
+        order.user = user
+        order.email_client = user.email
+    order.save()
+    return order
+
+
+ADDED = 'added'
+LIMIT = 'limit'
+
+
+def add_item(order, product, quantity, size=None, user=None):
+    """
+    Adds `quantity` of `product` (fetched with its product_vendor) to the
+    cart, capped at the stock. Returns (ADDED or LIMIT, quantity in cart).
+    """
+    with transaction.atomic():
+        lock_order(order.pk)
+        line = OrderDetails.objects.filter(order=order, product=product).values_list(
+            'id', 'quantity').first()
+        if line is not None:
+            line_id, current = line
+            if current >= product.available:
+                return LIMIT, current
+            quantity = min(current + quantity, product.available)
+            OrderDetails.objects.filter(pk=line_id).update(quantity=quantity)
+            OrderDetailsSupplier.objects.filter(order=order, product=product).update(
+                quantity=quantity)
+        else:
+            vendor = product.product_vendor
+            order_supplier = OrderSupplier.objects.filter(
+                order=order, vendor=vendor, is_finished=False).first()
+            if order_supplier is None:
+                order_supplier = OrderSupplier(order=order, vendor=vendor, amount=0)
+                if user is not None:
+                    order_supplier.user = user
+                    order_supplier.email_client = user.email
+                order_supplier.save()
+            line = dict(supplier_id=vendor.user_id, product=product, order=order,
+                        price=product.PRDPrice, quantity=quantity, size=size,
+                        weight=product.PRDWeight)
+            order_details = OrderDetails.objects.create(**line)
+            OrderDetailsSupplier.objects.create(
+                order_supplier=order_supplier, order_details=order_details, **line)
+        recompute_totals(order.pk)
+    return ADDED, quantity
+
+
+def remove_line(order, line_id):
+    """
+    Removes one line of the cart. Returns False when the line is not in
+    the cart, 'order' when it was the last line and the order is gone,
+    True otherwise.
+    """
+    with transaction.atomic():
+        lock_order(order.pk)
+        # the OrderDetailsSupplier row goes with it (cascade)
+        deleted, _ = OrderDetails.objects.filter(pk=line_id, order=order).delete()
+        if not deleted:
+            return False
+        if not OrderDetails.objects.filter(order=order).exists():
+            order.delete()
+            return 'order'
+        OrderSupplier.objects.filter(order=order, is_finished=False).filter(
+            ~Exists(OrderDetailsSupplier.objects.filter(order_supplier=OuterRef('pk')))).delete()
+        recompute_totals(order.pk)
+    return True
+
+
+def write_lines(order, items, user=None):
+    """
+    Adds session cart `items` to the order with bulk queries, for the
+    checkout of a session cart and the merge after a login. Quantities of
+    products already in the order are added up, capped at the stock.
+    """
+    with transaction.atomic():
+        lock_order(order.pk)
+        products = Product.objects.select_related('product_vendor').in_bulk(
+            [int(product_id) for product_id in items])
+        lines = {line.product_id: line for line in OrderDetails.objects.filter(
+            order=order, product_id__in=products)}
+        supplier_lines = {line.order_details_id: line for line in OrderDetailsSupplier.objects.filter(
+            order=order, order_details__in=lines.values())}
+        changed = []
+        new = []
+        for product_id, item in items.items():
+            product = products.get(int(product_id))
+            if product is None or product.product_vendor_id is None or product.available <= 0:
+                continue
+            line = lines.get(product.id)
+            if line is not None:
+                quantity = min(line.quantity + item['quantity'], product.available)
+                if quantity != line.quantity:
+                    line.quantity = quantity
+                    changed.append(line)
+            else:
+                new.append((product, min(item['quantity'], product.available), item.get('size')))
+
+        if changed:
+            OrderDetails.objects.bulk_update(changed, ['quantity'])
+            for line in changed:
+                if line.id in supplier_lines:
+                    supplier_lines[line.id].quantity = line.quantity
+            OrderDetailsSupplier.objects.bulk_update(
+                [supplier_lines[line.id] for line in changed if line.id in supplier_lines],
+                ['quantity'])
+
+        if new:
+            # the inserted ids are read back, bulk_create only returns them on postgres
+            vendor_ids = {product.product_vendor_id for product, _, _ in new}
+            suppliers = OrderSupplier.objects.filter(
+                order=order, is_finished=False, vendor_id__in=vendor_ids)
+            vendor_orders = dict(suppliers.values_list('vendor_id', 'id'))
+            missing = vendor_ids - set(vendor_orders)
+            if missing:
+                OrderSupplier.objects.bulk_create([
+                    OrderSupplier(order=order, vendor_id=vendor_id, amount=0, user=user,
+                                  email_client=user.email if user else None)
+                    for vendor_id in missing])
+                vendor_orders = dict(suppliers.values_list('vendor_id', 'id'))
+            OrderDetails.objects.bulk_create([
+                OrderDetails(supplier_id=product.product_vendor.user_id, product=product,
+                             order=order, price=product.PRDPrice, quantity=quantity,
+                             size=size, weight=product.PRDWeight)
+                for product, quantity, size in new])
+            details = dict(OrderDetails.objects.filter(
+                order=order, product_id__in=[product.id for product, _, _ in new]).values_list(
+                'product_id', 'id'))
+            OrderDetailsSupplier.objects.bulk_create([
+                OrderDetailsSupplier(
+                    supplier_id=product.product_vendor.user_id, product=product, order=order,
+                    order_supplier_id=vendor_orders[product.product_vendor_id],
+                    order_details_id=details[product.id], price=product.PRDPrice,
+                    quantity=quantity, size=size, weight=product.PRDWeight)
+                for product, quantity, size in new])
+        recompute_totals(order.pk)
+    # bulk writes send no signals
+    invalidate_cart_count(order.user_id, order.pk)
+
+
+def start_checkout(request):
+    """
+    Turns the session cart into an Order when checkout starts and leaves
+    its id in the session as `cart_id`, like a cart that was in the
+    database all along.
+    """
+    session_cart = SessionCart(request.session)
+    if not session_cart:
+        return request.session.get('cart_id')
+    user = request.user if request.user.is_authenticated else None
+    order = current_order(user.id if user else None, request.session.get('cart_id'))
+    if order is None:
+        order = create_order(user)
+    write_lines(order, session_cart.items, user)
+    coupon = None
+    if request.session.get('coupon_id'):
+        coupon = Coupon.objects.filter(id=request.session['coupon_id']).first()
+    sub_total, weight = order_totals(order.pk)
+    store_totals(order.pk, sub_total, weight, coupon)
+    session_cart.clear()
+    request.session['cart_id'] = order.pk
+    return order.pk
+
+
+def merge_session_cart(request, user):
+    # after a login the items picked before go into the user's cart
+    session_cart = SessionCart(request.session)
+    if not session_cart:
+        return
+    order = current_order(user.id)
+    if order is None:
+        order = create_order(user)
+    write_lines(order, session_cart.items, user)
+    session_cart.clear()
+    request.session['cart_id'] = order.pk
@@ -0,0 +1,235 @@
+"""
+Outbound HTTP calls to the payment gateways and the carrier.
+
+The views called `requests.post`/`requests.get` directly: a new TCP and
+TLS connection for every call, no timeout, so a hung upstream held the
+worker for good, and no retry for a dropped connection. Every call now
+goes through `request(upstream, ...)`:
+
+- one `requests.Session` per upstream keeps its connections alive in a
+  pool of GATEWAY_POOL_SIZE;
+- every call has a (connect, read) timeout, GATEWAY_TIMEOUTS per upstream;
+- failed connections are retried GATEWAY_RETRIES times with a jittered
+  backoff, read timeouts and 5xx/429 answers only for idempotent calls
+  (GET, or `idempotent=True` for the read-only Aramex POSTs);
+- after GATEWAY_BREAKER_THRESHOLD failed calls in a row the upstream's
+  circuit opens and calls fail at once with GatewayUnavailable for
+  GATEWAY_BREAKER_RESET seconds, then one trial call decides;
+- the calls, failures and latency buckets per upstream are counted in the
+  cache, `gateway_metrics` prints them.
+
+The razorpay client makes its own calls; it gets the pooled session of
+its upstream with the timeouts, without the retries and the circuit.
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+GATEWAY_TIMEOUTS = getattr(settings, 'GATEWAY_TIMEOUTS', {})
+DEFAULT_TIMEOUT = (3.05, 15)
+GATEWAY_POOL_SIZE = getattr(settings, 'GATEWAY_POOL_SIZE', 10)
+GATEWAY_RETRIES = getattr(settings, 'GATEWAY_RETRIES', 2)
+GATEWAY_BREAKER_THRESHOLD = getattr(settings, 'GATEWAY_BREAKER_THRESHOLD', 5)
+GATEWAY_BREAKER_RESET = getattr(settings, 'GATEWAY_BREAKER_RESET', 30)
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 2
+
+UPSTREAMS = ('aramex', 'paymob', 'paypal', 'myfatoorah', 'razorpay')
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# upper bounds of the latency buckets in ms, the last one is open
+LATENCY_BUCKETS = (100, 300, 1000, 3000)
+METRICS_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class GatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(GatewayError):
+    # the circuit of the upstream is open
+    pass
+
+
+def timeout_for(upstream):
+    return GATEWAY_TIMEOUTS.get(upstream, GATEWAY_TIMEOUTS.get('default', DEFAULT_TIMEOUT))
+
+
+class GatewaySession(requests.Session):
+    # applies the upstream's timeout to calls made by third party clients
+    # (razorpay) that do not pass one
+
+    def __init__(self, upstream):
+        super().__init__()
+        self.upstream = upstream
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GATEWAY_POOL_SIZE)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', timeout_for(self.upstream))
+        return super().request(method, url, **kwargs)
+
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def session(upstream):
+    if upstream not in _sessions:
+        with _lock:
+            if upstream not in _sessions:
+                _sessions[upstream] = GatewaySession(upstream)
+    return _sessions[upstream]
+
+
+class Breaker:
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < GATEWAY_BREAKER_RESET or self.trial:
+                return False
+            # half open, one call finds out whether the upstream is back
+            self.trial = True
+            return True
+
+    def record(self, ok):
+        with self.lock:
+            self.trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= GATEWAY_BREAKER_THRESHOLD:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.trial else 'open'
+
+
+_breakers = {}
+
+
+def breaker(upstream):
+    if upstream not in _breakers:
+        with _lock:
+            _breakers.setdefault(upstream, Breaker())
+    return _breakers[upstream]
+
+
+def metric_key(upstream, name):
+    return f'gateway:{upstream}:{name}'
+
+
+def count(upstream, name, value=1):
+    key = metric_key(upstream, name)
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        if not cache.add(key, value, METRICS_TIMEOUT):
+            cache.incr(key, value)
+
+
+def record_call(upstream, elapsed_ms, ok):
+    count(upstream, 'calls')
+    count(upstream, 'ms', int(elapsed_ms))
+    if not ok:
+        count(upstream, 'errors')
+    bucket = next((limit for limit in LATENCY_BUCKETS if elapsed_ms < limit), 'slow')
+    count(upstream, f'bucket:{bucket}')
+
+
+def backoff(attempt):
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.5)
+
+
+def request(upstream, method, url, idempotent=None, **kwargs):
+    """
+    Sends the request through the pool of `upstream` and returns the
+    response. Raises GatewayUnavailable while the circuit is open and
+    GatewayError when the upstream could not be reached.
+    """
+    circuit = breaker(upstream)
+    if not circuit.allow():
+        raise GatewayUnavailable(f'{upstream} is unavailable')
+    if idempotent is None:
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS')
+    kwargs.setdefault('timeout', timeout_for(upstream))
+    attempt = 0
+    started = time.monotonic()
+    while True:
+        error = response = None
+        try:
+            response = session(upstream).request(method, url, **kwargs)
+        except requests.ConnectionError as exc:
+            # includes ConnectTimeout; a read timeout is not a ConnectionError
+            error = exc
+            retry = idempotent or isinstance(exc, requests.ConnectTimeout)
+        except requests.Timeout as exc:
+            error = exc
+            retry = idempotent
+        except requests.RequestException as exc:
+            error = exc
+            retry = False
+        else:
+            retry = idempotent and response.status_code in RETRY_STATUSES
+        if not retry or attempt >= GATEWAY_RETRIES:
+            break
+        attempt += 1
+        time.sleep(backoff(attempt))
+    ok = error is None and response.status_code < 500
+    circuit.record(ok)
+    record_call(upstream, (time.monotonic() - started) * 1000, ok)
+    if error is not None:
+        raise GatewayError(f'{upstream}: {error}') from error
+    return response
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, 'GET', url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, 'POST', url, **kwargs)
+
+
+def razorpay_client():
+    import razorpay
+    return razorpay.Client(
+        session=session('razorpay'),
+        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+
+
+def gateway_metrics():
+    # {upstream: {'calls', 'errors', 'avg_ms', 'buckets', 'circuit'}}, the counts are
+    # shared through the cache, the circuit is the one of this process
+    stats = {}
+    for upstream in UPSTREAMS:
+        names = ['calls', 'errors', 'ms'] + [f'bucket:{b}' for b in LATENCY_BUCKETS + ('slow',)]
+        values = cache.get_many([metric_key(upstream, name) for name in names])
+        value = {name: values.get(metric_key(upstream, name), 0) for name in names}
+        stats[upstream] = {
+            'calls': value['calls'],
+            'errors': value['errors'],
+            'avg_ms': round(value['ms'] / value['calls']) if value['calls'] else 0,
+            'buckets': {name.split(':', 1)[1]: value[name] for name in names[3:]},
+            'circuit': breaker(upstream).state,
+        }
+    return stats
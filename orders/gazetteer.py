@@ -0,0 +1,82 @@
+"""
+Local store of the states and cities offered by the checkout address form.
+
+StatesJsonListView asked Aramex for FetchStates, and for FetchCities when a
+country has no states, every time the country select changed. It parsed
+the XML answer and cut the cities at 1000. The names now live in the
+Location table, filled per country by the refresh_locations command (and a
+weekly beat task). The view answers from that table with a prefix search
+(`?q=`) and keyset pages (`?cursor=`).
+
+The first page of every country is kept in the cache under a version
+number that a refresh bumps, so switching the country does not touch the
+database either.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from project.cacheversion import bump_version, get_version
+from project.pagination import InvalidCursor, KeysetPaginator
+from .models import Location
+
+
+LOCATION_PAGE_SIZE = 1000
+CACHE_TIMEOUT = 60 * 60 * 24
+VERSION_KEY = 'gazetteer'
+
+
+def fold(name):
+    return ' '.join(name.split()).casefold()
+
+
+def locations_version():
+    return get_version(VERSION_KEY)
+
+
+def invalidate_locations():
+    bump_version(VERSION_KEY)
+
+
+def replace_country(country_code, kind, names):
+    # the new names of one country, spelled as the first occurrence
+    rows = {}
+    for name in names:
+        name = ' '.join(name.split())[:100]
+        if name:
+            rows.setdefault(fold(name), name)
+    with transaction.atomic():
+        Location.objects.filter(country_code=country_code).delete()
+        Location.objects.bulk_create([
+            Location(country_code=country_code, kind=kind, name=name, search=search)
+            for search, name in rows.items()], batch_size=1000)
+    invalidate_locations()
+    return len(rows)
+
+
+def find_locations(country_code, q='', cursor=None, page_size=LOCATION_PAGE_SIZE):
+    queryset = Location.objects.filter(country_code=country_code).values('id', 'name', 'search')
+    if q:
+        queryset = queryset.filter(search__startswith=fold(q))
+    paginator = KeysetPaginator(queryset, 'search', page_size)
+    try:
+        page = paginator.page(cursor)
+    except InvalidCursor:
+        page = paginator.page()
+    return [row['name'] for row in page.data], page.next_cursor
+
+
+def locations(country_code, q='', cursor=None):
+    """
+    Returns (names, next cursor) of a page of the states or cities of
+    `country_code`; names is None when the country has none stored.
+    """
+    country_code = (country_code or '').upper()[:2]
+    if q or cursor:
+        return find_locations(country_code, q, cursor)
+    key = f'gazetteer:{locations_version()}:{country_code}'
+    page = cache.get(key)
+    if page is None:
+        names, next_cursor = find_locations(country_code)
+        page = (names or None, next_cursor)
+        cache.set(key, page, CACHE_TIMEOUT)
+    return page
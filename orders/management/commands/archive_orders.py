@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from orders.archive import (
+    ABANDONED_CART_DAYS, BATCH_SIZE, ORDER_ARCHIVE_DAYS, archive_finished_orders,
+    purge_abandoned_carts)
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned carts and move old finished orders to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cart-days', type=int, default=ABANDONED_CART_DAYS,
+            help="Delete unfinished orders not updated for this many days")
+        parser.add_argument(
+            '--archive-days', type=int, default=ORDER_ARCHIVE_DAYS,
+            help="Archive finished orders older than this many days")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--skip-carts', action='store_true')
+        parser.add_argument('--skip-archive', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_carts']:
+            deleted = purge_abandoned_carts(options['cart_days'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} abandoned carts"))
+        if not options['skip_archive']:
+            moved = archive_finished_orders(options['archive_days'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders"))
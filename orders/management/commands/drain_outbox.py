@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import OutboxJob
+from orders.outbox import OUTBOX_BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = "Run the queued checkout mails and shipments that are due"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help="Queue the jobs that ran out of attempts again first")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = OutboxJob.objects.filter(status=OutboxJob.FAILED).update(
+                status=OutboxJob.PENDING, attempts=0, run_after=timezone.now())
+            self.stdout.write(f"Queued {requeued} failed jobs again")
+        done, failed = drain(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Ran {done} jobs, {failed} failed"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from orders.gateways import gateway_metrics
+
+
+class Command(BaseCommand):
+    help = "Show the calls, failures and latency of the payment gateways and the carrier"
+
+    def handle(self, *args, **options):
+        for upstream, stats in gateway_metrics().items():
+            buckets = ', '.join(
+                f"{'>3000' if limit == 'slow' else '<' + limit}ms: {total}"
+                for limit, total in stats['buckets'].items())
+            self.stdout.write(
+                f"{upstream}: {stats['calls']} calls, {stats['errors']} failed, "
+                f"avg {stats['avg_ms']}ms ({buckets})")
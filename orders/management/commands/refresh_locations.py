@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django_countries import countries
+
+from orders import aramex
+from orders.gateways import GatewayError
+from orders.gazetteer import replace_country
+
+
+class Command(BaseCommand):
+    help = "Load the states (or cities) of every country from Aramex into the local gazetteer"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'countries', nargs='*',
+            help="Country codes to refresh, every country when left out")
+        parser.add_argument(
+            '--pause', type=float, default=0.2,
+            help="Seconds to wait between two countries")
+
+    def handle(self, *args, **options):
+        if not aramex.enabled():
+            raise CommandError("ARAMEX_USERNAME is not set")
+        codes = [code.upper() for code in options['countries']] or [code for code, _ in countries]
+        for code in codes:
+            try:
+                kind, names = aramex.fetch_locations(code)
+            except GatewayError as error:
+                self.stderr.write(f"{code}: {error}")
+                continue
+            if not names:
+                # an empty answer is more likely an error than a country
+                # without places, keep what is stored
+                self.stdout.write(f"{code}: nothing returned, kept")
+            else:
+                self.stdout.write(f"{code}: {replace_country(code, kind, names)} {kind} names")
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS("Gazetteer refreshed"))
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.14 on 2026-10-18 10:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0013_profile_keyset_index'),
+        ('orders', '0031_auto_20220814_0432'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'order_date', 'id'], name='order_user_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersupplier',
+            index=models.Index(fields=['vendor', 'order_date', 'id'], name='ordersupplier_vendor_date_idx'),
+        ),
+    ]
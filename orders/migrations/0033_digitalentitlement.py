@@ -0,0 +1,56 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def grant_finished_orders(apps, schema_editor):
+    OrderDetails = apps.get_model('orders', 'OrderDetails')
+    DigitalEntitlement = apps.get_model('orders', 'DigitalEntitlement')
+    lines = OrderDetails.objects.filter(
+        order__is_finished=True, order__user__isnull=False).exclude(
+        product__digital_file='').exclude(product__digital_file__isnull=True).values_list(
+        'order__user_id', 'product_id', 'order_id', 'product__digital_file').distinct()
+    batch = []
+    for user_id, product_id, order_id, name in lines.iterator():
+        batch.append(DigitalEntitlement(
+            user_id=user_id, product_id=product_id, order_id=order_id,
+            file=name, filename=name.split('/')[-1]))
+        if len(batch) >= 1000:
+            DigitalEntitlement.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    DigitalEntitlement.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('products', '0075_imageencoding_content_hash'),
+        ('orders', '0032_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigitalEntitlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.CharField(max_length=100)),
+                ('filename', models.CharField(max_length=100)),
+                ('date', models.DateTimeField(auto_now_add=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digital_entitlements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-order_id', '-id'),
+                'unique_together': {('order', 'product')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='digitalentitlement',
+            index=models.Index(fields=['user', 'order', 'filename'], name='entitlement_user_file_idx'),
+        ),
+        migrations.RunPython(grant_finished_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:05
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0013_profile_keyset_index'),
+        ('orders', '0033_digitalentitlement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='digitalentitlement',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='orders.order'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('email_client', models.EmailField(blank=True, max_length=250, null=True)),
+                ('order_date', models.DateTimeField()),
+                ('amount', models.CharField(max_length=50)),
+                ('weight', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('is_finished', models.BooleanField(default=True)),
+                ('status', models.CharField(max_length=13)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('date_archived', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderSupplier',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('email_client', models.EmailField(blank=True, max_length=250, null=True)),
+                ('order_date', models.DateTimeField()),
+                ('amount', models.CharField(max_length=50)),
+                ('weight', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('is_finished', models.BooleanField(default=True)),
+                ('status', models.CharField(max_length=13)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.archivedorder')),
+                ('vendor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='accounts.profile')),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'order_date', 'id'], name='archivedorder_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedordersupplier',
+            index=models.Index(fields=['vendor', 'order_date', 'id'], name='archivedsupplier_vendor_idx'),
+        ),
+    ]
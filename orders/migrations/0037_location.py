@@ -0,0 +1,30 @@
+# Generated by Django 3.2.14 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0036_outboxjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country_code', models.CharField(max_length=2)),
+                ('kind', models.CharField(choices=[('state', 'state'), ('city', 'city')], default='state', max_length=5)),
+                ('name', models.CharField(max_length=100)),
+                ('search', models.CharField(max_length=100)),
+            ],
+            options={
+                'ordering': ('country_code', 'search'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['country_code', 'search', 'id'], name='location_country_search_idx'),
+        ),
+    ]
@@ -6,6 +6,11 @@ from accounts.models import Profile
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from django_countries.fields import CountryField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.signals import user_logged_in
+from django.utils import timezone
+from project.counts import invalidate_user_orders_count, invalidate_vendor_orders_count
 
 # from localflavor.us.models import USStateField
 
@@ -55,6 +60,12 @@ class Order(models.Model):
 
     auth_token_order = models.TextField(blank=True, null=True)
     trnx_id = models.CharField(max_length=100,  blank=True, null=True)
+    __original_is_finished = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.pk is not None and 'is_finished' in self.__dict__:
+            self.__original_is_finished = self.is_finished
 
     def __str__(self):
         # return f"Order ID:{self.id}-{self.user}-{self.user.email}-{self.status}"
@@ -94,9 +105,18 @@ class Order(models.Model):
                 pass
 
         super().save(*args, **kwargs)
+        if self.is_finished != self.__original_is_finished:
+            if self.is_finished:
+                DigitalEntitlement.grant(self)
+            else:
+                DigitalEntitlement.objects.filter(order=self).delete()
+            self.__original_is_finished = self.is_finished
 
     class Meta:
         ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['user', 'order_date', 'id'], name='order_user_date_id_idx'),
+        ]
 
 
 class OrderDetails(models.Model):
@@ -126,6 +146,41 @@ class OrderDetails(models.Model):
     #     super().save(*args, **kwargs)
 
 
+class DigitalEntitlement(models.Model):
+    # a purchased digital file, written when its order is finished so the
+    # download pages do not have to walk the order history
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='digital_entitlements')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # kept when the order moves to ArchivedOrder, see entitlement_order_receiver
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False)
+    file = models.CharField(max_length=100)
+    filename = models.CharField(max_length=100)
+    date = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+
+    class Meta:
+        ordering = ('-order_id', '-id')
+        unique_together = ('order', 'product')
+        indexes = [
+            models.Index(fields=['user', 'order', 'filename'], name='entitlement_user_file_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.order_id}:{self.filename}"
+
+    @classmethod
+    def grant(cls, order):
+        if not order.user_id:
+            return
+        lines = OrderDetails.objects.filter(order=order).exclude(
+            product__digital_file='').exclude(product__digital_file__isnull=True).values_list(
+            'product_id', 'product__digital_file').distinct()
+        cls.objects.bulk_create([
+            cls(user_id=order.user_id, product_id=product_id, order=order,
+                file=name, filename=name.split('/')[-1])
+            for product_id, name in lines], ignore_conflicts=True)
+
+
 class Coupon(models.Model):
     code = models.CharField(max_length=50, unique=True)
     valid_form = models.DateTimeField()
@@ -172,6 +227,76 @@ class Payment(models.Model):
         ordering = ('-id',)
 
 
+class PaymentTransaction(models.Model):
+    # one row per gateway payment that finished an order, see orders.checkout
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    gateway = models.CharField(max_length=20)
+    txn_id = models.CharField(max_length=100)
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-id',)
+        unique_together = ('gateway', 'txn_id')
+
+    def __str__(self):
+        return f"{self.gateway} {self.txn_id}"
+
+
+class OutboxJob(models.Model):
+    # a side effect of a checkout, written with the order and run by celery,
+    # see orders.outbox
+    PENDING = 'PENDING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    Status_select = [
+        (PENDING, 'PENDING'),
+        (DONE, 'DONE'),
+        (FAILED, 'FAILED'),
+    ]
+    kind = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    dedupe_key = models.CharField(max_length=200, unique=True, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=Status_select, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    date = models.DateTimeField(auto_now_add=True)
+    done_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='outbox_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.dedupe_key or self.id}"
+
+
+class Location(models.Model):
+    # a state or city offered by the checkout address form, see orders.gazetteer
+    STATE = 'state'
+    CITY = 'city'
+    Kind_select = [
+        (STATE, 'state'),
+        (CITY, 'city'),
+    ]
+    country_code = models.CharField(max_length=2)
+    kind = models.CharField(max_length=5, choices=Kind_select, default=STATE)
+    name = models.CharField(max_length=100)
+    # the name folded for the prefix search
+    search = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ('country_code', 'search')
+        indexes = [
+            models.Index(fields=['country_code', 'search', 'id'], name='location_country_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.country_code} {self.name}"
+
+
 class Country(models.Model):
     name_country = models.CharField(max_length=40)
     country_code = models.CharField(max_length=40)
@@ -242,6 +367,9 @@ class OrderSupplier(models.Model):
 
     class Meta:
         ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['vendor', 'order_date', 'id'], name='ordersupplier_vendor_date_idx'),
+        ]
 
 
 class OrderDetailsSupplier(models.Model):
@@ -287,3 +415,106 @@ class OrderDetailsSupplier(models.Model):
     #     obj_order_supplier.amount = total
     #     obj_order_supplier.save()
     #     super().save(*args, **kwargs)
+
+
+class ArchivedOrder(models.Model):
+    # a finished order moved out of the order tables by orders.archive, `data`
+    # holds the order, its lines and its payment as they were
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name='archived_orders', blank=True, null=True)
+    email_client = models.EmailField(max_length=250, blank=True, null=True)
+    order_date = models.DateTimeField()
+    amount = models.CharField(max_length=50)
+    weight = models.DecimalField(default=0, max_digits=10, decimal_places=3)
+    is_finished = models.BooleanField(default=True)
+    status = models.CharField(max_length=13)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    date_archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['user', 'order_date', 'id'], name='archivedorder_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ArchivedOrderSupplier(models.Model):
+    # the vendor part of an ArchivedOrder, `data` holds the OrderSupplier row
+    # and its OrderDetailsSupplier lines
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE)
+    vendor = models.ForeignKey(
+        Profile, on_delete=models.SET_NULL, related_name='archived_orders', blank=True, null=True)
+    email_client = models.EmailField(max_length=250, blank=True, null=True)
+    order_date = models.DateTimeField()
+    amount = models.CharField(max_length=50)
+    weight = models.DecimalField(default=0, max_digits=10, decimal_places=3)
+    is_finished = models.BooleanField(default=True)
+    status = models.CharField(max_length=13)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['vendor', 'order_date', 'id'], name='archivedsupplier_vendor_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+def entitlement_file_receiver(sender, instance, *args, **kwargs):
+    # a replaced digital file is served to everyone who bought the product
+    if 'digital_file' in instance.__dict__ and instance.digital_file:
+        name = instance.digital_file.name
+        DigitalEntitlement.objects.filter(product_id=instance.id).exclude(file=name).update(
+            file=name, filename=name.split('/')[-1])
+
+
+post_save.connect(entitlement_file_receiver, sender=Product)
+
+
+def entitlement_order_receiver(sender, instance, *args, **kwargs):
+    # an archived order keeps its downloads, a deleted one does not
+    from .archive import is_archiving
+    if instance.is_finished and not is_archiving(instance.pk):
+        DigitalEntitlement.objects.filter(order_id=instance.pk).delete()
+
+
+post_delete.connect(entitlement_order_receiver, sender=Order)
+post_save.connect(invalidate_user_orders_count, sender=Order)
+post_delete.connect(invalidate_user_orders_count, sender=Order)
+post_save.connect(invalidate_vendor_orders_count, sender=OrderSupplier)
+post_delete.connect(invalidate_vendor_orders_count, sender=OrderSupplier)
+
+
+def cart_order_receiver(sender, instance, *args, **kwargs):
+    from .cart import invalidate_cart_count
+    invalidate_cart_count(instance.user_id, instance.id)
+
+
+def cart_line_receiver(sender, instance, *args, **kwargs):
+    # the header badge count is cached per user and per anonymous cart
+    from .cart import invalidate_cart_count
+    user_id = Order.objects.filter(id=instance.order_id).values_list(
+        'user_id', flat=True).first()
+    invalidate_cart_count(user_id, instance.order_id)
+
+
+post_save.connect(cart_order_receiver, sender=Order)
+post_delete.connect(cart_order_receiver, sender=Order)
+post_save.connect(cart_line_receiver, sender=OrderDetails)
+post_delete.connect(cart_line_receiver, sender=OrderDetails)
+
+
+def merge_cart_receiver(sender, request, user, *args, **kwargs):
+    from .cart import merge_session_cart
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request, user)
+
+
+user_logged_in.connect(merge_cart_receiver, dispatch_uid='orders-merge-session-cart')
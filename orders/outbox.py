@@ -0,0 +1,137 @@
+"""
+Durable queue of the checkout side effects.
+
+The payment views sent the SendGrid mails and booked the Aramex shipment
+while the gateway waited for the answer, and Stripe and Paymob send a slow
+webhook again. `enqueue` writes an OutboxJob in the transaction that
+changes the order, so the job exists exactly when the change committed,
+and a dedupe key turns a second enqueue of the same effect into a no-op.
+A celery task drains the queue right after the commit; the beat drains it
+every minute for the retries.
+
+A failing job is retried with exponential backoff and jitter until
+OUTBOX_MAX_ATTEMPTS, then kept as FAILED with its last error. A claimed
+job is leased for OUTBOX_LEASE seconds, the job of a worker that died is
+picked up again once the lease ran out.
+"""
+import hashlib
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxJob
+
+
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+OUTBOX_LEASE = getattr(settings, 'OUTBOX_LEASE', 60 * 5)
+OUTBOX_KEEP_DAYS = getattr(settings, 'OUTBOX_KEEP_DAYS', 30)
+BACKOFF_BASE = 30
+BACKOFF_MAX = 60 * 60 * 6
+
+
+def send_outbox_mail(subject, message, recipients):
+    send_mail(subject, message, f'{settings.EMAIL_SENDGRID}', recipients, fail_silently=False)
+
+
+def ship_order(order_id):
+    from .checkout import create_order_shipment
+    create_order_shipment(order_id)
+
+
+# kind -> handler, called with the job payload as keyword arguments
+HANDLERS = {
+    'mail': send_outbox_mail,
+    'shipment': ship_order,
+}
+
+
+def kick():
+    from .tasks import drain_outbox
+    drain_outbox.delay()
+
+
+def enqueue(kind, payload, key=None):
+    """
+    Queues a job to run once the current transaction commits. Returns the
+    job, or None when a job with the same `key` was queued before.
+    """
+    with transaction.atomic():
+        if key:
+            job, created = OutboxJob.objects.get_or_create(
+                dedupe_key=key, defaults={'kind': kind, 'payload': payload})
+        else:
+            job, created = OutboxJob.objects.create(kind=kind, payload=payload), True
+    if not created:
+        return None
+    transaction.on_commit(kick)
+    return job
+
+
+def enqueue_mail(subject, message, recipients, key=None):
+    return enqueue('mail', {
+        'subject': subject, 'message': message, 'recipients': list(recipients)}, key)
+
+
+def enqueue_alert(subject, message):
+    # a mail to DEBUG_EMAIL, the same error is reported once an hour
+    digest = hashlib.md5(f'{subject}\n{message}'.encode()).hexdigest()
+    hour = timezone.now().strftime('%Y%m%d%H')
+    return enqueue_mail(subject, message, [f'{settings.DEBUG_EMAIL}'],
+                        key=f'alert:{digest}:{hour}')
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(OutboxJob.objects.select_for_update(skip_locked=True).filter(
+            status=OutboxJob.PENDING, run_after__lte=now).order_by('run_after', 'id')[:batch_size])
+        OutboxJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            attempts=F('attempts') + 1, run_after=now + timedelta(seconds=OUTBOX_LEASE))
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    try:
+        HANDLERS[job.kind](**job.payload)
+    except Exception as error:
+        given_up = job.attempts >= OUTBOX_MAX_ATTEMPTS
+        OutboxJob.objects.filter(pk=job.pk).update(
+            status=OutboxJob.FAILED if given_up else OutboxJob.PENDING,
+            run_after=timezone.now() + backoff(job.attempts),
+            last_error=f'{type(error).__name__}: {error}')
+        return False
+    OutboxJob.objects.filter(pk=job.pk).update(
+        status=OutboxJob.DONE, done_at=timezone.now(), last_error='')
+    return True
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    # runs every job that is due, returns (done, failed)
+    done = failed = 0
+    while True:
+        jobs = claim(batch_size)
+        if not jobs:
+            return done, failed
+        for job in jobs:
+            if run_job(job):
+                done += 1
+            else:
+                failed += 1
+
+
+def purge_outbox(days=OUTBOX_KEEP_DAYS):
+    cutoff = timezone.now() - timedelta(days=days)
+    return OutboxJob.objects.filter(status=OutboxJob.DONE, done_at__lt=cutoff).delete()[0]
@@ -0,0 +1,67 @@
+"""
+Cached Aramex shipping rate quotes.
+
+Every checkout POST to orders.views.payment built a CalculateRate request
+and waited for Aramex, although the price only depends on the destination
+(country, city, post code), the product group/type and the weight. Quotes
+are cached under those inputs for RATE_QUOTE_TIMEOUT. The weight is
+rounded up to the next RATE_WEIGHT_STEP kg, so carts of about the same
+weight share a quote and a quote never undercharges.
+
+The address errors Aramex answers for a destination (unknown city, bad
+post code) are cached for a few minutes as well. The cart page asks for
+the quote of the address in the background (`prefetch_shipping_quote`)
+while the customer is still typing, so the POST usually finds it cached.
+"""
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import aramex
+from .aramex import RateQuote
+from .gazetteer import fold
+
+
+RATE_QUOTE_TIMEOUT = getattr(settings, 'RATE_QUOTE_TIMEOUT', 60 * 60 * 6)
+RATE_ERROR_TIMEOUT = 60 * 10
+RATE_WEIGHT_STEP = getattr(settings, 'RATE_WEIGHT_STEP', 0.5)
+
+
+def weight_bucket(weight):
+    step = RATE_WEIGHT_STEP
+    return max(step, math.ceil(float(weight or 0) / step) * step)
+
+
+def quote_key(country_code, city, post_code, weight):
+    product_group, product_type = aramex.product_kind(country_code)
+    parts = [country_code.upper(), fold(city or ''), ''.join((post_code or '').split()).upper(),
+             product_group, product_type, f'{weight_bucket(weight):.3f}']
+    return 'rate-quote:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def rate_quote(country_code, city, post_code, weight):
+    """
+    Returns the RateQuote for shipping `weight` kg to the address, from the
+    cache when the same destination and weight bucket was quoted before.
+    """
+    key = quote_key(country_code, city, post_code, weight)
+    cached = cache.get(key)
+    if cached is not None:
+        return RateQuote(*cached)
+    quote = aramex.calculate_rate(country_code, city, post_code, weight_bucket(weight))
+    if quote.value is not None:
+        cache.set(key, quote.as_tuple(), RATE_QUOTE_TIMEOUT)
+    elif quote.address_error:
+        cache.set(key, quote.as_tuple(), RATE_ERROR_TIMEOUT)
+    return quote
+
+
+def prefetch_rate_quote(country_code, city, post_code, weight):
+    # queues the quote unless it is cached, returns True when it was
+    from .tasks import prefetch_shipping_rate
+    if cache.get(quote_key(country_code, city, post_code, weight)) is not None:
+        return True
+    prefetch_shipping_rate.delay(country_code, city, post_code, float(weight or 0))
+    return False
@@ -0,0 +1,28 @@
+from celery import shared_task
+from django.core.management import call_command
+
+from . import aramex
+from .archive import archive_finished_orders, purge_abandoned_carts
+from .outbox import drain, purge_outbox
+from .rates import rate_quote
+
+
+@shared_task
+def archive_orders():
+    return purge_abandoned_carts(), archive_finished_orders(), purge_outbox()
+
+
+@shared_task
+def drain_outbox():
+    return drain()
+
+
+@shared_task
+def refresh_locations():
+    if aramex.enabled():
+        call_command('refresh_locations')
+
+
+@shared_task
+def prefetch_shipping_rate(country_code, city, post_code, weight):
+    rate_quote(country_code, city, post_code, weight)
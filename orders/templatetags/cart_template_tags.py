@@ -1,6 +1,7 @@
 from django import template
 #from orders.views import Order, OrderDetails
 from orders.models import Order, OrderDetails
+from orders.cart import cart_count
 from products.models import Product 
 from django.contrib.auth.models import User
 
@@ -10,12 +11,7 @@ register = template.Library()
 @register.filter
 def cart_items_count(user):
     if user.is_authenticated and not user.is_anonymous:
-        if Order.objects.all().filter(user=user, is_finished=False):
-            order = Order.objects.get(user=user, is_finished=False)
-            return OrderDetails.objects.all().filter(order=order).count()
-
-        else:
-            return 0
+        return cart_count(user_id=user.id)
 
 
 
@@ -1,3 +1,257 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Profile
+from products.models import Product
+from . import gateways
+from .archive import (
+    ARCHIVE_CURSOR, archive_finished_orders, archived_order, paginate_with_archive,
+    purge_abandoned_carts)
+from .cart import LIMIT, add_item, create_order, remove_line
+from .checkout import finalize_order
+from .models import (
+    ArchivedOrder, ArchivedOrderSupplier, Coupon, Order, OrderDetails, OrderSupplier,
+    PaymentTransaction)
+
+
+def make_product(vendor, name, price, weight, available):
+    return Product.objects.create(
+        product_vendor=vendor, product_name=name, product_description=name,
+        PRDPrice=price, PRDWeight=weight, available=available)
+
+
+class CartTotalsTests(TestCase):
+
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pass')
+        self.vendor = Profile.objects.get(user=User.objects.create_user('vendor', 'v@example.com', 'pass'))
+        self.other_vendor = Profile.objects.get(
+            user=User.objects.create_user('other', 'o@example.com', 'pass'))
+        self.apple = make_product(self.vendor, 'apple', 10.5, Decimal('1.250'), 5)
+        self.pear = make_product(self.other_vendor, 'pear', 3.25, Decimal('0.500'), 10)
+        self.order = create_order(self.customer)
+
+    def assertTotalsMatchLines(self):
+        order = Order.objects.get(pk=self.order.pk)
+        lines = OrderDetails.objects.filter(order=order)
+        self.assertEqual(Decimal(order.sub_total), sum(line.price * line.quantity for line in lines))
+        self.assertEqual(Decimal(order.amount), Decimal(order.sub_total))
+        self.assertEqual(order.weight, sum(line.weight * line.quantity for line in lines))
+        for order_supplier in OrderSupplier.objects.filter(order=order):
+            vendor_lines = lines.filter(product__product_vendor=order_supplier.vendor)
+            self.assertEqual(
+                Decimal(order_supplier.amount),
+                sum(line.price * line.quantity for line in vendor_lines))
+
+    def test_totals_follow_added_lines(self):
+        add_item(self.order, self.apple, 2, user=self.customer)
+        add_item(self.order, self.pear, 3, user=self.customer)
+        add_item(self.order, self.apple, 1, user=self.customer)
+        self.assertEqual(OrderDetails.objects.get(order=self.order, product=self.apple).quantity, 3)
+        self.assertEqual(OrderSupplier.objects.filter(order=self.order).count(), 2)
+        self.assertTotalsMatchLines()
+
+    def test_added_quantity_is_capped_at_stock(self):
+        self.assertEqual(add_item(self.order, self.apple, 4, user=self.customer)[1], 4)
+        self.assertEqual(add_item(self.order, self.apple, 4, user=self.customer)[1], 5)
+        self.assertEqual(add_item(self.order, self.apple, 1, user=self.customer), (LIMIT, 5))
+        self.assertTotalsMatchLines()
+
+    def test_totals_follow_removed_lines(self):
+        add_item(self.order, self.apple, 2, user=self.customer)
+        add_item(self.order, self.pear, 3, user=self.customer)
+        line = OrderDetails.objects.get(order=self.order, product=self.pear)
+        self.assertIs(remove_line(self.order, line.id), True)
+        self.assertFalse(OrderSupplier.objects.filter(order=self.order, vendor=self.other_vendor).exists())
+        self.assertTotalsMatchLines()
+
+    def test_applied_coupon_survives_cart_changes(self):
+        coupon = Coupon.objects.create(
+            code='TEN', valid_form=timezone.now(), valid_to=timezone.now(), discount=10, active=True)
+        add_item(self.order, self.apple, 2, user=self.customer)
+        Order.objects.filter(pk=self.order.pk).update(coupon=coupon)
+        add_item(self.order, self.pear, 4, user=self.customer)
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.coupon_id, coupon.id)
+        self.assertEqual(Decimal(order.sub_total), Decimal('34.00'))
+        self.assertEqual(Decimal(order.discount), Decimal('3.40'))
+        self.assertEqual(Decimal(order.amount), Decimal('30.60'))
+
+    def test_removing_the_last_line_deletes_the_order(self):
+        add_item(self.order, self.apple, 1, user=self.customer)
+        line = OrderDetails.objects.get(order=self.order)
+        self.assertEqual(remove_line(self.order, line.id), 'order')
+        self.assertFalse(Order.objects.filter(pk=self.order.pk).exists())
+
+
+@override_settings(ARAMEX_USERNAME='')
+class FinalizeOrderTests(TestCase):
+
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pass')
+        self.vendor = Profile.objects.get(user=User.objects.create_user('vendor', 'v@example.com', 'pass'))
+        self.apple = make_product(self.vendor, 'apple', 10.5, Decimal('1.000'), 5)
+        self.order = self.cart(2)
+
+    def cart(self, quantity):
+        order = create_order(self.customer)
+        add_item(order, self.apple, quantity, user=self.customer)
+        return order
+
+    def test_finishes_the_order(self):
+        self.assertTrue(finalize_order(self.order.id, 'Stripe', 'txn_1'))
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(order.is_finished)
+        self.assertEqual(order.status, Order.Underway)
+        self.assertEqual(order.trnx_id, 'txn_1')
+
+    def test_duplicate_transaction_is_a_no_op(self):
+        self.assertTrue(finalize_order(self.order.id, 'Stripe', 'txn_1'))
+        self.assertFalse(finalize_order(self.order.id, 'Stripe', 'txn_1'))
+        # the same transaction id can not pay for a second order either
+        other = self.cart(1)
+        self.assertFalse(finalize_order(other.id, 'Stripe', 'txn_1'))
+        self.assertFalse(Order.objects.get(pk=other.pk).is_finished)
+        self.assertEqual(PaymentTransaction.objects.filter(gateway='Stripe', txn_id='txn_1').count(), 1)
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.available, 3)
+
+    def test_stock_never_goes_below_zero(self):
+        # sold elsewhere while this cart waited for the payment
+        Product.objects.filter(pk=self.apple.pk).update(available=1)
+        self.assertTrue(finalize_order(self.order.id, 'PayMob', 42))
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.available, 0)
+
+    def test_vendor_balance_is_credited_once(self):
+        Profile.objects.filter(pk=self.vendor.pk).update(blance=5.0)
+        self.assertTrue(finalize_order(self.order.id, 'Paypal', 'PAY-1'))
+        self.assertFalse(finalize_order(self.order.id, 'Paypal', 'PAY-1'))
+        self.assertFalse(finalize_order(self.order.id, 'Paypal', 'PAY-2'))
+        self.vendor.refresh_from_db()
+        self.assertAlmostEqual(self.vendor.blance, 5.0 + 21.0)
+
+
+@override_settings(ARAMEX_USERNAME='')
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pass')
+        self.vendor = Profile.objects.get(user=User.objects.create_user('vendor', 'v@example.com', 'pass'))
+        self.apple = make_product(self.vendor, 'apple', 10.5, Decimal('1.000'), 50)
+
+    def finished_order(self, days_ago, quantity=2):
+        order = create_order(self.customer)
+        add_item(order, self.apple, quantity, user=self.customer)
+        finalize_order(order.id, 'Stripe', f'txn_{order.id}')
+        Order.objects.filter(pk=order.pk).update(
+            order_date=timezone.now() - timedelta(days=days_ago))
+        return Order.objects.get(pk=order.pk)
+
+    def test_archived_order_round_trip(self):
+        order = self.finished_order(800)
+        recent = self.finished_order(10)
+        self.assertEqual(archive_finished_orders(days=365), 1)
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.assertFalse(OrderDetails.objects.filter(order_id=order.pk).exists())
+        self.assertTrue(Order.objects.filter(pk=recent.pk).exists())
+        self.assertTrue(ArchivedOrderSupplier.objects.filter(order_id=order.pk).exists())
+        restored, lines = archived_order(order.pk, self.customer)
+        self.assertEqual((restored.id, restored.amount, restored.status),
+                         (order.id, order.amount, order.status))
+        self.assertEqual([(line.product, line.quantity) for line in lines], [(self.apple, 2)])
+        self.assertIsNone(archived_order(order.pk, self.vendor.user))
+        self.assertEqual(archive_finished_orders(days=365), 0)
+
+    def test_load_more_walks_into_the_archive(self):
+        oldest = self.finished_order(900)
+        older = self.finished_order(800)
+        archive_finished_orders(days=365)
+        live = self.finished_order(1)
+        factory = RequestFactory()
+        orders = Order.objects.filter(user=self.customer, is_finished=True).values()
+        archived = ArchivedOrder.objects.filter(user=self.customer).values()
+
+        ids, cursor = [], None
+        for _ in range(4):
+            request = factory.get('/', {'cursor': cursor} if cursor else {})
+            page = paginate_with_archive(request, orders, archived, '-order_date', 1)
+            ids += [row['id'] for row in page.data]
+            if cursor is None:
+                # the live orders are done, the next cursor hands over
+                self.assertEqual(page.next_cursor, ARCHIVE_CURSOR)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(ids, [live.id, older.id, oldest.id])
+
+    def test_purge_keeps_carts_in_use(self):
+        stale = create_order(self.customer)
+        add_item(stale, self.apple, 1, user=self.customer)
+        Order.objects.filter(pk=stale.pk).update(date_update=timezone.now() - timedelta(days=40))
+        fresh = create_order(self.customer)
+        self.assertEqual(purge_abandoned_carts(days=30), 1)
+        self.assertFalse(Order.objects.filter(pk=stale.pk).exists())
+        self.assertTrue(Order.objects.filter(pk=fresh.pk).exists())
+
+
+class BreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = gateways.Breaker()
+
+    def fail(self, times):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(False)
+
+    def wait_for_reset(self):
+        self.breaker.opened_at -= gateways.GATEWAY_BREAKER_RESET + 1
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.fail(gateways.GATEWAY_BREAKER_THRESHOLD - 1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record(True)
+        self.fail(gateways.GATEWAY_BREAKER_THRESHOLD - 1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.fail(1)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        self.fail(gateways.GATEWAY_BREAKER_THRESHOLD)
+        self.wait_for_reset()
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        self.fail(gateways.GATEWAY_BREAKER_THRESHOLD)
+        self.wait_for_reset()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        self.fail(gateways.GATEWAY_BREAKER_THRESHOLD)
+        self.wait_for_reset()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, 'closed')
+        # the count starts over, one failure does not open it again
+        self.fail(1)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_open_circuit_fails_fast(self):
+        self.fail(gateways.GATEWAY_BREAKER_THRESHOLD)
+        with mock.patch.dict(gateways._breakers, {'test': self.breaker}), \
+                mock.patch.object(gateways, 'session') as session:
+            with self.assertRaises(gateways.GatewayUnavailable):
+                gateways.post('test', 'https://example.com/')
+        session.assert_not_called()
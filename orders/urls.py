@@ -9,6 +9,7 @@ app_name = 'orders'
 urlpatterns = [
      path('add_to_cart/', views.add_to_cart, name='add-to-cart'),
      path('cart/', views.cart, name='cart'),
+     path('shipping-quote/', views.prefetch_shipping_quote, name='shipping-quote'),
      path('cart/<str:country>/', views.StatesJsonListView.as_view(), name="get-states"),
      path('order/remeve-product/<int:productdeatails_id>',
           views.remove_item, name="remove-item"),
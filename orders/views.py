@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, HttpResponse
-from .models import Order, OrderDetails, Payment, Coupon, Country, OrderSupplier, OrderDetailsSupplier
+from .models import Order, OrderDetails, Payment, Coupon, Country, OrderDetailsSupplier
 from products.models import Product
 from django.contrib import messages
 from django.utils import timezone
@@ -10,7 +10,6 @@ from settings.models import SiteSetting
 # from django.contrib.messages.storage import session
 import json
 import stripe
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
@@ -18,19 +17,21 @@ from django.http import JsonResponse, HttpResponse
 from django.http import HttpResponseRedirect
 from django.views import View
 from django.views.decorators.http import require_POST
-import requests
-from bs4 import BeautifulSoup
 from settings.models import SiteSetting
-import datetime
 from django_countries import countries as allcountries
-import razorpay
 from .utils import code_generator
-from django.db.models import Sum
+from .cart import (
+    LIMIT, RequestCart, SessionCart, add_item, coupon_totals, create_order, current_order,
+    order_totals, remove_line, start_checkout, store_totals)
+from . import gateways
+from .checkout import finalize_order
+from .gazetteer import locations
+from .rates import prefetch_rate_quote, rate_quote
+from .outbox import enqueue_alert, enqueue_mail
+from django.db import transaction
+from django.db.models import F, Sum
 from django.urls import reverse
 
-ts = datetime.datetime.now().timestamp()
-time = round(ts * 1000)
-
 
 def add_to_cart(request):
     if not request.session.has_key('currency'):
@@ -40,13 +41,11 @@ def add_to_cart(request):
 
         product_id = request.POST['product_id']
         qyt = int(request.POST['qyt'])
-        size = None
-        try:
-            size = request.POST['name_variation']
-        except:
-            size = None
+        size = request.POST.get('name_variation')
 
-        product = Product.objects.get(id=product_id)
+        product = Product.objects.select_related('product_vendor').filter(id=product_id).first()
+        if product is None:
+            return HttpResponse(f"this product not found !")
 
         if qyt <= 0 and product.available == 0:
             messages.warning(request, 'This product is out of stock !')
@@ -62,316 +61,24 @@ def add_to_cart(request):
         if product.available < qyt and product.available != 0:
             qyt = product.available
 
-        try:
-            if request.user.is_authenticated and not request.user.is_anonymous:
-                order = Order.objects.filter(
-                    user=request.user, is_finished=False).first()
-                print("order: ", order)
-            else:
-                cart_id = request.session.get('cart_id')
-                order = Order.objects.all().filter(id=cart_id, is_finished=False)
-
-        except:
-            order = False
-
-        if not Product.objects.all().filter(id=product_id).exists():
-            return HttpResponse(f"this product not found !")
-
-        if order:
-            if request.user.is_authenticated and not request.user.is_anonymous:
-                old_orde = Order.objects.filter(
-                    user=request.user, is_finished=False).first()
-            else:
-                old_orde = Order.objects.get(id=cart_id, is_finished=False)
-            # old_orde_supplier = OrderSupplier.objects.get(
-            #     user=request.user, is_finished=False, order=old_orde)
-            # print("old_orde_supplier:", old_orde_supplier)
-            if OrderDetails.objects.all().filter(order=old_orde, product=product).exists() and OrderDetailsSupplier.objects.all().filter(order=old_orde, product=product).exists():
-                item = OrderDetails.objects.get(
-                    order=old_orde, product=product)
-                item_supplier = OrderDetailsSupplier.objects.get(
-                    order=old_orde, product=product)
-                # for i in items:
-                if item.quantity >= product.available:
-                    qyt = item.quantity
-                    # i.quantity = int(qyt)
-                    # i.save()
-                    messages.warning(
-                        request, f"You can't add more from this product, available only : {qyt}")
-                    return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
-
-                elif qyt < product.available:
-                    qyt = qyt + item.quantity
-                    if qyt > product.available:
-                        qyt = product.available
-
-                    item.quantity = int(qyt)
-                    item_supplier.quantity = int(qyt)
-                    item.save()
-                    item_supplier.save()
-
-                    # code for total amount main order
-                    order_details_main = OrderDetails.objects.all().filter(order=old_orde)
-                    f_total = 0
-                    w_total = 0
-                    weight = 0
-                    for sub in order_details_main:
-                        f_total += sub.price * sub.quantity
-                        w_total += sub.weight * sub.quantity
-                        total = f_total
-                        weight = w_total
-
-                    old_orde.sub_total = f_total
-                    old_orde.weight = weight
-                    old_orde.amount = total
-                    old_orde.save()
-
-                    # code for total amount supplier order
-                    old_order_supplier = OrderSupplier.objects.get(
-                        is_finished=False, order=old_orde, vendor=product.product_vendor)
-                    order_supplier = OrderDetailsSupplier.objects.all().filter(
-                        order_supplier=old_order_supplier)
-                    weight = 0
-                    f_total = 0
-                    w_total = 0
-                    for sub in order_supplier:
-                        f_total += sub.price * sub.quantity
-                        w_total += sub.weight * sub.quantity
-                        total = f_total
-                        weight = w_total
-                    old_order_supplier.weight = weight
-                    old_order_supplier.amount = total
-                    old_order_supplier.save()
-
-                # if i.size != size:
-                #     order_details = OrderDetails.objects.create(
-                #         supplier=product.product_vendor.user,
-                #         product=product,
-                #         order=old_orde,
-                #         price=product.PRDPrice,
-                #         quantity=qyt,
-                #         size=size,
-                #         weight=product.PRDWeight
-
-                #     )
-                #     break
-
-                else:
-                    item.quantity = int(qyt)
-                    item_supplier.quantity = int(qyt)
-                    # i.supplier = product.product_vendor.user
-                    item.save()
-                    item_supplier.save()
-
-                    # code for total amount main order
-                    order_details_main = OrderDetails.objects.all().filter(order=old_orde)
-                    f_total = 0
-                    w_total = 0
-                    weight = 0
-                    for sub in order_details_main:
-                        f_total += sub.price * sub.quantity
-                        w_total += sub.weight * sub.quantity
-                        total = f_total
-                        weight = w_total
-
-                    old_orde.sub_total = f_total
-                    old_orde.weight = weight
-                    old_orde.amount = total
-                    old_orde.save()
-
-                    # code for total amount supplier order
-                    old_order_supplier = OrderSupplier.objects.get(
-                        is_finished=False, order=old_orde, vendor=product.product_vendor)
-                    order_supplier = OrderDetailsSupplier.objects.all().filter(
-                        order_supplier=old_order_supplier)
-
-                    f_total = 0
-                    w_total = 0
-                    weight = 0
-                    for sub in order_supplier:
-                        f_total += sub.price * sub.quantity
-                        w_total += sub.weight * sub.quantity
-                        total = f_total
-                        weight = w_total
-                    old_order_supplier.weight = weight
-                    old_order_supplier.amount = total
-                    old_order_supplier.save()
-
-            else:
-                order_details = OrderDetails.objects.create(
-                    supplier=product.product_vendor.user,
-                    product=product,
-                    order=old_orde,
-                    price=product.PRDPrice,
-                    quantity=qyt,
-                    size=size,
-                    weight=product.PRDWeight
-                )
-                # code for total amount main order
-
-                order_details_main = OrderDetails.objects.all().filter(order=old_orde)
-                weight = 0
-                f_total = 0
-                w_total = 0
-                for sub in order_details_main:
-                    f_total += sub.price * sub.quantity
-                    w_total += sub.weight * sub.quantity
-                    total = f_total
-                    weight = w_total
-
-                old_orde.sub_total = f_total
-                old_orde.weight = weight
-                old_orde.amount = total
-                old_orde.save()
-                # add product for old order supplier
-                if OrderSupplier.objects.all().filter(
-                        order=old_orde, is_finished=False, vendor=product.product_vendor).exists():
-                    old_order_supplier = OrderSupplier.objects.get(
-                        is_finished=False, order=old_orde, vendor=product.product_vendor)
-                    order_details_supplier = OrderDetailsSupplier.objects.create(
-                        supplier=product.product_vendor.user,
-                        product=product,
-                        order=old_orde,
-                        order_supplier=old_order_supplier,
-                        order_details=order_details,
-                        price=product.PRDPrice,
-                        quantity=qyt,
-                        size=size,
-                        weight=product.PRDWeight
-                    )
-
-                    # code for total amount supplier order
-                    order__supplier = OrderDetailsSupplier.objects.all().filter(
-                        order_supplier=old_order_supplier)
-                    f_total = 0
-                    w_total = 0
-                    weight = 0
-                    for sub in order__supplier:
-                        f_total += sub.price * sub.quantity
-                        w_total += sub.weight * sub.quantity
-                        total = f_total
-                        weight = w_total
-                    old_order_supplier.weight = weight
-                    old_order_supplier.amount = total
-                    old_order_supplier.save()
-
-                else:
-                    # order for  new supllier
-                    new_order_supplier = OrderSupplier()
-                    if request.user.is_authenticated and not request.user.is_anonymous:
-                        new_order_supplier.user = request.user
-                        new_order_supplier.email_client = request.user.email
-
-                    new_order_supplier.vendor = product.product_vendor
-                    new_order_supplier.order = old_orde
-                    new_order_supplier.save()
-                    order_details_supplier = OrderDetailsSupplier.objects.create(
-                        supplier=product.product_vendor.user,
-                        product=product,
-                        order=old_orde,
-                        order_supplier=new_order_supplier,
-                        order_details=order_details,
-                        price=product.PRDPrice,
-                        quantity=qyt,
-                        size=size,
-                        weight=product.PRDWeight
-                    )
-
-                    order_supplier = OrderDetailsSupplier.objects.all().filter(
-                        order_supplier=new_order_supplier)
-                    weight = 0
-                    f_total = 0
-                    w_total = 0
-                    for sub in order_supplier:
-                        f_total += sub.price * sub.quantity
-                        w_total += sub.weight * sub.quantity
-                        total = f_total
-                        weight = w_total
-                    new_order_supplier.weight = weight
-                    new_order_supplier.amount = total
-                    new_order_supplier.save()
-
-            messages.success(request, 'product has been added to cart !')
-            # return redirect('orders:cart')
-            return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
-
+        user = request.user if request.user.is_authenticated else None
+        order = current_order(user.id if user else None, request.session.get('cart_id'))
+        if order is None and user is None:
+            # no order rows for visitors until they start the checkout
+            status, qyt = SessionCart(request.session).add(product, qyt, size=size)
         else:
-            # order for all
-            new_order = Order()
-            if request.user.is_authenticated and not request.user.is_anonymous:
-                new_order.user = request.user
-                new_order.email_client = request.user.email
-
-            new_order.save()
-            # will edite
-            # new_order.supplier = product.product_vendor.user
-            # new_order.vendors.add(product.product_vendor)
-
-            # order for supllier
-            new_order_supplier = OrderSupplier()
-            if request.user.is_authenticated and not request.user.is_anonymous:
-                new_order_supplier.user = request.user
-                new_order_supplier.email_client = request.user.email
-
-            new_order_supplier.vendor = product.product_vendor
-            new_order_supplier.order = new_order
-            new_order_supplier.save()
-
-            order_details = OrderDetails.objects.create(
-                supplier=product.product_vendor.user,
-                product=product,
-                order=new_order,
-                price=product.PRDPrice,
-                quantity=qyt,
-                size=size,
-                weight=product.PRDWeight
-            )
-
-            order_details_supplier = OrderDetailsSupplier.objects.create(
-                supplier=product.product_vendor.user,
-                product=product,
-                order=new_order,
-                order_supplier=new_order_supplier,
-                order_details=order_details,
-                price=product.PRDPrice,
-                quantity=qyt,
-                size=size,
-                weight=product.PRDWeight
-            )
-            # code for total amount main order
-
-            order_details_main = OrderDetails.objects.all().filter(order=new_order)
-            f_total = 0
-            w_total = 0
-            weight = 0
-            for sub in order_details_main:
-                f_total += sub.price * sub.quantity
-                w_total += sub.weight * sub.quantity
-                total = f_total
-                weight = w_total
-
-            new_order.sub_total = f_total
-            new_order.weight = weight
-            new_order.amount = total
-            new_order.save()
-            # code for total amount supplier order
-            order_details__supplier = OrderDetailsSupplier.objects.all().filter(
-                order_supplier=new_order_supplier)
-            f_total = 0
-            w_total = 0
-            weight = 0
-            for sub in order_details__supplier:
-                f_total += sub.price * sub.quantity
-                w_total += sub.weight * sub.quantity
-                total = f_total
-                weight = w_total
-            new_order_supplier.weight = weight
-            new_order_supplier.amount = total
-            new_order_supplier.save()
-            request.session['cart_id'] = new_order.id
-            messages.success(request, 'product has been added to cart !')
-            # return redirect('orders:cart')
+            if order is None:
+                order = create_order(user)
+                request.session['cart_id'] = order.id
+            status, qyt = add_item(order, product, qyt, size=size, user=user)
+        if status == LIMIT:
+            messages.warning(
+                request, f"You can't add more from this product, available only : {qyt}")
             return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+
+        messages.success(request, 'product has been added to cart !')
+        # return redirect('orders:cart')
+        return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
     else:
         messages.warning(
             request, 'You must first log in to your account to purchase the product')
@@ -405,98 +112,43 @@ def cart(request):
     # if request.user.is_authenticated and not request.user.is_anonymous:
     # countries = Country.objects.all().filter().order_by('-name_country')
     countries = allcountries
-    first_country = Country.objects.all(
-    ).filter().order_by('-name_country')[0:1]
     # states = State.objects.filter(country=first_country)
 
-    try:
-        if request.user.is_authenticated and not request.user.is_anonymous:
-            order_view = Order.objects.all().filter(
-                user=request.user, is_finished=False).first()
-            request.session['cart_id'] = order_view.id
-        else:
-            cart_id = request.session.get('cart_id')
-            order_view = Order.objects.all().filter(id=cart_id, is_finished=False)
-
-    except:
-        order_view = False
+    user_id = request.user.id if request.user.is_authenticated else None
+    order = current_order(user_id, request.session.get('cart_id'))
+    session_cart = None
+    if order is None and user_id is None:
+        session_cart = SessionCart(request.session)
+        if session_cart:
+            order = session_cart.order()
 
-    if order_view:
+    if order:
+        if user_id is not None:
+            request.session['cart_id'] = order.id
         try:
             blance = Profile.objects.get(user=request.user).blance
 
         except:
             blance = 0
 
-        if request.user.is_authenticated and not request.user.is_anonymous:
-            order = Order.objects.filter(
-                user=request.user, is_finished=False).first()
-        else:
-            order = Order.objects.get(id=cart_id, is_finished=False)
-
-        order_details = OrderDetails.objects.all().filter(order=order)
-
         coupon_id = None
-        value = None
-        total = None
-        weight = None
         code = None
-        f_total = 0
-        w_total = 0
-        for sub in order_details:
-            f_total += sub.price * sub.quantity
-            w_total += sub.weight * sub.quantity
-            total = f_total
-            weight = w_total
-
+        coupon = None
         if request.session.get("coupon_id"):
-            coupon_id = request.session.get("coupon_id")
-            code = request.session.get("code")
-            if Coupon.objects.all().filter(id=coupon_id):
-                discount = Coupon.objects.get(id=coupon_id).discount
-                value = (discount / Decimal("100")) * f_total
-                total = f_total-value
-                # print(total)
-
-                # order = Order.objects.all().filter(user=request.user, is_finished=False)
-                if order:
-                    if request.user.is_authenticated and not request.user.is_anonymous:
-                        old_orde = Order.objects.get(
-                            user=request.user, is_finished=False)
-                    else:
-                        old_orde = Order.objects.get(
-                            id=cart_id, is_finished=False)
-
-                    old_orde.amount = total
-                    old_orde.discount = value
-                    old_orde.sub_total = f_total
-                    # old_orde = weight
-                    old_orde.coupon = Coupon.objects.get(id=coupon_id)
-                    old_orde.save()
-
-            # else:
-            #     total = f_total
-            #     coupon_id = None
+            coupon = Coupon.objects.filter(id=request.session.get("coupon_id")).first()
+            if coupon:
+                coupon_id = coupon.id
+                code = request.session.get("code")
+
+        if session_cart is not None:
+            order_details = session_cart.lines
+            f_total, weight = order.sub_total, order.weight
+            total, value = coupon_totals(f_total, coupon)
         else:
-            # total = f_total
-            # coupon_id = None
-            if request.user.is_authenticated and not request.user.is_anonymous:
-                old_orde = Order.objects.get(
-                    user=request.user, is_finished=False)
-            else:
-                old_orde = Order.objects.get(
-                    id=cart_id, is_finished=False)
-            old_orde.amount = total
-            old_orde.discount = 0
-            old_orde.sub_total = f_total
-            old_orde.weight = weight
-            old_orde.coupon = None
-            # if request.user.is_authenticated and not request.user.is_anonymous:
-            #     old_orde.user = request.user
-            #     old_orde.email_client = request.user.email
-            old_orde.save()
-
-            # print(total)
+            order_details = OrderDetails.objects.filter(order=order).select_related('product')
+            f_total, weight = order_totals(order.id)
+            # the stored totals follow the coupon
+            total, value = store_totals(order.pk, f_total, weight, coupon)
 
         # if "coupon_id" in request.session.keys():
         #     del request.session["coupon_id"]
@@ -519,152 +171,53 @@ def cart(request):
 
 
 class StatesJsonListView(View):
-    def get(self, *args, **kwargs):
-        country = kwargs.get('country')
-
-        states = None
-        # country_id = Country.objects.get(country_code=country)
-
-        # qs = list(State.objects.all().filter(country=country_id).values())
-        if settings.ARAMEX_USERNAME != "":
-            print("true")
-            data = {
-                'ClientInfo': {
-                    "UserName": f"{settings.ARAMEX_USERNAME}",
-                    "Password": f"{settings.ARAMEX_PASSWORD}",
-                    "Version": f"{settings.ARAMEX_VERSION}",
-                    "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                    "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                    "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                    "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                    "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                },
-                "Transaction": None,
+    def get(self, request, *args, **kwargs):
+        # served from the local gazetteer, see orders/gazetteer.py
+        states, next_cursor = locations(
+            kwargs.get('country'), request.GET.get('q', ''), request.GET.get('cursor'))
+        if states is None:
+            # nothing stored for the country, the form asks for a free text state
+            states = False
 
-                "CountryCode": f"{country}"
-            }
+        return JsonResponse({"success": True, "data": states, "next_cursor": next_cursor}, safe=False)
 
-            url = 'https://ws.aramex.net/ShippingAPI.V2/Location/Service_1_0.svc/xml/FetchStates'
-            r = requests.post(url, json=data)
-            content = r.text
-            soup = BeautifulSoup(content, 'html.parser')
-            # print(soup)
-            cities_list = []
-            cities_tags = soup.find_all("name")
-            for city in cities_tags:
-                cities_list.append(city.text)
-                # print(city.text)
-            # print(len(cities_list))
-
-            if len(cities_list) > 0 and len(country) > 0:
-                states = cities_list
-            else:
-                url = 'https://ws.aramex.net/ShippingAPI.V2/Location/Service_1_0.svc/xml/FetchCities'
-                r = requests.post(url, json=data)
-                # print(r.text)
-                content = r.text
-                soup = BeautifulSoup(content, 'html.parser')
-                cities_tags = soup.find_all("a:string")
-                for city in cities_tags:
-                    cities_list.append(city.text)
-                states = cities_list[0:1000]
-                # print(len(cities_list))
-        else:
-            print("false")
-            states = False
 
-        return JsonResponse({"success": True, "data": states}, safe=False)
-        # return JsonResponse({"success": False, }, safe=False)
+def prefetch_shipping_quote(request):
+    # called by the cart page while the address is typed, see orders/rates.py
+    country_code = request.GET.get('country', '')
+    state = request.GET.get('state', '')
+    if not settings.ARAMEX_USERNAME or not country_code or not state:
+        return JsonResponse({"success": False}, safe=False)
+    order = RequestCart(request).order
+    if order is None:
+        return JsonResponse({"success": False}, safe=False)
+    cached = prefetch_rate_quote(country_code, state, request.GET.get('ZIP', ''), order.weight)
+    return JsonResponse({"success": True, "cached": cached}, safe=False)
 
 
 def remove_item(request, productdeatails_id):
     if not request.session.has_key('currency'):
         request.session['currency'] = settings.DEFAULT_CURRENCY
 
-    # if request.user.is_authenticated and not request.user.is_anonymous and productdeatails_id:
-    item_id = OrderDetails.objects.get(id=productdeatails_id)
-    try:
-        cart_id = request.session.get('cart_id')
-        if item_id.order.id == request.session.get('cart_id'):
-            # if item_id.order.user.id == request.user.id:
-            item = OrderDetails.objects.all().filter(order_id=item_id.order_id).count()
-            if item-1 == 0:
-                # order = Order.objects.all().filter(user=request.user, is_finished=False)
-                try:
-
-                    old_orde = Order.objects.get(
-                        id=cart_id, is_finished=False)
-                    old_orde.delete()
-                    messages.warning(request, ' Product has been deleted ')
-                    return redirect('orders:cart')
-                except:
-                    order_view = False
-                if "coupon_id" in request.session.keys():
-                    del request.session["coupon_id"]
-                messages.warning(request, ' Order has been deleted ')
-                return redirect('orders:cart')
-            else:
-
-                all_orders = Order.objects.all().filter(id=cart_id, is_finished=False)
-                for x in all_orders:
-
-                    order = Order.objects.get(id=x.id)
-
-                    # if OrderDetails.objects.all().filter(order=order) == item_id.id and OrderDetails.objects.all().filter(order=order).exists():
-                    if OrderDetails.objects.all().filter(order=order).exists():
-                        old_orde = Order.objects.get(
-                            id=cart_id, is_finished=False)
-
-                        item_supplier = OrderDetailsSupplier.objects.get(
-                            order_details=item_id)
-
-                        obj_order_supplier = OrderSupplier.objects.get(
-                            is_finished=False, order=old_orde, vendor=item_supplier.product.product_vendor)
-
-                        item_supplier = OrderDetailsSupplier.objects.all().filter(
-                            order_supplier=obj_order_supplier).count()
-
-                        if item_supplier-1 == 0:
-
-                            obj_order_supplier.delete()
-                            item_id.delete()
-
-                            messages.warning(
-                                request, ' Order has been deleted ')
-                            return redirect('orders:cart')
-
-                        else:
-                            item_id.delete()
-                            # code for total order supplier
-                            order_details__supplier = OrderDetailsSupplier.objects.all().filter(
-                                order_supplier=obj_order_supplier)
-                            f_total = 0
-                            w_total = 0
-                            weight = 0
-                            for sub in order_details__supplier:
-                                f_total += sub.price * sub.quantity
-                                w_total += sub.weight * sub.quantity
-                                total = f_total
-                                weight = w_total
-                            obj_order_supplier.weight = weight
-                            obj_order_supplier.amount = total
-                            obj_order_supplier.save()
-                            messages.warning(
-                                request, ' product has been deleted ')
-                            # Logically the product is already deleted because of the relationship
-                            # item_supplier = OrderDetailsSupplier.objects.get(
-                            #     order_details=item_id)
-                            # item_supplier.delete()
-                            return redirect('orders:cart')
-                    else:
-                        messages.warning(
-                            request, "product You can't delete it !")
-                        return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
-    except:
+    user_id = request.user.id if request.user.is_authenticated else None
+    order = current_order(user_id, request.session.get('cart_id'))
+    if order is not None:
+        removed = remove_line(order, productdeatails_id)
+    elif user_id is None:
+        # session cart lines are identified by their product id
+        removed = SessionCart(request.session).remove(productdeatails_id)
+    else:
+        removed = False
+    if not removed:
         messages.warning(request, "product You can't delete it !")
         return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+    if removed == 'order':
+        if "coupon_id" in request.session.keys():
+            del request.session["coupon_id"]
+        messages.warning(request, ' Order has been deleted ')
+    else:
+        messages.warning(request, ' product has been deleted ')
+    return redirect('orders:cart')
 
 
 def payment(request):
@@ -737,80 +290,26 @@ def payment(request):
         state_obj = state
         country_obj = dict(allcountries)[str(country)]
         country_code = country
-        if country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-            product_group = "DOM"
-            product_type = "OND"
-        else:
-            product_group = "EXP"
-            product_type = "PPX"
         # country_obj = Country.objects.get(
         #     country_code=country)
         # country_code = country_obj.country_code
-        cart_id = request.session.get('cart_id')
+        cart_id = start_checkout(request)
         order_weight = Order.objects.get(
             id=cart_id, is_finished=False).weight
         # print(order_weight)
         if settings.ARAMEX_USERNAME != "":
-            data = {
-                'ClientInfo': {
-                    "UserName": f"{settings.ARAMEX_USERNAME}",
-                    "Password": f"{settings.ARAMEX_PASSWORD}",
-                    "Version": f"{settings.ARAMEX_VERSION}",
-                    "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                    "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                    "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                    "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                    "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                },
-                "Transaction": None,
-                "DestinationAddress": {
-                    "Line1": "",
-                    "Line2": "",
-                    "Line3": "",
-                    "PostCode": ZIP,
-                    "City": state,
-                    "CountryCode": country_code
-                },
-                "OriginAddress": {
-                    "Line1": "",
-                    "Line2": "",
-                    "Line3": "",
-                    "PostCode": "",
-                    "City": "Amman",
-                    "CountryCode": "JO"
-                },
-                "ShipmentDetails": {
-                    "Dimensions": None,
-                    "DescriptionOfGoods": "",
-                    "GoodsOriginCountry": "",
-                    "PaymentOptions": "",
-                    "PaymentType": "P",
-                    "ProductGroup": product_group,
-                    "ProductType": product_type,
-                    "ActualWeight": {
-                        "Value": float(order_weight),
-                        "Unit": "KG"
-                    },
-                    "ChargeableWeight": None,
-                    "NumberOfPieces": "1"
-
-                }
-            }
-
-            url = 'https://ws.aramex.net/ShippingAPI.V2/RateCalculator/Service_1_0.svc/json/CalculateRate'
-            r = requests.post(url, json=data)
-            soup = BeautifulSoup(r.content, 'html.parser')
             try:
-                if soup.code.string == "ERR01" or soup.code.string == "ERR52" or soup.code.string == "ERR61" or soup.code.string == "ERR04":
-                    messages.warning(request, f'{soup.message.string}')
-                    return redirect('orders:cart')
-            except:
-                pass
-            shipping = float(soup.value.string)*1.41
+                quote = rate_quote(country_code, state, ZIP, order_weight)
+            except gateways.GatewayError:
+                # Aramex is down or its circuit is open, nothing was cached
+                messages.warning(request, 'Shipping is not available for this address')
+                return redirect('orders:cart')
+            if quote.address_error or quote.value is None:
+                messages.warning(request, quote.message or 'Shipping is not available for this address')
+                return redirect('orders:cart')
+            shipping = quote.value*1.41
             # print(shipping)
-            currency_code = soup.currencycode.string
+            currency_code = quote.currency
 
         order = Order.objects.all().filter(id=cart_id, is_finished=False)
 
@@ -859,8 +358,7 @@ def payment(request):
                 payment_info = Payment.objects.get(order=old_orde)
             payment = None
             if RAZORPAY_KEY_ID:
-                client = razorpay.Client(
-                    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+                client = gateways.razorpay_client()
                 data = {
                     "amount": float(old_orde.amount) * 7828,
                     "currency": "INR",
@@ -912,244 +410,21 @@ def payment_blance(request):
     if not request.user.is_authenticated and request.user.is_anonymous:
         return redirect('accounts:login')
 
-    order = Order.objects.all().filter(user=request.user, is_finished=False)
-
-    if order:
-        old_orde = Order.objects.get(user=request.user, is_finished=False)
-        try:
-            Consignee_id = old_orde.user.id
-            Consignee_email = old_orde.user.email
-        except:
-            pass
-
-        profile = Profile.objects.get(user=request.user)
-        if float(old_orde.amount) <= float(profile.blance):
-            # print(f"{old_orde.amount} - {profile.blance}")
-
-            # order_payment = Payment.objects.create(
-
-            #     order=old_orde,
-            #     by_blance=True
-            # )
-            payment_method = Payment.objects.get(order=old_orde)
-            payment_method.payment_method = "Blance"
-            payment_method.save()
-
-            if settings.ARAMEX_USERNAME != "":
-                if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                    product_group = "DOM"
-                    product_type = "OND"
-                else:
-                    product_group = "EXP"
-                    product_type = "PPX"
-                data = {
-                    "ClientInfo": {
-                        "UserName": f"{settings.ARAMEX_USERNAME}",
-                        "Password": f"{settings.ARAMEX_PASSWORD}",
-                        "Version": f"{settings.ARAMEX_VERSION}",
-                        "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                        "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                        "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                        "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                        "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                    },
-
-                    "LabelInfo": {
-                        "ReportID": 9201,
-                        "ReportType": "URL"
-                    },
-                    "Shipments": [
-                        {
-                            "Reference1": f"{old_orde}",
-                            "Reference2": "",
-                            "Reference3": "",
-                            "Shipper": {
-                                "Reference1": f"{old_orde}",
-                                "Reference2": "",
-                                "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                "PartyAddress": {
-                                    "Line1": "Oman",
-                                    "Line2": "",
-                                    "Line3": "",
-                                    "City": "Oman",
-                                    "StateOrProvinceCode": "",
-                                    "PostCode": "",
-                                    "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                    "Longitude": 0,
-                                    "Latitude": 0,
-                                    "BuildingNumber": None,
-                                    "BuildingName": None,
-                                    "Floor": None,
-                                    "Apartment": None,
-                                    "POBox": None,
-                                    "Description": "alithemes.com product"
-                                },
-                                "Contact": {
-                                    "Department": "",
-                                    "PersonName": "alithemes.com store",
-                                    "Title": "",
-                                    "CompanyName": "alithemes.com",
-                                    "PhoneNumber1": "1111111111",
-                                    "PhoneNumber1Ext": "",
-                                    "PhoneNumber2": "",
-                                    "PhoneNumber2Ext": "",
-                                    "FaxNumber": "",
-                                    "CellPhone": "1111111111111",
-                                    "EmailAddress": "mail@alithemes.com",
-                                    "Type": ""
-                                }
-                            },
-                            "Consignee": {
-                                "Reference1": f"{Consignee_id}",
-                                "Reference2": f"{Consignee_email}",
-                                "AccountNumber": f"{Consignee_id}",
-                                "PartyAddress": {
-                                    "Line1": f"{payment_method.street_address}",
-                                    "Line2": "",
-                                    "Line3": "",
-                                    "City": f"{payment_method.City}",
-                                    "StateOrProvinceCode": f"{payment_method.state}",
-                                    "PostCode": f"{payment_method.post_code}",
-                                    "CountryCode": f"{payment_method.country_code}",
-                                    "Longitude": 0,
-                                    "Latitude": 0,
-                                    "BuildingNumber": "",
-                                    "BuildingName": "",
-                                    "Floor": "",
-                                    "Apartment": "",
-                                    "POBox": None,
-                                    "Description": "Please contact me when the shipment arrives"
-                                },
-                                "Contact": {
-                                    "Department": "",
-                                    "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                    "Title": f"{payment_method.last_name}",
-                                    "CompanyName": "",
-                                    "PhoneNumber1": f"{payment_method.phone}",
-                                    "PhoneNumber1Ext": "",
-                                    "PhoneNumber2": "",
-                                    "PhoneNumber2Ext": "",
-                                    "FaxNumber": "",
-                                    "CellPhone": f"{payment_method.phone}",
-                                    "EmailAddress": f"{payment_method.Email_Address}",
-                                    "Type": ""
-                                }
-                            },
-                            "ThirdParty": {
-                                "Reference1": "",
-                                "Reference2": "",
-                                "AccountNumber": "",
-                                "PartyAddress": {
-                                    "Line1": "",
-                                    "Line2": "",
-                                    "Line3": "",
-                                    "City": "",
-                                    "StateOrProvinceCode": "",
-                                    "PostCode": "",
-                                    "CountryCode": "",
-                                    "Longitude": 0,
-                                    "Latitude": 0,
-                                    "BuildingNumber": None,
-                                    "BuildingName": None,
-                                    "Floor": None,
-                                    "Apartment": None,
-                                    "POBox": None,
-                                    "Description": None
-                                },
-                                "Contact": {
-                                    "Department": "",
-                                    "PersonName": "",
-                                    "Title": "",
-                                    "CompanyName": "",
-                                    "PhoneNumber1": "",
-                                    "PhoneNumber1Ext": "",
-                                    "PhoneNumber2": "",
-                                    "PhoneNumber2Ext": "",
-                                    "FaxNumber": "",
-                                    "CellPhone": "",
-                                    "EmailAddress": "",
-                                    "Type": ""
-                                }
-                            },
-                            "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                            "DueDate": str('/Date(' + str(time) + ')/'),
-                            "Comments": "",
-                            "PickupLocation": "",
-                            "OperationsInstructions": "",
-                            "AccountingInstrcutions": "",
-                            "Details": {
-                                "Dimensions": None,
-                                "ActualWeight": {
-                                        "Unit": "KG",
-                                        "Value": float(old_orde.weight)
-                                },
-                                "ChargeableWeight": None,
-                                "DescriptionOfGoods": None,
-                                "GoodsOriginCountry": "IN",
-                                "NumberOfPieces": 1,
-                                "ProductGroup": product_group,
-                                "ProductType": product_type,
-                                "PaymentType": "P",
-                                "PaymentOptions": "",
-                                "CustomsValueAmount": None,
-                                "CashOnDeliveryAmount": None,
-                                "InsuranceAmount": None,
-                                "CashAdditionalAmount": None,
-                                "CashAdditionalAmountDescription": "",
-                                "CollectAmount": None,
-                                "Services": "",
-                                "Items": []
-                            },
-                            "Attachments": [],
-                            "ForeignHAWB": "",
-                            "TransportType ": 0,
-                            "PickupGUID": "",
-                            "Number": None,
-                            "ScheduledDelivery": None
-                        }
-                    ],
-                    "Transaction": None
-
-                }
-
-                url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-                r = requests.post(url, json=data)
-                soup = BeautifulSoup(r.content, 'html.parser')
-                # print(soup)
-                old_orde.tracking_no = soup.id.string
-                old_orde.rpt_cache = soup.labelurl.string
-
-            old_orde.is_finished = True
-            old_orde.status = "Underway"
-            old_orde.save()
-            profile.blance = float(profile.blance) - float(old_orde.amount)
-            profile.save()
-
-            obj_order_suppliers = OrderSupplier.objects.all().filter(
-                user=request.user,  order=old_orde)
-            for obj_order_supplier in obj_order_suppliers:
-                # order_details__supplier = OrderDetailsSupplier.objects.all().filter(
-                #     order_supplier=obj_order_supplier, order=old_orde)
-                # f_total = 0
-                # w_total = 0
-                # weight = 0
-                # for sub in order_details__supplier:
-                #     f_total += sub.price * sub.quantity
-                #     w_total += sub.weight * sub.quantity
-                #     total = f_total
-                #     weight = w_total
-                supplier = Profile.objects.get(id=obj_order_supplier.vendor.id)
-                supplier.blance = float(
-                    supplier.blance) + float(obj_order_supplier.amount)
-                supplier.save()
-
+    old_orde = current_order(request.user.id)
+
+    if old_orde:
+        amount = float(old_orde.amount)
+        finished = False
+        with transaction.atomic():
+            # the balance is taken in the transaction that finishes the order
+            if Profile.objects.filter(user=request.user, blance__gte=amount).update(
+                    blance=F('blance') - amount):
+                finished = finalize_order(old_orde.id, "Blance", old_orde.id)
+                if not finished:
+                    transaction.set_rollback(True)
+        if finished:
             if "coupon_id" in request.session.keys():
                 del request.session["coupon_id"]
-            # messages.success(
-            #     request, ' Great, you have completed your purchase, we will work to complete your order from our side')
-
             return redirect("orders:success")
         else:
             messages.warning(
@@ -1162,246 +437,12 @@ def payment_blance(request):
 def payment_cash(request):
 
     cart_id = request.session.get('cart_id')
-    order = Order.objects.all().filter(id=cart_id, is_finished=False)
-
-    if order:
-        old_orde = Order.objects.get(id=cart_id, is_finished=False)
-        try:
-            Consignee_id = old_orde.user.id
-            Consignee_email = old_orde.user.email
-        except:
-            pass
-        # profile = Profile.objects.get(user=request.user)
-
-        payment_method = Payment.objects.get(order=old_orde)
-        payment_method.payment_method = "Cash"
-        payment_method.save()
-
-        if settings.ARAMEX_USERNAME != "":
-            if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                product_group = "DOM"
-                product_type = "OND"
-            else:
-                product_group = "EXP"
-                product_type = "PPX"
-            data = {
-                "ClientInfo": {
-                    "UserName": f"{settings.ARAMEX_USERNAME}",
-                    "Password": f"{settings.ARAMEX_PASSWORD}",
-                    "Version": f"{settings.ARAMEX_VERSION}",
-                    "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                    "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                    "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                    "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                    "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                },
-
-                "LabelInfo": {
-                    "ReportID": 9201,
-                    "ReportType": "URL"
-                },
-                "Shipments": [
-                    {
-                        "Reference1": f"{old_orde}",
-                        "Reference2": "",
-                        "Reference3": "",
-                        "Shipper": {
-                            "Reference1": f"{old_orde}",
-                            "Reference2": "",
-                            "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                            "PartyAddress": {
-                                "Line1": "Oman",
-                                "Line2": "",
-                                "Line3": "",
-                                "City": "Oman",
-                                "StateOrProvinceCode": "",
-                                "PostCode": "",
-                                "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                "Longitude": 0,
-                                "Latitude": 0,
-                                "BuildingNumber": None,
-                                "BuildingName": None,
-                                "Floor": None,
-                                "Apartment": None,
-                                "POBox": None,
-                                "Description": "alithemes.com product"
-                            },
-                            "Contact": {
-                                "Department": "",
-                                "PersonName": "alithemes.com store",
-                                "Title": "",
-                                "CompanyName": "alithemes.com",
-                                "PhoneNumber1": "1111111111",
-                                "PhoneNumber1Ext": "",
-                                "PhoneNumber2": "",
-                                "PhoneNumber2Ext": "",
-                                "FaxNumber": "",
-                                "CellPhone": "1111111111111",
-                                "EmailAddress": "mail@alithemes.com",
-                                "Type": ""
-                            }
-                        },
-                        "Consignee": {
-                            "Reference1": f"{Consignee_id}",
-                            "Reference2": f"{Consignee_email}",
-                            "AccountNumber": f"{Consignee_id}",
-                            "PartyAddress": {
-                                "Line1": f"{payment_method.street_address}",
-                                "Line2": "",
-                                "Line3": "",
-                                "City": f"{payment_method.City}",
-                                "StateOrProvinceCode": f"{payment_method.state}",
-                                "PostCode": f"{payment_method.post_code}",
-                                "CountryCode": f"{payment_method.country_code}",
-                                "Longitude": 0,
-                                "Latitude": 0,
-                                "BuildingNumber": "",
-                                "BuildingName": "",
-                                "Floor": "",
-                                "Apartment": "",
-                                "POBox": None,
-                                "Description": "Please contact me when the shipment arrives"
-                            },
-                            "Contact": {
-                                "Department": "",
-                                "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                "Title": f"{payment_method.last_name}",
-                                "CompanyName": "",
-                                "PhoneNumber1": f"{payment_method.phone}",
-                                "PhoneNumber1Ext": "",
-                                "PhoneNumber2": "",
-                                "PhoneNumber2Ext": "",
-                                "FaxNumber": "",
-                                "CellPhone": f"{payment_method.phone}",
-                                "EmailAddress": f"{payment_method.Email_Address}",
-                                "Type": ""
-                            }
-                        },
-                        "ThirdParty": {
-                            "Reference1": "",
-                            "Reference2": "",
-                            "AccountNumber": "",
-                            "PartyAddress": {
-                                "Line1": "",
-                                "Line2": "",
-                                "Line3": "",
-                                "City": "",
-                                "StateOrProvinceCode": "",
-                                "PostCode": "",
-                                "CountryCode": "",
-                                "Longitude": 0,
-                                "Latitude": 0,
-                                "BuildingNumber": None,
-                                "BuildingName": None,
-                                "Floor": None,
-                                "Apartment": None,
-                                "POBox": None,
-                                "Description": None
-                            },
-                            "Contact": {
-                                "Department": "",
-                                "PersonName": "",
-                                "Title": "",
-                                "CompanyName": "",
-                                "PhoneNumber1": "",
-                                "PhoneNumber1Ext": "",
-                                "PhoneNumber2": "",
-                                "PhoneNumber2Ext": "",
-                                "FaxNumber": "",
-                                "CellPhone": "",
-                                "EmailAddress": "",
-                                "Type": ""
-                            }
-                        },
-                        "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                        "DueDate": str('/Date(' + str(time) + ')/'),
-                        "Comments": "",
-                        "PickupLocation": "",
-                        "OperationsInstructions": "",
-                        "AccountingInstrcutions": "",
-                        "Details": {
-                            "Dimensions": None,
-                            "ActualWeight": {
-                                    "Unit": "KG",
-                                    "Value": float(old_orde.weight)
-                            },
-                            "ChargeableWeight": None,
-                            "DescriptionOfGoods": None,
-                            "GoodsOriginCountry": "IN",
-                            "NumberOfPieces": 1,
-                            "ProductGroup": product_group,
-                            "ProductType": product_type,
-                            "PaymentType": "P",
-                            "PaymentOptions": "",
-                            "CustomsValueAmount": None,
-                            "CashOnDeliveryAmount": None,
-                            "InsuranceAmount": None,
-                            "CashAdditionalAmount": None,
-                            "CashAdditionalAmountDescription": "",
-                            "CollectAmount": None,
-                            "Services": "",
-                            "Items": []
-                        },
-                        "Attachments": [],
-                        "ForeignHAWB": "",
-                        "TransportType ": 0,
-                        "PickupGUID": "",
-                        "Number": None,
-                        "ScheduledDelivery": None
-                    }
-                ],
-                "Transaction": None
-
-            }
-
-            url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-            r = requests.post(url, json=data)
-            soup = BeautifulSoup(r.content, 'html.parser')
-            old_orde.tracking_no = soup.id.string
-            old_orde.rpt_cache = soup.labelurl.string
-
-        old_orde.is_finished = True
-        old_orde.status = "Underway"
-        old_orde.save()
-        # code for set supplier's balance
-        # order_details = OrderDetails.objects.all().filter(order=old_orde)
-        # for order_detail in order_details:
-        # item_supplier_details = OrderDetailsSupplier.objects.all().filter(
-        #     order=old_orde)
-        # for item_supplier in item_supplier_details:
-        obj_order_suppliers = OrderSupplier.objects.all().filter(order=old_orde)
-        for obj_order_supplier in obj_order_suppliers:
-            # order_details__supplier = OrderDetailsSupplier.objects.all().filter(
-            #     order_supplier=obj_order_supplier, order=old_orde)
-            # f_total = 0
-            # w_total = 0
-            # weight = 0
-            # for sub in order_details__supplier:
-            #     f_total += sub.price * sub.quantity
-            #     w_total += sub.weight * sub.quantity
-            #     total = f_total
-            #     weight = w_total
-            supplier = Profile.objects.get(id=obj_order_supplier.vendor.id)
-            supplier.blance = float(
-                supplier.blance) + float(obj_order_supplier.amount)
-            supplier.save()
+    old_orde = current_order(order_id=cart_id)
 
+    if old_orde:
+        finalize_order(old_orde.id, "Cash", old_orde.id)
         if "coupon_id" in request.session.keys():
             del request.session["coupon_id"]
-
-        try:
-            send_mail(
-                'Great! Order ID{}. has been successfully purchased'.format(
-                    old_orde.id),
-                ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                f'{settings.EMAIL_SENDGRID}',
-                [f'{payment_method.Email_Address}'],
-                fail_silently=False,
-            )
-        except:
-            pass
         return redirect("orders:success")
 
     # return redirect("orders:payment")
@@ -1456,13 +497,7 @@ def create_checkout_session(request):
             'id': checkout_session.id
         })
     except Exception as e:
-        send_mail(
-            'Order  has not been completed , ',
-            ' {}'.format(e),
-            f'{settings.EMAIL_SENDGRID}',
-            [f'{settings.DEBUG_EMAIL}'],
-            fail_silently=False,
-        )
+        enqueue_alert('Order  has not been completed , ', ' {}'.format(e))
         return HttpResponse(str(e))
 
 
@@ -1479,24 +514,12 @@ def my_webhook_view(request):
         )
     except ValueError as e:
         # print(" Invalid payload")
-        send_mail(
-            'Order  has not been completed , Invalid payload',
-            ' {}'.format(e),
-            f'{settings.EMAIL_SENDGRID}',
-            [f'{settings.DEBUG_EMAIL}'],
-            fail_silently=False,
-        )
+        enqueue_alert('Order  has not been completed , Invalid payload', ' {}'.format(e))
         return HttpResponse(status=400)
 
     except stripe.error.SignatureVerificationError as e:
         # print("Invalid signature")
-        send_mail(
-            'Order  has not been completed , Invalid signature',
-            ' {}'.format(e),
-            f'{settings.EMAIL_SENDGRID}',
-            [f'{settings.DEBUG_EMAIL}'],
-            fail_silently=False,
-        )
+        enqueue_alert('Order  has not been completed , Invalid signature', ' {}'.format(e))
         return HttpResponse(status=400)
 
     # Handle the checkout.session.completed event
@@ -1508,497 +531,29 @@ def my_webhook_view(request):
             order_id = session["metadata"]["order_id"]
             request.session['order_id'] = order_id
 
-            order = Order.objects.all().filter(id=order_id, is_finished=False)
-
-            if order:
-                old_orde = Order.objects.get(id=order_id, is_finished=False)
-                try:
-                    Consignee_id = old_orde.user.id
-                    Consignee_email = old_orde.user.email
-                except:
-                    pass
-                payment_method = Payment.objects.get(order=old_orde)
-                payment_method.payment_method = "Stripe"
-                payment_method.save()
-
-                if settings.ARAMEX_USERNAME != "":
-                    if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                        product_group = "DOM"
-                        product_type = "OND"
-                    else:
-                        product_group = "EXP"
-                        product_type = "PPX"
-                    data = {
-                        "ClientInfo": {
-                            "UserName": f"{settings.ARAMEX_USERNAME}",
-                            "Password": f"{settings.ARAMEX_PASSWORD}",
-                            "Version": f"{settings.ARAMEX_VERSION}",
-                            "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                            "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                            "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                            "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                            "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                        },
-
-                        "LabelInfo": {
-                            "ReportID": 9201,
-                            "ReportType": "URL"
-                        },
-                        "Shipments": [
-                            {
-                                "Reference1": f"{old_orde}",
-                                "Reference2": "",
-                                "Reference3": "",
-                                "Shipper": {
-                                    "Reference1": f"{old_orde}",
-                                    "Reference2": "",
-                                    "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                    "PartyAddress": {
-                                        "Line1": "Oman",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": "Oman",
-                                        "StateOrProvinceCode": "",
-                                        "PostCode": "",
-                                        "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": None,
-                                        "BuildingName": None,
-                                        "Floor": None,
-                                        "Apartment": None,
-                                        "POBox": None,
-                                        "Description": "alithemes.com product"
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": "alithemes.com store",
-                                        "Title": "",
-                                        "CompanyName": "alithemes.com",
-                                        "PhoneNumber1": "1111111111",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": "1111111111111",
-                                        "EmailAddress": "mail@alithemes.com",
-                                        "Type": ""
-                                    }
-                                },
-                                "Consignee": {
-                                    "Reference1": f"{Consignee_id}",
-                                    "Reference2": f"{Consignee_email}",
-                                    "AccountNumber": f"{Consignee_id}",
-                                    "PartyAddress": {
-                                        "Line1": f"{payment_method.street_address}",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": f"{payment_method.City}",
-                                        "StateOrProvinceCode": f"{payment_method.state}",
-                                        "PostCode": f"{payment_method.post_code}",
-                                        "CountryCode": f"{payment_method.country_code}",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": "",
-                                        "BuildingName": "",
-                                        "Floor": "",
-                                        "Apartment": "",
-                                        "POBox": None,
-                                        "Description": "Please contact me when the shipment arrives"
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                        "Title": f"{payment_method.last_name}",
-                                        "CompanyName": "",
-                                        "PhoneNumber1": f"{payment_method.phone}",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": f"{payment_method.phone}",
-                                        "EmailAddress": f"{payment_method.Email_Address}",
-                                        "Type": ""
-                                    }
-                                },
-                                "ThirdParty": {
-                                    "Reference1": "",
-                                    "Reference2": "",
-                                    "AccountNumber": "",
-                                    "PartyAddress": {
-                                        "Line1": "",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": "",
-                                        "StateOrProvinceCode": "",
-                                        "PostCode": "",
-                                        "CountryCode": "",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": None,
-                                        "BuildingName": None,
-                                        "Floor": None,
-                                        "Apartment": None,
-                                        "POBox": None,
-                                        "Description": None
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": "",
-                                        "Title": "",
-                                        "CompanyName": "",
-                                        "PhoneNumber1": "",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": "",
-                                        "EmailAddress": "",
-                                        "Type": ""
-                                    }
-                                },
-                                "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                                "DueDate": str('/Date(' + str(time) + ')/'),
-                                "Comments": "",
-                                "PickupLocation": "",
-                                "OperationsInstructions": "",
-                                "AccountingInstrcutions": "",
-                                "Details": {
-                                    "Dimensions": None,
-                                    "ActualWeight": {
-                                        "Unit": "KG",
-                                        "Value": float(old_orde.weight)
-                                    },
-                                    "ChargeableWeight": None,
-                                    "DescriptionOfGoods": None,
-                                    "GoodsOriginCountry": "IN",
-                                    "NumberOfPieces": 1,
-                                    "ProductGroup": product_group,
-                                    "ProductType": product_type,
-                                    "PaymentType": "P",
-                                    "PaymentOptions": "",
-                                    "CustomsValueAmount": None,
-                                    "CashOnDeliveryAmount": None,
-                                    "InsuranceAmount": None,
-                                    "CashAdditionalAmount": None,
-                                    "CashAdditionalAmountDescription": "",
-                                    "CollectAmount": None,
-                                    "Services": "",
-                                    "Items": []
-                                },
-                                "Attachments": [],
-                                "ForeignHAWB": "",
-                                "TransportType ": 0,
-                                "PickupGUID": "",
-                                "Number": None,
-                                "ScheduledDelivery": None
-                            }
-                        ],
-                        "Transaction": None
-
-                    }
-
-                    url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-                    r = requests.post(url, json=data)
-                    # print(type(r.content) )
-                    soup = BeautifulSoup(r.content, 'html.parser')
-                    # print(soup)
-                    old_orde.tracking_no = soup.id.string
-                    old_orde.rpt_cache = soup.labelurl.string
-
-                # delete available
-                products_details = OrderDetails.objects.all().filter(order=old_orde)
-                for pro in products_details:
-                    product_order = Product.objects.get(
-                        id=pro.product.id)
-                    if product_order.available > 0:
-                        product_order.available = product_order.available - pro.quantity
-                        product_order.save()
-
-                old_orde.is_finished = True
-                old_orde.status = "Underway"
-                old_orde.save()
-
-                # code for set supplier's balance
-                obj_order_suppliers = OrderSupplier.objects.all().filter(order=old_orde)
-                for obj_order_supplier in obj_order_suppliers:
-                    supplier = Profile.objects.get(
-                        id=obj_order_supplier.vendor.id)
-                    supplier.blance = float(
-                        supplier.blance) + float(obj_order_supplier.amount)
-                    supplier.save()
-                try:
-
-                    send_mail(
-                        'Great! Order ID{}. has been successfully purchased'.format(
-                            order_id),
-                        ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                        f'{settings.EMAIL_SENDGRID}',
-                        [f'{customer_email}'],
-                        fail_silently=False,
-                    )
-                except:
-                    pass
-                if "coupon_id" in request.session.keys():
-                    del request.session["coupon_id"]
+            finalize_order(order_id, "Stripe", session["id"], email=customer_email)
+            if "coupon_id" in request.session.keys():
+                del request.session["coupon_id"]
 
     elif event['type'] == 'checkout.session.async_payment_succeeded':
         session = event['data']['object']
         customer_email = session["customer_details"]["email"]
         order_id = session["metadata"]["order_id"]
-        order = Order.objects.all().filter(id=order_id, is_finished=False)
         request.session['order_id'] = order_id
-        if order:
-            old_orde = Order.objects.get(id=order_id, is_finished=False)
-            try:
-                Consignee_id = old_orde.user.id
-                Consignee_email = old_orde.user.email
-            except:
-                pass
-            payment_method = Payment.objects.get(order=old_orde)
-            payment_method.payment_method = "Stripe"
-            payment_method.save()
-
-            if settings.ARAMEX_USERNAME != "":
-                if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                    product_group = "DOM"
-                    product_type = "OND"
-                else:
-                    product_group = "EXP"
-                    product_type = "PPX"
-                data = {
-                    "ClientInfo": {
-                        "UserName": f"{settings.ARAMEX_USERNAME}",
-                        "Password": f"{settings.ARAMEX_PASSWORD}",
-                        "Version": f"{settings.ARAMEX_VERSION}",
-                        "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                        "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                        "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                        "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                        "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                    },
-
-                    "LabelInfo": {
-                        "ReportID": 9201,
-                        "ReportType": "URL"
-                    },
-                    "Shipments": [
-                        {
-                            "Reference1": f"{old_orde}",
-                            "Reference2": "",
-                            "Reference3": "",
-                            "Shipper": {
-                                "Reference1": f"{old_orde}",
-                                "Reference2": "",
-                                "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                "PartyAddress": {
-                                    "Line1": "Oman",
-                                    "Line2": "",
-                                    "Line3": "",
-                                    "City": "Oman",
-                                    "StateOrProvinceCode": "",
-                                    "PostCode": "",
-                                    "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                    "Longitude": 0,
-                                    "Latitude": 0,
-                                    "BuildingNumber": None,
-                                    "BuildingName": None,
-                                    "Floor": None,
-                                    "Apartment": None,
-                                    "POBox": None,
-                                    "Description": "alithemes.com product"
-                                },
-                                "Contact": {
-                                    "Department": "",
-                                    "PersonName": "alithemes.com store",
-                                    "Title": "",
-                                    "CompanyName": "alithemes.com",
-                                    "PhoneNumber1": "1111111111",
-                                    "PhoneNumber1Ext": "",
-                                    "PhoneNumber2": "",
-                                    "PhoneNumber2Ext": "",
-                                    "FaxNumber": "",
-                                    "CellPhone": "1111111111111",
-                                    "EmailAddress": "mail@alithemes.com",
-                                    "Type": ""
-                                }
-                            },
-                            "Consignee": {
-                                "Reference1": f"{Consignee_id}",
-                                "Reference2": f"{Consignee_email}",
-                                "AccountNumber": f"{Consignee_id}",
-                                "PartyAddress": {
-                                    "Line1": f"{payment_method.street_address}",
-                                    "Line2": "",
-                                    "Line3": "",
-                                    "City": f"{payment_method.City}",
-                                    "StateOrProvinceCode": f"{payment_method.state}",
-                                    "PostCode": f"{payment_method.post_code}",
-                                    "CountryCode": f"{payment_method.country_code}",
-                                    "Longitude": 0,
-                                    "Latitude": 0,
-                                    "BuildingNumber": "",
-                                    "BuildingName": "",
-                                    "Floor": "",
-                                    "Apartment": "",
-                                    "POBox": None,
-                                    "Description": "Please contact me when the shipment arrives"
-                                },
-                                "Contact": {
-                                    "Department": "",
-                                    "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                    "Title": f"{payment_method.last_name}",
-                                    "CompanyName": "",
-                                    "PhoneNumber1": f"{payment_method.phone}",
-                                    "PhoneNumber1Ext": "",
-                                    "PhoneNumber2": "",
-                                    "PhoneNumber2Ext": "",
-                                    "FaxNumber": "",
-                                    "CellPhone": f"{payment_method.phone}",
-                                    "EmailAddress": f"{payment_method.Email_Address}",
-                                    "Type": ""
-                                }
-                            },
-                            "ThirdParty": {
-                                "Reference1": "",
-                                "Reference2": "",
-                                "AccountNumber": "",
-                                "PartyAddress": {
-                                    "Line1": "",
-                                    "Line2": "",
-                                    "Line3": "",
-                                    "City": "",
-                                    "StateOrProvinceCode": "",
-                                    "PostCode": "",
-                                    "CountryCode": "",
-                                    "Longitude": 0,
-                                    "Latitude": 0,
-                                    "BuildingNumber": None,
-                                    "BuildingName": None,
-                                    "Floor": None,
-                                    "Apartment": None,
-                                    "POBox": None,
-                                    "Description": None
-                                },
-                                "Contact": {
-                                    "Department": "",
-                                    "PersonName": "",
-                                    "Title": "",
-                                    "CompanyName": "",
-                                    "PhoneNumber1": "",
-                                    "PhoneNumber1Ext": "",
-                                    "PhoneNumber2": "",
-                                    "PhoneNumber2Ext": "",
-                                    "FaxNumber": "",
-                                    "CellPhone": "",
-                                    "EmailAddress": "",
-                                    "Type": ""
-                                }
-                            },
-                            "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                            "DueDate": str('/Date(' + str(time) + ')/'),
-                            "Comments": "",
-                            "PickupLocation": "",
-                            "OperationsInstructions": "",
-                            "AccountingInstrcutions": "",
-                            "Details": {
-                                "Dimensions": None,
-                                "ActualWeight": {
-                                        "Unit": "KG",
-                                        "Value": float(old_orde.weight)
-                                },
-                                "ChargeableWeight": None,
-                                "DescriptionOfGoods": None,
-                                "GoodsOriginCountry": "IN",
-                                "NumberOfPieces": 1,
-                                "ProductGroup": product_group,
-                                "ProductType": product_type,
-                                "PaymentType": "P",
-                                "PaymentOptions": "",
-                                "CustomsValueAmount": None,
-                                "CashOnDeliveryAmount": None,
-                                "InsuranceAmount": None,
-                                "CashAdditionalAmount": None,
-                                "CashAdditionalAmountDescription": "",
-                                "CollectAmount": None,
-                                "Services": "",
-                                "Items": []
-                            },
-                            "Attachments": [],
-                            "ForeignHAWB": "",
-                            "TransportType ": 0,
-                            "PickupGUID": "",
-                            "Number": None,
-                            "ScheduledDelivery": None
-                        }
-                    ],
-                    "Transaction": None
-
-                }
-
-                url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-                r = requests.post(url, json=data)
-                # print(type(r.content) )
-                soup = BeautifulSoup(r.content, 'html.parser')
-                # print(soup)
-                old_orde.tracking_no = soup.id.string
-                old_orde.rpt_cache = soup.labelurl.string
-
-            # delete available
-            products_details = OrderDetails.objects.all().filter(order=old_orde)
-            for pro in products_details:
-                product_order = Product.objects.get(
-                    id=pro.product.id)
-                if product_order.available > 0:
-                    product_order.available = product_order.available - pro.quantity
-                    product_order.save()
-
-            old_orde.is_finished = True
-            old_orde.status = "Underway"
-            old_orde.save()
-
-            # code for set supplier's balance
-            obj_order_suppliers = OrderSupplier.objects.all().filter(order=old_orde)
-            for obj_order_supplier in obj_order_suppliers:
-                supplier = Profile.objects.get(
-                    id=obj_order_supplier.vendor.id)
-                supplier.blance = float(
-                    supplier.blance) + float(obj_order_supplier.amount)
-                supplier.save()
-            try:
-                send_mail(
-                    'Order ID {}. has been successfully purchased'.format(
-                        order_id),
-                    ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                    f'{settings.EMAIL_SENDGRID}',
-                    [f'{customer_email}'],
-                    fail_silently=False,
-                )
-            except:
-                pass
-            if "coupon_id" in request.session.keys():
-                del request.session["coupon_id"]
+        finalize_order(order_id, "Stripe", session["id"], email=customer_email)
+        if "coupon_id" in request.session.keys():
+            del request.session["coupon_id"]
 
     elif event['type'] == 'checkout.session.async_payment_failed':
         session = event['data']['object']
         customer_email = session["customer_details"]["email"]
         order_id = session["metadata"]["order_id"]
         request.session['order_id'] = order_id
-        try:
-            send_mail(
-                'Order NO. {}. has not been completed , payment_failed'.format(
-                    order_id),
-                f'{settings.EMAIL_SENDGRID}',
-                [f'{customer_email}'],
-                fail_silently=False,
-            )
-        except:
-            pass
-    # Send an email to the customer asking them to retry their order
+        # Send an email to the customer asking them to retry their order
+        enqueue_mail(
+            'Order NO. {}. has not been completed , payment_failed'.format(order_id),
+            ' Your payment could not be completed, please try your order again.',
+            [f'{customer_email}'], key=f'payment-failed:{session["id"]}')
 
     return HttpResponse(status=200)
 
@@ -2017,8 +572,8 @@ def checkout_payment_paymob(request, id):
         data_authentication = {
             "api_key": settings.API_KEY
         }
-        request_api_token = requests.post(
-            url_authentication, json=data_authentication).json()
+        request_api_token = gateways.post(
+            'paymob', url_authentication, json=data_authentication, idempotent=True).json()
         account_token = request_api_token["token"]
 
         merchant_order_id = f'{order_id}-{code_generator()}'
@@ -2043,8 +598,8 @@ def checkout_payment_paymob(request, id):
             "shipping_data": {},
             "shipping_details": {}
         }
-        request_order_registration = requests.post(
-            url_order_registration, json=data_order_registration).json()
+        request_order_registration = gateways.post(
+            'paymob', url_order_registration, json=data_order_registration).json()
 
         order_registration_id = request_order_registration["id"]
         # Payment Key Request
@@ -2073,8 +628,8 @@ def checkout_payment_paymob(request, id):
             "integration_id": settings.PAYMENT_INTEGRATIONS_ID,
             "lock_order_when_paid": "false"
         }
-        request_payment_key = requests.post(
-            url_payment_key, json=data_payment_key).json()
+        request_payment_key = gateways.post(
+            'paymob', url_payment_key, json=data_payment_key).json()
 
         payment_key_token = request_payment_key["token"]
         # merchant_order_id and order_registration_id will used to get booking order
@@ -2105,243 +660,14 @@ def my_webhook_view_paymob(request, *args, **kwargs):
             data_retrieve_transaction = {
                 "auth_token": f"{old_orde.auth_token_order}"
             }
-            request_order_registration = requests.get(
-                url_retrieve_transaction, json=data_retrieve_transaction).json()
+            request_order_registration = gateways.get(
+                'paymob', url_retrieve_transaction, json=data_retrieve_transaction).json()
 
             transaction_id = int(request_order_registration["id"])
             if transaction_id == trnx_id:
-                old_orde.trnx_id = trnx_id
                 if request_order_registration["success"] == True:
                     # checkout success
-
-                    try:
-                        Consignee_id = old_orde.user.id
-                        Consignee_email = old_orde.user.email
-                    except:
-                        pass
-                    payment_method = Payment.objects.get(order=old_orde)
-                    payment_method.payment_method = "PayMob"
-                    payment_method.save()
-
-                    if settings.ARAMEX_USERNAME != "":
-                        if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                            product_group = "DOM"
-                            product_type = "OND"
-                        else:
-                            product_group = "EXP"
-                            product_type = "PPX"
-                        data = {
-                            "ClientInfo": {
-                                "UserName": f"{settings.ARAMEX_USERNAME}",
-                                "Password": f"{settings.ARAMEX_PASSWORD}",
-                                "Version": f"{settings.ARAMEX_VERSION}",
-                                "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                                "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                                "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                "Source": f"{settings.ARAMEX_SOURCE}"
-
-                            },
-
-                            "LabelInfo": {
-                                "ReportID": 9201,
-                                "ReportType": "URL"
-                            },
-                            "Shipments": [
-                                {
-                                    "Reference1": f"{old_orde}",
-                                    "Reference2": "",
-                                    "Reference3": "",
-                                    "Shipper": {
-                                        "Reference1": f"{old_orde}",
-                                        "Reference2": "",
-                                        "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                        "PartyAddress": {
-                                            "Line1": "Oman",
-                                            "Line2": "",
-                                            "Line3": "",
-                                            "City": "Oman",
-                                            "StateOrProvinceCode": "",
-                                            "PostCode": "",
-                                            "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                            "Longitude": 0,
-                                            "Latitude": 0,
-                                            "BuildingNumber": None,
-                                            "BuildingName": None,
-                                            "Floor": None,
-                                            "Apartment": None,
-                                            "POBox": None,
-                                            "Description": "alithemes.com product"
-                                        },
-                                        "Contact": {
-                                            "Department": "",
-                                            "PersonName": "alithemes.com store",
-                                            "Title": "",
-                                            "CompanyName": "alithemes.com",
-                                            "PhoneNumber1": "1111111111",
-                                            "PhoneNumber1Ext": "",
-                                            "PhoneNumber2": "",
-                                            "PhoneNumber2Ext": "",
-                                            "FaxNumber": "",
-                                            "CellPhone": "1111111111111",
-                                            "EmailAddress": "mail@alithemes.com",
-                                            "Type": ""
-                                        }
-                                    },
-                                    "Consignee": {
-                                        "Reference1": f"{Consignee_id}",
-                                        "Reference2": f"{Consignee_email}",
-                                        "AccountNumber": f"{Consignee_id}",
-                                        "PartyAddress": {
-                                            "Line1": f"{payment_method.street_address}",
-                                            "Line2": "",
-                                            "Line3": "",
-                                            "City": f"{payment_method.City}",
-                                            "StateOrProvinceCode": f"{payment_method.state}",
-                                            "PostCode": f"{payment_method.post_code}",
-                                            "CountryCode": f"{payment_method.country_code}",
-                                            "Longitude": 0,
-                                            "Latitude": 0,
-                                            "BuildingNumber": "",
-                                            "BuildingName": "",
-                                            "Floor": "",
-                                            "Apartment": "",
-                                            "POBox": None,
-                                            "Description": "Please contact me when the shipment arrives"
-                                        },
-                                        "Contact": {
-                                            "Department": "",
-                                            "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                            "Title": f"{payment_method.last_name}",
-                                            "CompanyName": "",
-                                            "PhoneNumber1": f"{payment_method.phone}",
-                                            "PhoneNumber1Ext": "",
-                                            "PhoneNumber2": "",
-                                            "PhoneNumber2Ext": "",
-                                            "FaxNumber": "",
-                                            "CellPhone": f"{payment_method.phone}",
-                                            "EmailAddress": f"{payment_method.Email_Address}",
-                                            "Type": ""
-                                        }
-                                    },
-                                    "ThirdParty": {
-                                        "Reference1": "",
-                                        "Reference2": "",
-                                        "AccountNumber": "",
-                                        "PartyAddress": {
-                                            "Line1": "",
-                                            "Line2": "",
-                                            "Line3": "",
-                                            "City": "",
-                                            "StateOrProvinceCode": "",
-                                            "PostCode": "",
-                                            "CountryCode": "",
-                                            "Longitude": 0,
-                                            "Latitude": 0,
-                                            "BuildingNumber": None,
-                                            "BuildingName": None,
-                                            "Floor": None,
-                                            "Apartment": None,
-                                            "POBox": None,
-                                            "Description": None
-                                        },
-                                        "Contact": {
-                                            "Department": "",
-                                            "PersonName": "",
-                                            "Title": "",
-                                            "CompanyName": "",
-                                            "PhoneNumber1": "",
-                                            "PhoneNumber1Ext": "",
-                                            "PhoneNumber2": "",
-                                            "PhoneNumber2Ext": "",
-                                            "FaxNumber": "",
-                                            "CellPhone": "",
-                                            "EmailAddress": "",
-                                            "Type": ""
-                                        }
-                                    },
-                                    "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                                    "DueDate": str('/Date(' + str(time) + ')/'),
-                                    "Comments": "",
-                                    "PickupLocation": "",
-                                    "OperationsInstructions": "",
-                                    "AccountingInstrcutions": "",
-                                    "Details": {
-                                        "Dimensions": None,
-                                        "ActualWeight": {
-                                            "Unit": "KG",
-                                            "Value": float(old_orde.weight)
-                                        },
-                                        "ChargeableWeight": None,
-                                        "DescriptionOfGoods": None,
-                                        "GoodsOriginCountry": "IN",
-                                        "NumberOfPieces": 1,
-                                        "ProductGroup": product_group,
-                                        "ProductType": product_type,
-                                        "PaymentType": "P",
-                                        "PaymentOptions": "",
-                                        "CustomsValueAmount": None,
-                                        "CashOnDeliveryAmount": None,
-                                        "InsuranceAmount": None,
-                                        "CashAdditionalAmount": None,
-                                        "CashAdditionalAmountDescription": "",
-                                        "CollectAmount": None,
-                                        "Services": "",
-                                        "Items": []
-                                    },
-                                    "Attachments": [],
-                                    "ForeignHAWB": "",
-                                    "TransportType ": 0,
-                                    "PickupGUID": "",
-                                    "Number": None,
-                                    "ScheduledDelivery": None
-                                }
-                            ],
-                            "Transaction": None
-
-                        }
-
-                        url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-                        r = requests.post(url, json=data)
-                        # print(type(r.content) )
-                        soup = BeautifulSoup(r.content, 'html.parser')
-                        # print(soup)
-                        old_orde.tracking_no = soup.id.string
-                        old_orde.rpt_cache = soup.labelurl.string
-
-                    # delete available
-                    products_details = OrderDetails.objects.all().filter(order=old_orde)
-                    for pro in products_details:
-                        product_order = Product.objects.get(
-                            id=pro.product.id)
-                        if product_order.available > 0:
-                            product_order.available = product_order.available - pro.quantity
-                            product_order.save()
-
-                    old_orde.is_finished = True
-                    old_orde.status = "Underway"
-                    old_orde.save()
-
-                    # code for set supplier's balance
-                    obj_order_suppliers = OrderSupplier.objects.all().filter(order=old_orde)
-                    for obj_order_supplier in obj_order_suppliers:
-                        supplier = Profile.objects.get(
-                            id=obj_order_supplier.vendor.id)
-                        supplier.blance = float(
-                            supplier.blance) + float(obj_order_supplier.amount)
-                        supplier.save()
-                    try:
-
-                        send_mail(
-                            'Great! Order ID{}. has been successfully purchased'.format(
-                                old_orde.id),
-                            ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                            f'{settings.EMAIL_SENDGRID}',
-                            [f'{payment_method.Email_Address}'],
-                            fail_silently=False,
-                        )
-                    except:
-                        pass
+                    finalize_order(old_orde.id, "PayMob", trnx_id)
                     if "coupon_id" in request.session.keys():
                         del request.session["coupon_id"]
 
@@ -2363,8 +689,7 @@ def verify_payment_razorpay(request):
         razorpay_order_id = request.POST.get('razorpay_order_id')
         razorpay_signature = request.POST.get('razorpay_signature')
         order_id = request.POST.get('order_id')
-        client = razorpay.Client(
-            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+        client = gateways.razorpay_client()
         params_dict = {
             'razorpay_order_id': razorpay_order_id,
             'razorpay_payment_id': razorpay_payment_id,
@@ -2373,241 +698,9 @@ def verify_payment_razorpay(request):
         signature = client.utility.verify_payment_signature(params_dict)
         if signature == True:
             # checkout success
-            order = Order.objects.all().filter(id=order_id, is_finished=False)
-
-            if order:
-                old_orde = Order.objects.get(id=order_id, is_finished=False)
-                try:
-                    Consignee_id = old_orde.user.id
-                    Consignee_email = old_orde.user.email
-                except:
-                    pass
-                payment_method = Payment.objects.get(order=old_orde)
-                payment_method.payment_method = "RazorPay"
-                payment_method.save()
-
-                if settings.ARAMEX_USERNAME != "":
-                    if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                        product_group = "DOM"
-                        product_type = "OND"
-                    else:
-                        product_group = "EXP"
-                        product_type = "PPX"
-                    data = {
-                        "ClientInfo": {
-                            "UserName": f"{settings.ARAMEX_USERNAME}",
-                            "Password": f"{settings.ARAMEX_PASSWORD}",
-                            "Version": f"{settings.ARAMEX_VERSION}",
-                            "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                            "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                            "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                            "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                            "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                        },
-
-                        "LabelInfo": {
-                            "ReportID": 9201,
-                            "ReportType": "URL"
-                        },
-                        "Shipments": [
-                            {
-                                "Reference1": f"{old_orde}",
-                                "Reference2": "",
-                                "Reference3": "",
-                                "Shipper": {
-                                    "Reference1": f"{old_orde}",
-                                    "Reference2": "",
-                                    "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                    "PartyAddress": {
-                                        "Line1": "Oman",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": "Oman",
-                                        "StateOrProvinceCode": "",
-                                        "PostCode": "",
-                                        "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": None,
-                                        "BuildingName": None,
-                                        "Floor": None,
-                                        "Apartment": None,
-                                        "POBox": None,
-                                        "Description": "alithemes.com product"
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": "alithemes.com store",
-                                        "Title": "",
-                                        "CompanyName": "alithemes.com",
-                                        "PhoneNumber1": "1111111111",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": "1111111111111",
-                                        "EmailAddress": "mail@alithemes.com",
-                                        "Type": ""
-                                    }
-                                },
-                                "Consignee": {
-                                    "Reference1": f"{Consignee_id}",
-                                    "Reference2": f"{Consignee_email}",
-                                    "AccountNumber": f"{Consignee_id}",
-                                    "PartyAddress": {
-                                        "Line1": f"{payment_method.street_address}",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": f"{payment_method.City}",
-                                        "StateOrProvinceCode": f"{payment_method.state}",
-                                        "PostCode": f"{payment_method.post_code}",
-                                        "CountryCode": f"{payment_method.country_code}",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": "",
-                                        "BuildingName": "",
-                                        "Floor": "",
-                                        "Apartment": "",
-                                        "POBox": None,
-                                        "Description": "Please contact me when the shipment arrives"
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                        "Title": f"{payment_method.last_name}",
-                                        "CompanyName": "",
-                                        "PhoneNumber1": f"{payment_method.phone}",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": f"{payment_method.phone}",
-                                        "EmailAddress": f"{payment_method.Email_Address}",
-                                        "Type": ""
-                                    }
-                                },
-                                "ThirdParty": {
-                                    "Reference1": "",
-                                    "Reference2": "",
-                                    "AccountNumber": "",
-                                    "PartyAddress": {
-                                        "Line1": "",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": "",
-                                        "StateOrProvinceCode": "",
-                                        "PostCode": "",
-                                        "CountryCode": "",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": None,
-                                        "BuildingName": None,
-                                        "Floor": None,
-                                        "Apartment": None,
-                                        "POBox": None,
-                                        "Description": None
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": "",
-                                        "Title": "",
-                                        "CompanyName": "",
-                                        "PhoneNumber1": "",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": "",
-                                        "EmailAddress": "",
-                                        "Type": ""
-                                    }
-                                },
-                                "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                                "DueDate": str('/Date(' + str(time) + ')/'),
-                                "Comments": "",
-                                "PickupLocation": "",
-                                "OperationsInstructions": "",
-                                "AccountingInstrcutions": "",
-                                "Details": {
-                                    "Dimensions": None,
-                                    "ActualWeight": {
-                                        "Unit": "KG",
-                                        "Value": float(old_orde.weight)
-                                    },
-                                    "ChargeableWeight": None,
-                                    "DescriptionOfGoods": None,
-                                    "GoodsOriginCountry": "IN",
-                                    "NumberOfPieces": 1,
-                                    "ProductGroup": product_group,
-                                    "ProductType": product_type,
-                                    "PaymentType": "P",
-                                    "PaymentOptions": "",
-                                    "CustomsValueAmount": None,
-                                    "CashOnDeliveryAmount": None,
-                                    "InsuranceAmount": None,
-                                    "CashAdditionalAmount": None,
-                                    "CashAdditionalAmountDescription": "",
-                                    "CollectAmount": None,
-                                    "Services": "",
-                                    "Items": []
-                                },
-                                "Attachments": [],
-                                "ForeignHAWB": "",
-                                "TransportType ": 0,
-                                "PickupGUID": "",
-                                "Number": None,
-                                "ScheduledDelivery": None
-                            }
-                        ],
-                        "Transaction": None
-
-                    }
-
-                    url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-                    r = requests.post(url, json=data)
-                    # print(type(r.content) )
-                    soup = BeautifulSoup(r.content, 'html.parser')
-                    # print(soup)
-                    old_orde.tracking_no = soup.id.string
-                    old_orde.rpt_cache = soup.labelurl.string
-
-                # delete available
-                products_details = OrderDetails.objects.all().filter(order=old_orde)
-                for pro in products_details:
-                    product_order = Product.objects.get(
-                        id=pro.product.id)
-                    if product_order.available > 0:
-                        product_order.available = product_order.available - pro.quantity
-                        product_order.save()
-
-                old_orde.is_finished = True
-                old_orde.status = "Underway"
-                old_orde.save()
-
-                # code for set supplier's balance
-                obj_order_suppliers = OrderSupplier.objects.all().filter(order=old_orde)
-                for obj_order_supplier in obj_order_suppliers:
-                    supplier = Profile.objects.get(
-                        id=obj_order_supplier.vendor.id)
-                    supplier.blance = float(
-                        supplier.blance) + float(obj_order_supplier.amount)
-                    supplier.save()
-                try:
-
-                    send_mail(
-                        'Great! Order ID{}. has been successfully purchased'.format(
-                            order_id),
-                        ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                        f'{settings.EMAIL_SENDGRID}',
-                        [f'{payment_method.Email_Address}'],
-                        fail_silently=False,
-                    )
-                except:
-                    pass
-                if "coupon_id" in request.session.keys():
-                    del request.session["coupon_id"]
+            finalize_order(order_id, "RazorPay", razorpay_payment_id)
+            if "coupon_id" in request.session.keys():
+                del request.session["coupon_id"]
         # return HttpResponse(json.dumps(signature))
         return JsonResponse({"success": True, "data": signature}, safe=False)
 
@@ -2627,246 +720,14 @@ def verify_payment_paypal(request):
         headers_retrieve_transaction = {
             "Authorization": f"Bearer {settings.PAYPAL_ACCESS_TOKEN}"
         }
-        request_paypal_order = requests.get(
-            paypal_retrieve_transaction_url, headers=headers_retrieve_transaction).json()
+        request_paypal_order = gateways.get(
+            'paypal', paypal_retrieve_transaction_url, headers=headers_retrieve_transaction).json()
 
         if transaction_paypap_status == "COMPLETED" and request_paypal_order["status"] == "COMPLETED":
             # checkout success
-            order = Order.objects.all().filter(id=order_id, is_finished=False)
-
-            if order:
-                old_orde = Order.objects.get(id=order_id, is_finished=False)
-                try:
-                    Consignee_id = old_orde.user.id
-                    Consignee_email = old_orde.user.email
-                except:
-                    pass
-                payment_method = Payment.objects.get(order=old_orde)
-                payment_method.payment_method = "Paypal"
-                payment_method.save()
-
-                if settings.ARAMEX_USERNAME != "":
-                    if payment_method.country_code == settings.ARAMEX_ACCOUNTCOUNTRYCODE:
-                        product_group = "DOM"
-                        product_type = "OND"
-                    else:
-                        product_group = "EXP"
-                        product_type = "PPX"
-                    data = {
-                        "ClientInfo": {
-                            "UserName": f"{settings.ARAMEX_USERNAME}",
-                            "Password": f"{settings.ARAMEX_PASSWORD}",
-                            "Version": f"{settings.ARAMEX_VERSION}",
-                            "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                            "AccountPin": f"{settings.ARAMEX_ACCOUNTPIN}",
-                            "AccountEntity": f"{settings.ARAMEX_ACCOUNTENTITY}",
-                            "AccountCountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                            "Source": f"{settings.ARAMEX_SOURCE}"
-
-
-                        },
-
-                        "LabelInfo": {
-                            "ReportID": 9201,
-                            "ReportType": "URL"
-                        },
-                        "Shipments": [
-                            {
-                                "Reference1": f"{old_orde}",
-                                "Reference2": "",
-                                "Reference3": "",
-                                "Shipper": {
-                                    "Reference1": f"{old_orde}",
-                                    "Reference2": "",
-                                    "AccountNumber": f"{settings.ARAMEX_ACCOUNTNUMBER}",
-                                    "PartyAddress": {
-                                        "Line1": "Oman",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": "Oman",
-                                        "StateOrProvinceCode": "",
-                                        "PostCode": "",
-                                        "CountryCode": f"{settings.ARAMEX_ACCOUNTCOUNTRYCODE}",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": None,
-                                        "BuildingName": None,
-                                        "Floor": None,
-                                        "Apartment": None,
-                                        "POBox": None,
-                                        "Description": "alithemes.com product"
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": "alithemes.com store",
-                                        "Title": "",
-                                        "CompanyName": "alithemes.com",
-                                        "PhoneNumber1": "1111111111",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": "1111111111111",
-                                        "EmailAddress": "mail@alithemes.com",
-                                        "Type": ""
-                                    }
-                                },
-                                "Consignee": {
-                                    "Reference1": f"{Consignee_id}",
-                                    "Reference2": f"{Consignee_email}",
-                                    "AccountNumber": f"{Consignee_id}",
-                                    "PartyAddress": {
-                                        "Line1": f"{payment_method.street_address}",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": f"{payment_method.City}",
-                                        "StateOrProvinceCode": f"{payment_method.state}",
-                                        "PostCode": f"{payment_method.post_code}",
-                                        "CountryCode": f"{payment_method.country_code}",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": "",
-                                        "BuildingName": "",
-                                        "Floor": "",
-                                        "Apartment": "",
-                                        "POBox": None,
-                                        "Description": "Please contact me when the shipment arrives"
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": f"{payment_method.first_name} {payment_method.last_name}",
-                                        "Title": f"{payment_method.last_name}",
-                                        "CompanyName": "",
-                                        "PhoneNumber1": f"{payment_method.phone}",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": f"{payment_method.phone}",
-                                        "EmailAddress": f"{payment_method.Email_Address}",
-                                        "Type": ""
-                                    }
-                                },
-                                "ThirdParty": {
-                                    "Reference1": "",
-                                    "Reference2": "",
-                                    "AccountNumber": "",
-                                    "PartyAddress": {
-                                        "Line1": "",
-                                        "Line2": "",
-                                        "Line3": "",
-                                        "City": "",
-                                        "StateOrProvinceCode": "",
-                                        "PostCode": "",
-                                        "CountryCode": "",
-                                        "Longitude": 0,
-                                        "Latitude": 0,
-                                        "BuildingNumber": None,
-                                        "BuildingName": None,
-                                        "Floor": None,
-                                        "Apartment": None,
-                                        "POBox": None,
-                                        "Description": None
-                                    },
-                                    "Contact": {
-                                        "Department": "",
-                                        "PersonName": "",
-                                        "Title": "",
-                                        "CompanyName": "",
-                                        "PhoneNumber1": "",
-                                        "PhoneNumber1Ext": "",
-                                        "PhoneNumber2": "",
-                                        "PhoneNumber2Ext": "",
-                                        "FaxNumber": "",
-                                        "CellPhone": "",
-                                        "EmailAddress": "",
-                                        "Type": ""
-                                    }
-                                },
-                                "ShippingDateTime": str('/Date(' + str(time) + ')/'),
-                                "DueDate": str('/Date(' + str(time) + ')/'),
-                                "Comments": "",
-                                "PickupLocation": "",
-                                "OperationsInstructions": "",
-                                "AccountingInstrcutions": "",
-                                "Details": {
-                                    "Dimensions": None,
-                                    "ActualWeight": {
-                                        "Unit": "KG",
-                                        "Value": float(old_orde.weight)
-                                    },
-                                    "ChargeableWeight": None,
-                                    "DescriptionOfGoods": None,
-                                    "GoodsOriginCountry": "IN",
-                                    "NumberOfPieces": 1,
-                                    "ProductGroup": product_group,
-                                    "ProductType": product_type,
-                                    "PaymentType": "P",
-                                    "PaymentOptions": "",
-                                    "CustomsValueAmount": None,
-                                    "CashOnDeliveryAmount": None,
-                                    "InsuranceAmount": None,
-                                    "CashAdditionalAmount": None,
-                                    "CashAdditionalAmountDescription": "",
-                                    "CollectAmount": None,
-                                    "Services": "",
-                                    "Items": []
-                                },
-                                "Attachments": [],
-                                "ForeignHAWB": "",
-                                "TransportType ": 0,
-                                "PickupGUID": "",
-                                "Number": None,
-                                "ScheduledDelivery": None
-                            }
-                        ],
-                        "Transaction": None
-
-                    }
-
-                    url = 'https://ws.aramex.net/ShippingAPI.V2/Shipping/Service_1_0.svc/json/CreateShipments'
-                    r = requests.post(url, json=data)
-                    # print(type(r.content) )
-                    soup = BeautifulSoup(r.content, 'html.parser')
-                    # print(soup)
-                    old_orde.tracking_no = soup.id.string
-                    old_orde.rpt_cache = soup.labelurl.string
-
-                # delete available
-                products_details = OrderDetails.objects.all().filter(order=old_orde)
-                for pro in products_details:
-                    product_order = Product.objects.get(
-                        id=pro.product.id)
-                    if product_order.available > 0:
-                        product_order.available = product_order.available - pro.quantity
-                        product_order.save()
-
-                old_orde.is_finished = True
-                old_orde.status = "Underway"
-                old_orde.save()
-
-                # code for set supplier's balance
-                obj_order_suppliers = OrderSupplier.objects.all().filter(order=old_orde)
-                for obj_order_supplier in obj_order_suppliers:
-                    supplier = Profile.objects.get(
-                        id=obj_order_supplier.vendor.id)
-                    supplier.blance = float(
-                        supplier.blance) + float(obj_order_supplier.amount)
-                    supplier.save()
-                try:
-
-                    send_mail(
-                        'Great! Order ID{}. has been successfully purchased'.format(
-                            order_id),
-                        ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                        f'{settings.EMAIL_SENDGRID}',
-                        [f'{payment_method.Email_Address}'],
-                        fail_silently=False,
-                    )
-                except:
-                    pass
-                if "coupon_id" in request.session.keys():
-                    del request.session["coupon_id"]
+            finalize_order(order_id, "Paypal", paypal_order_id)
+            if "coupon_id" in request.session.keys():
+                del request.session["coupon_id"]
         # return HttpResponse(json.dumps(signature))
         return JsonResponse({"success": True, "data": transaction_paypap_status}, safe=False)
 
@@ -2931,7 +792,7 @@ def send_payment_fatoorah(request, id):
             # },
             "SourceInfo": "string"
         }
-        response = requests.post(url, headers=headers, json=data).json()
+        response = gateways.post('myfatoorah', url, headers=headers, json=data).json()
         # print(response)
         if response:
             invoice_url = response['Data']['InvoiceURL']
@@ -2966,7 +827,8 @@ def callback_url_fatoorah(request, *args, **kwargs):
             "KeyType": "paymentid"
         }
 
-        response = requests.post(url, headers=headers, json=data).json()
+        response = gateways.post(
+            'myfatoorah', url, headers=headers, json=data, idempotent=True).json()
         # print(response)
         if response:
             try:
@@ -2980,26 +842,7 @@ def callback_url_fatoorah(request, *args, **kwargs):
                     if Order.objects.all().filter(invoice_id_fatoorah=invoice_id).exists():
                         old_orde = Order.objects.get(
                             invoice_id_fatoorah=invoice_id)
-                        old_orde.status = 'Underway'
-                        old_orde.payment_id_fatoorah = int(payment_id)
-                        old_orde.is_finished = True
-                        old_orde.save()
-
-                        payment_method = Payment.objects.get(order=old_orde)
-                        payment_method.payment_method = "myfatoorah"
-                        payment_method.save()
-
-                        try:
-                            send_mail(
-                                'Great! Order ID{}. has been successfully purchased'.format(
-                                    old_orde.id),
-                                ' Congratulations, you have made your order, This order will be delivered to you soon.',
-                                f'{settings.EMAIL_SENDGRID}',
-                                [f'{payment_method.Email_Address}'],
-                                fail_silently=False,
-                            )
-                        except:
-                            pass
+                        finalize_order(old_orde.id, "myfatoorah", payment_id)
 
                         return redirect('orders:success')
                 
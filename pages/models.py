@@ -3,6 +3,8 @@ from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 from .utils import code_generator, create_shortcode
 from ckeditor.fields import RichTextField
+from django.db.models.signals import post_save, post_delete
+from project.chrome import invalidate_chrome
 # Create your models here.
 class PagesList(models.Model):
     name = models.CharField(max_length=150 , verbose_name=_("Page Name"))
@@ -33,4 +35,10 @@ class PagesList(models.Model):
                 self.slug = create_shortcode(self)
 
         super(PagesList, self).save(*args, **kwargs)
-    
\ No newline at end of file
+    
+
+
+# the site chrome snapshot (project.chrome) holds these rows
+for chrome_model in (PagesList,):
+    post_save.connect(invalidate_chrome, sender=chrome_model)
+    post_delete.connect(invalidate_chrome, sender=chrome_model)
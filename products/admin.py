@@ -19,7 +19,8 @@ class ProductAdmin(admin.ModelAdmin):
               ("preview_image_2", "additional_image_2"),
               ("preview_image_3", "additional_image_3"),
               ("preview_image_4", "additional_image_4"),
-              ("feedbak_average", "feedbak_number"),
+              ("feedbak_average", "feedbak_number", "feedbak_sum"),
+              ("start_1", "start_2", "start_3", "start_4", "start_5"),
               ("width", "height", "PRDWeight", "pieces", "available", "PRDSKU"),
               ("PRDISSale", "promotional"),
               ("PRDISactive", "PRDISDeleted"),
@@ -34,7 +35,9 @@ class ProductAdmin(admin.ModelAdmin):
     # search_fields = ("PRDName", "PRDPrice")
     list_per_page = 10
     readonly_fields = ('product_photo', "preview_image_1",
-                       "preview_image_2", "preview_image_3", "preview_image_4",)
+                       "preview_image_2", "preview_image_3", "preview_image_4",
+                       "feedbak_average", "feedbak_number", "feedbak_sum",
+                       "start_1", "start_2", "start_3", "start_4", "start_5",)
 
 
 class RatingAdmin(admin.ModelAdmin):
@@ -0,0 +1,219 @@
+"""
+Responsive image derivatives.
+
+Every listing card, category tile and ad used to download the one full
+size WebP that compress() produces. For the image fields in
+DERIVATIVE_FIELDS a fixed set of narrower WebP copies is written under
+`derivatives/` in the media storage and recorded in ImageDerivative, keyed
+by the source file name. The `srcset` template tag (products.templatetags.
+image_tags) and `add_srcset` for the JSON lists turn that record into
+`src`/`srcset`/`sizes`, so the browser picks the smallest copy that fills
+the slot.
+
+Derivatives are made by a celery task after an image field changes, after
+products.images encoded an upload, and by the build_image_derivatives
+command for the existing media.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils.html import format_html
+from PIL import Image
+
+from .models import ImageDerivative
+
+
+# name -> width in px, only widths smaller than the source are written
+WIDTHS = {
+    'thumbnail': 150,
+    'card': 320,
+    'detail': 700,
+    'zoom': 1100,
+}
+
+# the `sizes` attribute for each slot the tag is used for
+SIZES = {
+    'thumbnail': '120px',
+    'card': '(max-width: 576px) 50vw, (max-width: 992px) 33vw, 320px',
+    'detail': '(max-width: 768px) 100vw, 700px',
+    'zoom': '(max-width: 1100px) 100vw, 1100px',
+}
+
+DERIVATIVE_QUALITY = 70
+DERIVATIVE_DIR = 'derivatives/'
+CACHE_TIMEOUT = 60 * 60 * 24
+MISSING_TIMEOUT = 60 * 5
+
+DERIVATIVE_FIELDS = {
+    'products.Product': ('product_image', 'additional_image_1', 'additional_image_2',
+                         'additional_image_3', 'additional_image_4'),
+    'products.ProductImage': ('PRDIImage',),
+    'categories.SuperCategory': ('category_image',),
+    'categories.MainCategory': ('category_image',),
+    'categories.SubCategory': ('category_image',),
+    'categories.MiniCategory': ('category_image',),
+    'home.Carousel': ('CARImage',),
+    'home.HomeAdSidebar': ('ad_mage',),
+    'home.HomeAdMiddlebar': ('ad_mage',),
+    'home.HomeAdSupplier': ('ad_mage',),
+    'home.HomeAdDaily': ('ad_mage',),
+    'home.HomeAdDealTime': ('ad_mage',),
+    'home.VendorDetailsAdImage': ('ad_mage',),
+    'home.ShopAdSidebar': ('ad_mage',),
+    'home.HotDealAd': ('ad_mage',),
+}
+
+
+def derivative_name(source, width):
+    stem = os.path.splitext(source)[0]
+    return f'{DERIVATIVE_DIR}{stem}.{width}w.webp'
+
+
+def cache_key(source):
+    return 'image-derivatives:' + hashlib.md5(source.encode()).hexdigest()
+
+
+def build_derivatives(source, storage=default_storage):
+    """
+    Writes the derivatives of the stored file `source` and records them.
+    Returns the ImageDerivative, or None when the file can not be read.
+    """
+    try:
+        with storage.open(source) as original:
+            im = Image.open(original)
+            im.load()
+    except (OSError, ValueError):
+        return None
+    if im.mode in ("RGBA", "P"):
+        im = im.convert("RGB")
+    variants = {}
+    for label, width in WIDTHS.items():
+        if width >= im.width:
+            continue
+        height = round(im.height * width / im.width)
+        resized = im.resize((width, height), Image.LANCZOS)
+        im_io = BytesIO()
+        resized.save(im_io, format="webp", quality=DERIVATIVE_QUALITY)
+        name = derivative_name(source, width)
+        if storage.exists(name):
+            storage.delete(name)
+        name = storage.save(name, ContentFile(im_io.getvalue()))
+        variants[label] = {'name': name, 'width': width}
+    derivative, _ = ImageDerivative.objects.update_or_create(
+        source=source, defaults={'width': im.width, 'height': im.height, 'variants': variants})
+    cache.set(cache_key(source), derivative.as_dict(), CACHE_TIMEOUT)
+    return derivative
+
+
+def derivatives_for(sources):
+    """
+    Returns {source: record} for the names that have derivatives, reading
+    the cache first and the database only for the misses.
+    """
+    sources = {source for source in sources if source}
+    keys = {cache_key(source): source for source in sources}
+    found = {}
+    for key, value in cache.get_many(keys).items():
+        found[keys[key]] = value
+    missing = sources - set(found)
+    if missing:
+        rows = {row.source: row.as_dict()
+                for row in ImageDerivative.objects.filter(source__in=missing)}
+        to_cache = {}
+        for source in missing:
+            found[source] = rows.get(source, False)
+            to_cache[cache_key(source)] = found[source]
+        cache.set_many({key: value for key, value in to_cache.items() if value}, CACHE_TIMEOUT)
+        cache.set_many({key: value for key, value in to_cache.items() if not value}, MISSING_TIMEOUT)
+    return {source: record for source, record in found.items() if record}
+
+
+def srcset_parts(source, url, slot, record):
+    # (src, srcset, sizes) for one image, srcset is empty without derivatives
+    if not record:
+        return url, '', ''
+    candidates = sorted(
+        (variant['width'], default_storage.url(variant['name']))
+        for variant in record['variants'].values())
+    candidates.append((record['width'], url))
+    src = url
+    variant = record['variants'].get(slot)
+    if variant:
+        src = default_storage.url(variant['name'])
+    srcset = ', '.join(f'{candidate} {width}w' for width, candidate in candidates)
+    return src, srcset, SIZES.get(slot, SIZES['card'])
+
+
+def srcset_attributes(image, slot='card'):
+    if not image:
+        return ''
+    source = image.name
+    record = derivatives_for([source]).get(source)
+    src, srcset, sizes = srcset_parts(source, image.url, slot, record)
+    if not srcset:
+        return format_html('src="{}"', src)
+    return format_html('src="{}" srcset="{}" sizes="{}"', src, srcset, sizes)
+
+
+def add_srcset(rows, field, slot='card'):
+    """
+    Adds `<field>_src`, `<field>_srcset` and `<field>_sizes` to `.values()`
+    rows for the JSON lists, with one cache read for the whole page.
+    """
+    records = derivatives_for(row[field] for row in rows)
+    for row in rows:
+        source = row[field]
+        url = default_storage.url(source) if source else ''
+        src, srcset, sizes = srcset_parts(source, url, slot, records.get(source))
+        row[f'{field}_src'] = src
+        row[f'{field}_srcset'] = srcset
+        row[f'{field}_sizes'] = sizes
+    return rows
+
+
+def schedule_derivatives(sources):
+    from .tasks import build_image_derivatives
+    sources = sorted({source for source in sources if source})
+    if sources:
+        transaction.on_commit(lambda: build_image_derivatives.delay(sources))
+
+
+def missing_sources(instance, fields):
+    names = {getattr(instance, field).name for field in fields
+             if field in instance.__dict__ and getattr(instance, field)}
+    if not names:
+        return set()
+    done = set(ImageDerivative.objects.filter(
+        source__in=names).values_list('source', flat=True))
+    return names - done
+
+
+def post_save_derivatives_receiver(sender, instance, raw=False, *args, **kwargs):
+    if raw:
+        return
+    schedule_derivatives(missing_sources(instance, DERIVATIVE_FIELDS[sender._meta.label]))
+
+
+def register():
+    for label in DERIVATIVE_FIELDS:
+        post_save.connect(post_save_derivatives_receiver, sender=label,
+                          dispatch_uid=f'image-derivatives-{label}')
+
+
+def iter_sources(labels=None):
+    # every stored file name of DERIVATIVE_FIELDS, for the backfill command
+    for label, fields in DERIVATIVE_FIELDS.items():
+        if labels and label not in labels:
+            continue
+        model = apps.get_model(label)
+        for names in model.objects.values_list(*fields).iterator():
+            for name in names:
+                if name:
+                    yield name
@@ -0,0 +1,87 @@
+"""
+Background side of the image pipeline started by AsyncImageMixin.
+
+The upload is kept under IMAGE_STAGING_DIR while the field shows the
+placeholder. `encode_staged_image` turns it into a WebP file at the field's
+upload_to path, points the field at it with a single-column UPDATE (no
+save(), so nothing is staged again) and removes the staged original.
+
+Uploads with a content hash are written to `content_name(hash)`, so the
+same bytes are encoded and stored once. When that file exists already the
+encoding is skipped and the field simply points at it; such shared files
+are never deleted here.
+"""
+import os
+
+from django.apps import apps
+from django.db import transaction
+
+from project.pagecache import invalidate_pages
+from .derivatives import build_derivatives
+from .models import ImageDerivative, ImageEncoding, compress, content_name
+
+
+def encoded_name(source):
+    return os.path.splitext(os.path.basename(source))[0] + '.webp'
+
+
+def encode_staged_image(encoding_id):
+    encoding = ImageEncoding.objects.filter(pk=encoding_id).first()
+    if encoding is None or encoding.status == ImageEncoding.DONE:
+        return None
+    source = encoding.source
+    model = apps.get_model(encoding.model)
+    field = model._meta.get_field(encoding.field)
+    instance = model.objects.filter(pk=encoding.object_id).first()
+    if instance is None:
+        encoding.delete()
+        field.storage.delete(source)
+        return None
+    ImageEncoding.objects.filter(pk=encoding.pk, source=source).update(
+        status=ImageEncoding.PROCESSING)
+
+    digest = encoding.content_hash
+    try:
+        if digest and field.storage.exists(content_name(digest)):
+            name = content_name(digest)
+        else:
+            with field.storage.open(source) as original:
+                encoded = compress(original)
+                encoded.name = encoded_name(source)
+                if digest:
+                    name = field.storage.save(content_name(digest), encoded)
+                else:
+                    name = field.storage.save(
+                        field.generate_filename(instance, encoded.name), encoded)
+    except Exception as error:
+        ImageEncoding.objects.filter(pk=encoding.pk, source=source).update(
+            status=ImageEncoding.FAILED, error=str(error))
+        return None
+
+    with transaction.atomic():
+        # a newer upload for the same field wins, this result is dropped
+        current = ImageEncoding.objects.select_for_update().filter(
+            pk=encoding.pk, source=source).exists()
+        if current:
+            model.objects.filter(pk=instance.pk).update(**{field.attname: name})
+            ImageEncoding.objects.filter(pk=encoding.pk).update(
+                status=ImageEncoding.DONE, result=name, error='')
+    if not current:
+        if not digest:
+            field.storage.delete(name)
+        return None
+    field.storage.delete(source)
+    if not ImageDerivative.objects.filter(source=name).exists():
+        build_derivatives(name, field.storage)
+    invalidate_pages('products')
+    return name
+
+
+def encode_pending(statuses=(ImageEncoding.PENDING, ImageEncoding.FAILED)):
+    # used to retry after a worker outage, returns the number encoded
+    done = 0
+    for encoding_id in ImageEncoding.objects.filter(
+            status__in=statuses).values_list('id', flat=True):
+        if encode_staged_image(encoding_id):
+            done += 1
+    return done
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from products.derivatives import DERIVATIVE_FIELDS, build_derivatives, iter_sources
+from products.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = "Write the responsive image derivatives for existing product, category and ad images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models', choices=sorted(DERIVATIVE_FIELDS),
+            help="Only this model, can be repeated")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Rebuild images that already have derivatives")
+
+    def handle(self, *args, **options):
+        done = set()
+        if not options['force']:
+            done = set(ImageDerivative.objects.values_list('source', flat=True))
+        built = failed = 0
+        for source in iter_sources(options['models']):
+            if source in done:
+                continue
+            done.add(source)
+            if build_derivatives(source):
+                built += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Could not read {source}")
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {built} images, {failed} failed"))
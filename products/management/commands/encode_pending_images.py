@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.images import encode_pending
+
+
+class Command(BaseCommand):
+    help = "Encode product image uploads still waiting for (or failed in) the background worker"
+
+    def handle(self, *args, **options):
+        count = encode_pending()
+        self.stdout.write(self.style.SUCCESS(f"Encoded {count} images"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.models import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the rating counters stored on every Product from ProductRating"
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating stats for {count} products"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.related import refresh_all
+
+
+class Command(BaseCommand):
+    help = "Recompute the related products lists of every mini category"
+
+    def handle(self, *args, **options):
+        count = refresh_all()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed related products for {count} products"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from products.recompress import RECOMPRESS_FIELDS, Checkpoint, recompress_fields
+
+
+class Command(BaseCommand):
+    help = "Re-encode oversized profile, blog, carousel, category, ad and site images as WebP"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models', choices=sorted(RECOMPRESS_FIELDS),
+            help="Only this model, can be repeated")
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Encoding processes, defaults to the number of CPUs")
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--checkpoint', default='recompress_images.json',
+            help="File the progress is kept in, a rerun resumes from it")
+        parser.add_argument(
+            '--reset', action='store_true', help="Ignore the checkpoint and start over")
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help="Remove the replaced files once no row points at them")
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help="Seconds to wait between batches to keep the load down")
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options['checkpoint'], reset=options['reset'])
+        state = recompress_fields(
+            checkpoint, labels=options['models'], processes=options['processes'],
+            batch_size=options['batch_size'], delete_originals=options['delete_originals'],
+            pause=options['pause'], log=self.stdout.write)
+        saved = state['before'] - state['after']
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-encoded {state['files']} images, {state['failed']} failed, "
+            f"{state['before']} -> {state['after']} bytes ({saved} bytes saved)"))
@@ -0,0 +1,132 @@
+# Generated by Django 3.2.14 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE products_productsearch_fts USING fts5("
+    "name, description, tags, sku, "
+    "content='products_productsearchdocument', content_rowid='product_id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER products_productsearch_ai AFTER INSERT ON products_productsearchdocument BEGIN "
+    "INSERT INTO products_productsearch_fts(rowid, name, description, tags, sku) "
+    "VALUES (new.product_id, new.name, new.description, new.tags, new.sku); END",
+    "CREATE TRIGGER products_productsearch_ad AFTER DELETE ON products_productsearchdocument BEGIN "
+    "INSERT INTO products_productsearch_fts(products_productsearch_fts, rowid, name, description, tags, sku) "
+    "VALUES ('delete', old.product_id, old.name, old.description, old.tags, old.sku); END",
+    "CREATE TRIGGER products_productsearch_au AFTER UPDATE OF name, description, tags, sku "
+    "ON products_productsearchdocument BEGIN "
+    "INSERT INTO products_productsearch_fts(products_productsearch_fts, rowid, name, description, tags, sku) "
+    "VALUES ('delete', old.product_id, old.name, old.description, old.tags, old.sku); "
+    "INSERT INTO products_productsearch_fts(rowid, name, description, tags, sku) "
+    "VALUES (new.product_id, new.name, new.description, new.tags, new.sku); END",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS products_productsearch_au",
+    "DROP TRIGGER IF EXISTS products_productsearch_ad",
+    "DROP TRIGGER IF EXISTS products_productsearch_ai",
+    "DROP TABLE IF EXISTS products_productsearch_fts",
+]
+
+POSTGRES_FORWARD = [
+    f"CREATE INDEX products_productsearch_vector ON products_productsearchdocument USING GIN (({POSTGRES_VECTOR}))",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS products_productsearch_vector",
+]
+
+MYSQL_FORWARD = [
+    "ALTER TABLE products_productsearchdocument ADD FULLTEXT INDEX products_productsearch_ft (name, description, tags, sku)",
+    "ALTER TABLE products_productsearchdocument ADD FULLTEXT INDEX products_productsearch_ft_name (name, sku)",
+]
+
+MYSQL_REVERSE = [
+    "ALTER TABLE products_productsearchdocument DROP INDEX products_productsearch_ft_name",
+    "ALTER TABLE products_productsearchdocument DROP INDEX products_productsearch_ft",
+]
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            run_statements(schema_editor, SQLITE_FORWARD)
+        except Exception:
+            # sqlite built without FTS5, products.search falls back to LIKE
+            run_statements(schema_editor, SQLITE_REVERSE)
+    elif vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'mysql':
+        run_statements(schema_editor, MYSQL_FORWARD)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_REVERSE)
+    elif vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_REVERSE)
+    elif vendor == 'mysql':
+        run_statements(schema_editor, MYSQL_REVERSE)
+
+
+def fill_search_documents(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductSearchDocument = apps.get_model('products', 'ProductSearchDocument')
+    documents = []
+    for product in Product.objects.all().iterator(chunk_size=500):
+        documents.append(ProductSearchDocument(
+            product_id=product.id,
+            name=product.product_name or '',
+            description=product.product_description or '',
+            tags=product.PRDtags or '',
+            sku=product.PRDSKU or '',
+            supercategory_id=product.product_supercategory_id,
+            is_listed=product.PRDISactive is True and not product.PRDISDeleted,
+        ))
+        if len(documents) >= 500:
+            ProductSearchDocument.objects.bulk_create(documents)
+            documents = []
+    if documents:
+        ProductSearchDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0020_auto_20220814_0432'),
+        ('products', '0068_alter_productsize_name_variation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='products.product')),
+                ('name', models.CharField(blank=True, default='', max_length=150)),
+                ('description', models.TextField(blank=True, default='')),
+                ('tags', models.CharField(blank=True, default='', max_length=100)),
+                ('sku', models.CharField(blank=True, default='', max_length=100)),
+                ('is_listed', models.BooleanField(db_index=True, default=True)),
+                ('date_update', models.DateTimeField(auto_now=True, null=True)),
+                ('supercategory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='categories.supercategory')),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
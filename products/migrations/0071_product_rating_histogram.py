@@ -0,0 +1,68 @@
+# Generated by Django 3.2.14 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from products.utils import rating_average
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductRating = apps.get_model('products', 'ProductRating')
+    stats = {}
+    rows = ProductRating.objects.filter(
+        active=True, rate__gte=1, rate__lte=5, PRDIProduct__isnull=False
+    ).values('PRDIProduct', 'rate').annotate(number=Count('id')).order_by()
+    for row in rows:
+        product_stats = stats.setdefault(row['PRDIProduct'], [0] * 6)
+        product_stats[row['rate']] = row['number']
+    for product_id, counts in stats.items():
+        number = sum(counts)
+        total = sum(star * counts[star] for star in range(1, 6))
+        Product.objects.filter(pk=product_id).update(
+            feedbak_number=number,
+            feedbak_sum=total,
+            feedbak_average=rating_average(total, number),
+            start_1=counts[1], start_2=counts[2], start_3=counts[3],
+            start_4=counts[4], start_5=counts[5])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0070_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='feedbak_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Feedbak sum'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='start_1',
+            field=models.PositiveIntegerField(default=0, verbose_name='start_1'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='start_2',
+            field=models.PositiveIntegerField(default=0, verbose_name='start_2'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='start_3',
+            field=models.PositiveIntegerField(default=0, verbose_name='start_3'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='start_4',
+            field=models.PositiveIntegerField(default=0, verbose_name='start_4'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='start_5',
+            field=models.PositiveIntegerField(default=0, verbose_name='start_5'),
+        ),
+        migrations.RunPython(fill_rating_histogram, migrations.RunPython.noop),
+    ]
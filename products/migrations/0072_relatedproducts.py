@@ -0,0 +1,23 @@
+# Generated by Django 3.2.14 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0071_product_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProducts',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='related_store', serialize=False, to='products.product')),
+                ('related_ids', models.JSONField(blank=True, default=list)),
+                ('supplier_ids', models.JSONField(blank=True, default=list)),
+                ('date_update', models.DateTimeField(auto_now=True, null=True)),
+            ],
+        ),
+    ]
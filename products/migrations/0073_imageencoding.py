@@ -0,0 +1,30 @@
+# Generated by Django 3.2.14 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0072_relatedproducts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageEncoding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('field', models.CharField(max_length=100)),
+                ('source', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+                ('date', models.DateTimeField(auto_now_add=True, null=True)),
+                ('date_update', models.DateTimeField(auto_now=True, null=True)),
+            ],
+            options={
+                'unique_together': {('model', 'object_id', 'field')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0074_imagederivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageencoding',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imageencoding',
+            name='result',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
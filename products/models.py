@@ -1,16 +1,20 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Count
+from django.db.models.functions import Coalesce
 from categories.models import SubCategory, MainCategory, SuperCategory, MiniCategory
 from django.utils.translation import ugettext_lazy as _
 from django.utils.text import slugify
 from django.urls import reverse
-from .utils import code_generator, create_shortcode
-from django.db.models.signals import pre_save
+from .utils import code_generator, create_shortcode, rating_average
+from django.db.models.signals import pre_save, post_save, post_delete
 
 from django.utils.safestring import mark_safe
 from django.core import validators
 from django.core.validators import FileExtensionValidator, MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
+import hashlib
+import os
 from io import BytesIO
 from PIL import Image
 from django.core.files import File
@@ -25,6 +29,8 @@ from django.utils.translation import ugettext_lazy as _
 from django.utils.deconstruct import deconstructible
 from ckeditor.fields import RichTextField
 from accounts.models import Profile
+from project.counts import invalidate_product_counts
+from project.pagecache import invalidate_pages, receiver_for
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth.models import User
 
@@ -45,7 +51,169 @@ def compress(image):
     return new_image
 
 
-class Product(models.Model):
+# shown in an image field while its upload is being encoded
+IMAGE_PLACEHOLDER = 'products/product.jpg'
+IMAGE_STAGING_DIR = 'products/imgs/originals/'
+# encoded uploads are stored once per content hash and shared between fields
+IMAGE_CONTENT_DIR = 'products/imgs/sha/'
+
+
+def content_hash(image):
+    digest = hashlib.sha256()
+    for chunk in image.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_name(digest):
+    return f'{IMAGE_CONTENT_DIR}{digest[:2]}/{digest}.webp'
+
+
+class ImageEncoding(models.Model):
+    # one row per image field with an upload waiting for (or done with) the
+    # background encoding in products.images
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    Status_select = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    field = models.CharField(max_length=100)
+    source = models.CharField(max_length=500)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    result = models.CharField(max_length=500, blank=True, default='')
+    status = models.CharField(
+        max_length=20, choices=Status_select, default=PENDING, db_index=True)
+    error = models.TextField(blank=True, default='')
+    date = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+    date_update = models.DateTimeField(auto_now=True, blank=True, null=True)
+
+    class Meta:
+        unique_together = ('model', 'object_id', 'field')
+
+    def __str__(self):
+        return f'{self.model}:{self.object_id}:{self.field} {self.status}'
+
+    @classmethod
+    def encoded(cls, digest, storage):
+        # the stored WebP of an earlier upload with the same bytes, or None
+        names = cls.objects.filter(content_hash=digest, status=cls.DONE).exclude(
+            result='').values_list('result', flat=True).distinct()
+        for name in names:
+            if storage.exists(name):
+                return name
+        return None
+
+
+class ImageDerivative(models.Model):
+    # the narrower copies written for one stored image, see products.derivatives
+    source = models.CharField(max_length=500, unique=True)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(default=dict, blank=True)
+    date_update = models.DateTimeField(auto_now=True, blank=True, null=True)
+
+    def __str__(self):
+        return self.source
+
+    def as_dict(self):
+        return {'width': self.width, 'height': self.height, 'variants': self.variants}
+
+
+def schedule_image_encoding(encoding_ids):
+    from .tasks import encode_image
+    for encoding_id in encoding_ids:
+        transaction.on_commit(
+            lambda encoding_id=encoding_id: encode_image.delay(encoding_id))
+
+
+class AsyncImageMixin:
+    """
+    Saves new uploads of `async_image_fields` as they are and leaves the
+    WebP encoding to a celery task, so the request does not wait for
+    Pillow. Until the task is done the field holds IMAGE_PLACEHOLDER.
+
+    Uploads are hashed first: bytes that were encoded before (the same
+    photo on another product, or an unchanged image sent again with the
+    edit form) point the field at the existing file and are not encoded.
+    """
+    async_image_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._original_images = self.current_images()
+
+    def current_images(self):
+        # deferred fields are left out instead of being loaded one by one
+        return {name: getattr(self, name).name for name in self.async_image_fields
+                if name in self.__dict__}
+
+    def stage_uploads(self):
+        staged = {}
+        for name in self.async_image_fields:
+            if name not in self.__dict__:
+                continue
+            image = getattr(self, name)
+            if image and not image._committed:
+                digest = content_hash(image)
+                encoded = ImageEncoding.encoded(digest, image.storage)
+                if encoded:
+                    staged[name] = (None, digest, encoded)
+                    setattr(self, name, encoded)
+                    continue
+                source = image.storage.save(
+                    IMAGE_STAGING_DIR + os.path.basename(image.name), image)
+                staged[name] = (source, digest, '')
+                setattr(self, name, IMAGE_PLACEHOLDER)
+        return staged
+
+    def pending_placeholders(self, staged):
+        # a stale instance must not write the placeholder back over an
+        # image the task has encoded since the instance was loaded
+        return [name for name in self.async_image_fields
+                if name not in staged
+                and self._original_images.get(name) == IMAGE_PLACEHOLDER
+                and getattr(self, name).name == IMAGE_PLACEHOLDER]
+
+    def skipped_fields(self, staged):
+        # columns a full save() of an existing row leaves as they are
+        return self.pending_placeholders(staged)
+
+    def save(self, *args, **kwargs):
+        staged = self.stage_uploads()
+        if self.pk is not None and not self._state.adding and 'update_fields' not in kwargs:
+            skip = self.skipped_fields(staged)
+            if skip:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in skip]
+        super().save(*args, **kwargs)
+        encoding_ids = []
+        for name, (source, digest, encoded) in staged.items():
+            # a reused file is recorded as done, which also drops the result
+            # of an older upload still being encoded for this field
+            encoding, _ = ImageEncoding.objects.update_or_create(
+                model=self._meta.label_lower, object_id=self.pk, field=name,
+                defaults={'source': source or '', 'content_hash': digest, 'result': encoded,
+                          'status': ImageEncoding.DONE if encoded else ImageEncoding.PENDING,
+                          'error': ''})
+            if not encoded:
+                encoding_ids.append(encoding.id)
+        schedule_image_encoding(encoding_ids)
+        self._original_images = self.current_images()
+
+
+class Product(AsyncImageMixin, models.Model):
+    async_image_fields = (
+        'product_image', 'additional_image_1', 'additional_image_2',
+        'additional_image_3', 'additional_image_4')
+
     product_vendor = models.ForeignKey(
         Profile, on_delete=models.CASCADE, verbose_name=_("Product Vendor"), blank=True, null=True,)
     product_name = models.CharField(max_length=150, verbose_name=_("Name"))
@@ -95,16 +263,20 @@ class Product(models.Model):
     feedbak_number = models.PositiveIntegerField(
         default=0, blank=True, null=True, verbose_name=_("Feedbak number"))
 
-    # start_1 = models.PositiveIntegerField(default=0,
-    #     blank=True, null=True, verbose_name=_("start_1"))
-    # start_2 = models.PositiveIntegerField(default=0,
-    #     blank=True, null=True, verbose_name=_("start_2"))
-    # start_3 = models.PositiveIntegerField(default=0,
-    #     blank=True, null=True, verbose_name=_("start_3"))
-    # start_4 = models.PositiveIntegerField(default=0,
-    #     blank=True, null=True, verbose_name=_("start_4"))
-    # start_5 = models.PositiveIntegerField(default=0,
-    #     blank=True, null=True, verbose_name=_("start_5"))
+    # rating histogram, kept up to date by ProductRating.save and rebuilt by
+    # the rebuild_rating_stats command
+    feedbak_sum = models.PositiveIntegerField(
+        default=0, verbose_name=_("Feedbak sum"))
+    start_1 = models.PositiveIntegerField(
+        default=0, verbose_name=_("start_1"))
+    start_2 = models.PositiveIntegerField(
+        default=0, verbose_name=_("start_2"))
+    start_3 = models.PositiveIntegerField(
+        default=0, verbose_name=_("start_3"))
+    start_4 = models.PositiveIntegerField(
+        default=0, verbose_name=_("start_4"))
+    start_5 = models.PositiveIntegerField(
+        default=0, verbose_name=_("start_5"))
 
     width = models.FloatField(
         blank=True, null=True, verbose_name=_("Width"))
@@ -177,19 +349,12 @@ class Product(models.Model):
                                blank=True, null=True, allow_unicode=True, unique=True, verbose_name=_("Slugfiy"))
     date = models.DateTimeField(auto_now_add=True, blank=True, null=True)
     date_update = models.DateTimeField(auto_now=True, blank=True, null=True)
-    __original_product_image_name = None
-    __original_additional_image_1_name = None
-    __original_additional_image_2_name = None
-    __original_additional_image_3_name = None
-    __original_additional_image_4_name = None
+    __original_membership = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.__original_product_image_name = self.product_image
-        self.__original_additional_image_1_name = self.additional_image_1
-        self.__original_additional_image_2_name = self.additional_image_2
-        self.__original_additional_image_3_name = self.additional_image_3
-        self.__original_additional_image_4_name = self.additional_image_4
+        if self.pk is not None:
+            self.__original_membership = self.catalog_membership()
 
     class meta:
 
@@ -197,12 +362,41 @@ class Product(models.Model):
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
 
+    class Meta:
+        # keyset pagination of the "load more" lists, see project/pagination.py
+        indexes = [
+            models.Index(fields=['date', 'id'], name='product_date_id_idx'),
+            models.Index(fields=['PRDPrice', 'id'], name='product_price_id_idx'),
+        ]
+
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'slug': self.PRDSlug})
 
     def __str__(self):
         return self.product_name
 
+    def catalog_membership(self):
+        # what decides which related product lists this product shows up in
+        return (self.product_minicategor_id, self.product_vendor_id,
+                self.PRDISactive is True and not self.PRDISDeleted)
+
+    def catalog_membership_changed(self):
+        return self.__original_membership != self.catalog_membership()
+
+    def original_catalog_membership(self):
+        return self.__original_membership
+
+    def rating_breakdown(self):
+        # average out of 5 and the share of each star level in percent
+        number = self.feedbak_number or 0
+        if not number:
+            return {'average_rating': 0, 'start_1': 0, 'start_2': 0,
+                    'start_3': 0, 'start_4': 0, 'start_5': 0}
+        breakdown = {'average_rating': self.feedbak_sum / number}
+        for star in range(1, 6):
+            breakdown[f'start_{star}'] = (getattr(self, f'start_{star}') / number) * 100
+        return breakdown
+
     def product_photo(self):
         return mark_safe('<img src="{}" width="100" />'.format(self.product_image.url))
     product_photo.short_description = "image"
@@ -228,82 +422,19 @@ class Product(models.Model):
     preview_image_4.short_description = "image 4"
     preview_image_4.allow_tags = True
 
-    def save(self, *args, **kwargs):
-        # main image
-        if self.product_image != self.__original_product_image_name:
-
-            # call the compress function
-            new_image = compress(self.product_image)
-            # set self.image to new_image
-            self.product_image = new_image
-
-        if self.pk is None and self.product_image:
-
-            # call the compress function
-            new_image = compress(self.product_image)
-            # set self.image to new_image
-            self.product_image = new_image
-
-        # additional_image_1
-        if self.additional_image_1 != self.__original_additional_image_1_name:
-
-            # call the compress function
-            new_image_1 = compress(self.additional_image_1)
-            # set self.image to new_image
-            self.additional_image_1 = new_image_1
-
-        if self.pk is None and self.additional_image_1:
-
-            # call the compress function
-            new_image_1 = compress(self.additional_image_1)
-            # set self.image to new_image
-            self.additional_image_1 = new_image_1
-
-        # additional_image_2
-        if self.additional_image_2 != self.__original_additional_image_2_name:
-            # call the compress function
-            new_image_2 = compress(self.additional_image_2)
-            # set self.image to new_image
-            self.additional_image_2 = new_image_2
-
-        if self.pk is None and self.additional_image_2:
-            # call the compress function
-            new_image_2 = compress(self.additional_image_2)
-            # set self.image to new_image
-            self.additional_image_2 = new_image_2
-
-        # additional_image_3
-        if self.additional_image_3 != self.__original_additional_image_3_name:
-            # call the compress function
-            new_image_3 = compress(self.additional_image_3)
-            # set self.image to new_image
-            self.additional_image_3 = new_image_3
-
-        if self.pk is None and self.additional_image_3:
-            # call the compress function
-            new_image_3 = compress(self.additional_image_3)
-            # set self.image to new_image
-            self.additional_image_3 = new_image_3
-
-        # additional_image_4
-        if self.additional_image_4 != self.__original_additional_image_4_name:
-            # call the compress function
-            new_image_4 = compress(self.additional_image_4)
-            # set self.image to new_image
-            self.additional_image_4 = new_image_4
-
-        if self.pk is None and self.additional_image_4:
-            # call the compress function
-            new_image_4 = compress(self.additional_image_4)
-            # set self.image to new_image
-            self.additional_image_4 = new_image_4
+    # moved by apply_rating with F() expressions only, a full save() of an
+    # instance loaded before a rating arrived must not write them back
+    rating_fields = (
+        'feedbak_average', 'feedbak_number', 'feedbak_sum',
+        'start_1', 'start_2', 'start_3', 'start_4', 'start_5')
+
+    def skipped_fields(self, staged):
+        return super().skipped_fields(staged) + list(self.rating_fields)
 
+    def save(self, *args, **kwargs):
+        # images are encoded in the background, see AsyncImageMixin
         super().save(*args, **kwargs)
-        self.__original_product_image_name = self.product_image
-        self.__original_additional_image_1_name = self.additional_image_1
-        self.__original_additional_image_2_name = self.additional_image_2
-        self.__original_additional_image_3_name = self.additional_image_3
-        self.__original_additional_image_4_name = self.additional_image_4
+        self.__original_membership = self.catalog_membership()
 
 
 def pre_save_post_receiver(sender, instance, *args, **kwargs):
@@ -317,7 +448,93 @@ def pre_save_post_receiver(sender, instance, *args, **kwargs):
 pre_save.connect(pre_save_post_receiver, sender=Product)
 
 
-class ProductImage(models.Model):
+class ProductSearchDocument(models.Model):
+    # one row per product holding the searchable text, full-text indexed by
+    # the database backend (FTS5 on sqlite, GIN on postgres, FULLTEXT on mysql)
+    # see products/search.py for the queries
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=150, blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    tags = models.CharField(max_length=100, blank=True, default='')
+    sku = models.CharField(max_length=100, blank=True, default='')
+    supercategory = models.ForeignKey(
+        SuperCategory, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    is_listed = models.BooleanField(default=True, db_index=True)
+    date_update = models.DateTimeField(auto_now=True, blank=True, null=True)
+
+    def __str__(self):
+        return str(self.product_id)
+
+    @classmethod
+    def values_for(cls, product):
+        return {
+            'name': product.product_name or '',
+            'description': product.product_description or '',
+            'tags': product.PRDtags or '',
+            'sku': product.PRDSKU or '',
+            'supercategory_id': product.product_supercategory_id,
+            'is_listed': product.PRDISactive is True and not product.PRDISDeleted,
+        }
+
+
+def post_save_search_document_receiver(sender, instance, raw=False, *args, **kwargs):
+    if raw:
+        return
+    ProductSearchDocument.objects.update_or_create(
+        product=instance, defaults=ProductSearchDocument.values_for(instance))
+
+
+post_save.connect(post_save_search_document_receiver, sender=Product)
+post_save.connect(invalidate_product_counts, sender=Product)
+post_delete.connect(invalidate_product_counts, sender=Product)
+
+
+class RelatedProducts(models.Model):
+    # ranked, bounded lists of product ids shown on the product page, filled
+    # in the background by products.related so the page does not have to
+    # scan the whole mini category on every hit
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='related_store')
+    related_ids = models.JSONField(default=list, blank=True)
+    supplier_ids = models.JSONField(default=list, blank=True)
+    date_update = models.DateTimeField(auto_now=True, blank=True, null=True)
+
+    def __str__(self):
+        return str(self.product_id)
+
+
+def schedule_related_refresh(minicategory_ids):
+    from .tasks import refresh_related_products
+    minicategory_ids = sorted({pk for pk in minicategory_ids if pk})
+    if minicategory_ids:
+        transaction.on_commit(
+            lambda: refresh_related_products.delay(minicategory_ids))
+
+
+def post_save_related_receiver(sender, instance, created, raw=False, *args, **kwargs):
+    if raw or not (created or instance.catalog_membership_changed()):
+        return
+    old = instance.original_catalog_membership()
+    if not created:
+        # the lists stored for the product itself are stale too, the page
+        # computes them inline until the refresh has run
+        RelatedProducts.objects.filter(product=instance).delete()
+    schedule_related_refresh([
+        instance.product_minicategor_id, old[0] if old else None])
+
+
+def post_delete_related_receiver(sender, instance, *args, **kwargs):
+    schedule_related_refresh([instance.product_minicategor_id])
+
+
+post_save.connect(post_save_related_receiver, sender=Product)
+post_delete.connect(post_delete_related_receiver, sender=Product)
+
+
+class ProductImage(AsyncImageMixin, models.Model):
+    async_image_fields = ('PRDIImage',)
+
     def upload_file_name(self, filename):
         return f'products/imgs/{self.PRDIProduct.PRDSlug}/'
     PRDIProduct = models.ForeignKey(
@@ -331,13 +548,67 @@ class ProductImage(models.Model):
     class Meta:
         ordering = ('id',)
 
-    def save(self, *args, **kwargs):
-        # call the compress function
-        new_image = compress(self.PRDIImage)
-        # set self.image to new_image
-        self.PRDIImage = new_image
-        # save
-        super().save(*args, **kwargs)
+
+
+def apply_rating(product_id, rate, step):
+    """
+    Adds (step=1) or removes (step=-1) one rating of `rate` stars from the
+    product's counters. the counters are moved with F() expressions so two
+    ratings saved at the same time can not overwrite each other; the
+    average is then worked out from the counters the UPDATE left, while
+    the row is still locked by it.
+    """
+    if not product_id or not rate:
+        return
+    rate = int(rate)
+    if rate < 1 or rate > 5:
+        return
+    star = f'start_{rate}'
+    with transaction.atomic():
+        Product.objects.filter(pk=product_id).update(**{
+            star: F(star) + step,
+            'feedbak_number': Coalesce(F('feedbak_number'), 0) + step,
+            'feedbak_sum': F('feedbak_sum') + step * rate,
+        })
+        counters = Product.objects.filter(pk=product_id).values_list(
+            'feedbak_sum', 'feedbak_number').first()
+        if counters is not None:
+            # rounded in python, Round() on a float rounds halves
+            # differently from one database to the other
+            Product.objects.filter(pk=product_id).update(
+                feedbak_average=rating_average(*counters))
+        # update() sends no post_save, the cached product pages show the stars
+        transaction.on_commit(lambda: invalidate_pages('products'))
+
+
+def rebuild_rating_stats():
+    """
+    Recomputes every product's rating counters from the active ratings.
+    returns the number of products that have at least one rating.
+    """
+    stats = {}
+    rows = ProductRating.objects.filter(
+        active=True, rate__gte=1, rate__lte=5, PRDIProduct__isnull=False
+    ).values('PRDIProduct', 'rate').annotate(number=Count('id')).order_by()
+    for row in rows:
+        product_stats = stats.setdefault(row['PRDIProduct'], [0] * 6)
+        product_stats[row['rate']] = row['number']
+
+    with transaction.atomic():
+        Product.objects.update(
+            feedbak_number=0, feedbak_sum=0, feedbak_average=0,
+            start_1=0, start_2=0, start_3=0, start_4=0, start_5=0)
+        for product_id, counts in stats.items():
+            number = sum(counts)
+            total = sum(star * counts[star] for star in range(1, 6))
+            Product.objects.filter(pk=product_id).update(
+                feedbak_number=number,
+                feedbak_sum=total,
+                feedbak_average=rating_average(total, number),
+                start_1=counts[1], start_2=counts[2], start_3=counts[3],
+                start_4=counts[4], start_5=counts[5])
+        transaction.on_commit(lambda: invalidate_pages('products'))
+    return len(stats)
 
 
 class ProductRating(models.Model):
@@ -355,10 +626,44 @@ class ProductRating(models.Model):
     rating_date = models.DateTimeField(
         auto_now_add=True, blank=True, null=True,)
     rating_update = models.DateTimeField(auto_now=True, blank=True, null=True,)
+    __original_product_id = None
+    __original_rate = None
+    __original_active = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.pk is not None:
+            self.__original_product_id = self.PRDIProduct_id
+            self.__original_rate = self.rate
+            self.__original_active = self.active
 
     def __str__(self):
         return str(self.PRDIProduct)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            old = (self.__original_product_id, self.__original_rate,
+                   self.__original_active)
+            new = (self.PRDIProduct_id, self.rate, self.active)
+            if old != new:
+                if self.__original_active:
+                    apply_rating(self.__original_product_id,
+                                 self.__original_rate, -1)
+                if self.active:
+                    apply_rating(self.PRDIProduct_id, self.rate, 1)
+        self.__original_product_id = self.PRDIProduct_id
+        self.__original_rate = self.rate
+        self.__original_active = self.active
+
+
+def post_delete_rating_receiver(sender, instance, *args, **kwargs):
+    if instance.active:
+        apply_rating(instance.PRDIProduct_id, instance.rate, -1)
+
+
+post_delete.connect(post_delete_rating_receiver, sender=ProductRating)
+
 
 class ProductSize(models.Model):
     PRDIProduct = models.ForeignKey(
@@ -373,3 +678,9 @@ class ProductSize(models.Model):
 
     def __str__(self):
         return str(self.PRDIProduct)
+
+
+# anonymous page cache (project.pagecache)
+for page_model in (Product, ProductImage, ProductRating, ProductSize):
+    post_save.connect(receiver_for('products'), sender=page_model, weak=False)
+    post_delete.connect(receiver_for('products'), sender=page_model, weak=False)
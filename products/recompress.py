@@ -0,0 +1,187 @@
+"""
+Re-encoding of the images that were stored as uploaded.
+
+Only product images go through compress(); profile pictures, blog posts,
+the carousel, categories, the home ads and the site settings images are
+served at their upload size. `recompress_fields` walks RECOMPRESS_FIELDS
+in primary key batches, re-encodes the oversized files as WebP in a
+process pool and points the rows at the new files with one UPDATE per
+field and batch.
+
+The encoding workers only read and write files; all database work stays in
+the calling process. The last primary key done per field is written to a
+checkpoint file after every batch, so an interrupted run picks up where it
+stopped.
+"""
+import json
+import multiprocessing
+import os
+import time
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Case, F, Value, When
+from PIL import Image
+
+from categories.tree import invalidate_tree
+from project.chrome import invalidate_chrome
+from project.pagecache import invalidate_pages
+from .derivatives import DERIVATIVE_FIELDS, schedule_derivatives
+
+
+RECOMPRESS_QUALITY = 75
+
+# model -> {field: longest side in px}
+RECOMPRESS_FIELDS = {
+    'accounts.Profile': {'image': 600},
+    'blog.Post': {'post_image': 1100},
+    'home.Carousel': {'CARImage': 1600},
+    'categories.SuperCategory': {'category_image': 600},
+    'categories.MainCategory': {'category_image': 600},
+    'categories.SubCategory': {'category_image': 600},
+    'categories.MiniCategory': {'category_image': 600},
+    'home.HomeAdSidebar': {'ad_mage': 1100},
+    'home.HomeAdMiddlebar': {'ad_mage': 1100},
+    'home.HomeAdSupplier': {'ad_mage': 1100},
+    'home.HomeAdDaily': {'ad_mage': 1100},
+    'home.HomeAdDealTime': {'ad_mage': 1100},
+    'home.VendorDetailsAdImage': {'ad_mage': 1100},
+    'home.ShopAdSidebar': {'ad_mage': 1100},
+    'home.HotDealAd': {'ad_mage': 1100},
+    # the favicon is left alone, not every browser takes a WebP icon
+    'settings.SiteSetting': {'site_logo': 600, 'login_image': 1100, 'footer_image': 1100},
+}
+
+# WebP files within the size limit and below this many bytes are skipped
+SMALL_FILE = 100 * 1024
+
+
+def recompress_file(job):
+    """
+    Runs in a pool worker. `job` is (source, longest side, max_length of
+    the field); returns (source, new name or None, old bytes, new bytes,
+    error).
+    """
+    source, max_side, max_length = job
+    try:
+        with default_storage.open(source) as original:
+            data = original.read()
+        im = Image.open(BytesIO(data))
+        im.load()
+        oversized = im.width > max_side or im.height > max_side
+        if not oversized and im.format == 'WEBP' and len(data) < SMALL_FILE:
+            return source, None, len(data), len(data), ''
+        if im.mode == 'P':
+            im = im.convert('RGBA')
+        elif im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGB')
+        if oversized:
+            im.thumbnail((max_side, max_side), Image.LANCZOS)
+        im_io = BytesIO()
+        im.save(im_io, format='webp', quality=RECOMPRESS_QUALITY, method=6)
+        encoded = im_io.getvalue()
+        if len(encoded) >= len(data):
+            return source, None, len(data), len(data), ''
+        # .webp and a collision suffix can make the name longer than the
+        # column, the storage shortens it to max_length
+        name = default_storage.save(
+            os.path.splitext(source)[0] + '.webp', ContentFile(encoded), max_length=max_length)
+        return source, name, len(data), len(encoded), ''
+    except Exception as error:
+        return source, None, 0, 0, str(error)
+
+
+class Checkpoint:
+    # {'<model>.<field>': last pk done, ...} plus the running byte totals
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        self.state = {'fields': {}, 'before': 0, 'after': 0, 'files': 0, 'failed': 0}
+        if not reset and os.path.exists(path):
+            with open(path) as checkpoint:
+                self.state.update(json.load(checkpoint))
+
+    def last_pk(self, key):
+        return self.state['fields'].get(key, 0)
+
+    def save(self, key, pk):
+        self.state['fields'][key] = pk
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as checkpoint:
+            json.dump(self.state, checkpoint)
+        os.replace(tmp, self.path)
+
+
+def update_rows(model, field, rows, converted):
+    # one UPDATE for the batch, a row changed since it was read keeps its value;
+    # a name converted for a longer column of another field is left out
+    max_length = model._meta.get_field(field).max_length
+    rows = [(pk, name) for pk, name in rows
+            if name in converted and len(converted[name]) <= max_length]
+    whens = [When(pk=pk, **{field: name}, then=Value(converted[name])) for pk, name in rows]
+    if not whens:
+        return 0
+    return model.objects.filter(pk__in=[pk for pk, name in rows]).update(
+        **{field: Case(*whens, default=F(field))})
+
+
+def recompress_fields(checkpoint, labels=None, processes=None, batch_size=200,
+                      delete_originals=False, pause=0, log=print):
+    """
+    Re-encodes every field of RECOMPRESS_FIELDS (or of `labels`) and returns
+    the checkpoint state with the totals.
+    """
+    converted = {}
+    # the pool is forked, the workers must not share the parent's connections
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        for label, fields in RECOMPRESS_FIELDS.items():
+            if labels and label not in labels:
+                continue
+            model = apps.get_model(label)
+            for field, max_side in fields.items():
+                key = f'{label}.{field}'
+                while True:
+                    rows = list(model.objects.filter(pk__gt=checkpoint.last_pk(key)).exclude(
+                        **{field: ''}).exclude(**{f'{field}__isnull': True}).order_by(
+                        'pk').values_list('pk', field)[:batch_size])
+                    if not rows:
+                        break
+                    max_length = model._meta.get_field(field).max_length
+                    jobs = {(name, max_side, max_length) for _, name in rows if name not in converted}
+                    replaced = []
+                    for source, name, before, after, error in pool.imap_unordered(
+                            recompress_file, sorted(jobs)):
+                        if error:
+                            checkpoint.state['failed'] += 1
+                            log(f"{key} {source}: {error}")
+                            continue
+                        if name:
+                            converted[source] = name
+                            replaced.append(source)
+                            checkpoint.state['files'] += 1
+                            checkpoint.state['before'] += before
+                            checkpoint.state['after'] += after
+                    if update_rows(model, field, rows, converted):
+                        invalidate_caches()
+                        if label in DERIVATIVE_FIELDS:
+                            schedule_derivatives(converted[source] for source in replaced)
+                    if delete_originals:
+                        for source in replaced:
+                            if not model.objects.filter(**{field: source}).exists():
+                                default_storage.delete(source)
+                    checkpoint.save(key, rows[-1][0])
+                    log(f"{key} up to pk {rows[-1][0]}, {len(replaced)} re-encoded")
+                    if pause:
+                        time.sleep(pause)
+    return checkpoint.state
+
+
+def invalidate_caches():
+    # the snapshots and cached pages hold the old file names
+    invalidate_chrome()
+    invalidate_tree()
+    invalidate_pages('home', 'blog', 'vendors')
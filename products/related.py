@@ -0,0 +1,97 @@
+"""
+Related-items store for the product page.
+
+For every product we keep two short ranked id lists in RelatedProducts:
+other products of the same mini category ("related products") and the
+ones of the same mini category sold by the same supplier ("more from this
+supplier"). A whole mini category is refreshed with one query, in a Celery
+task started when a product joins, leaves or moves between mini
+categories, vendors or the listed state. The product page then loads both
+lists with a single id__in query.
+"""
+from django.db import transaction
+
+from .models import Product, RelatedProducts, schedule_related_refresh
+
+
+RELATED_PRODUCTS_LIMIT = 8
+
+# best rated first, newest breaks the ties
+RANKING = ('-feedbak_average', '-feedbak_number', '-date', '-id')
+
+
+def listed_products():
+    return Product.objects.filter(PRDISactive=True, PRDISDeleted=False)
+
+
+def rank_lists(ranked, limit=RELATED_PRODUCTS_LIMIT):
+    """
+    `ranked` is a list of (product id, vendor id) in rank order for one
+    mini category, returns {product id: (related ids, supplier ids)}.
+    """
+    top = [pk for pk, _ in ranked[:limit + 1]]
+    by_vendor = {}
+    for pk, vendor_id in ranked:
+        vendor_top = by_vendor.setdefault(vendor_id, [])
+        if len(vendor_top) <= limit:
+            vendor_top.append(pk)
+    lists = {}
+    for pk, vendor_id in ranked:
+        related = [other for other in top if other != pk][:limit]
+        supplier = [other for other in by_vendor[vendor_id] if other != pk][:limit]
+        lists[pk] = (related, supplier)
+    return lists
+
+
+def refresh_minicategory(minicategory_id):
+    ranked = list(listed_products().filter(
+        product_minicategor=minicategory_id).order_by(*RANKING).values_list('id', 'product_vendor'))
+    lists = rank_lists(ranked)
+    with transaction.atomic():
+        RelatedProducts.objects.filter(
+            product__product_minicategor=minicategory_id).exclude(product__in=lists.keys()).delete()
+        existing = set(RelatedProducts.objects.filter(
+            product__in=lists.keys()).values_list('product_id', flat=True))
+        RelatedProducts.objects.bulk_update(
+            [RelatedProducts(product_id=pk, related_ids=related, supplier_ids=supplier)
+             for pk, (related, supplier) in lists.items() if pk in existing],
+            ['related_ids', 'supplier_ids'], batch_size=500)
+        RelatedProducts.objects.bulk_create(
+            [RelatedProducts(product_id=pk, related_ids=related, supplier_ids=supplier)
+             for pk, (related, supplier) in lists.items() if pk not in existing],
+            batch_size=500)
+    return len(lists)
+
+
+def refresh_all():
+    minicategory_ids = Product.objects.filter(
+        product_minicategor__isnull=False).values_list('product_minicategor', flat=True).distinct()
+    return sum(refresh_minicategory(pk) for pk in minicategory_ids)
+
+
+def related_products_for(product):
+    """
+    Returns (related products, supplier products) for the product page,
+    hydrated with one query. A product that has not been through the
+    background job yet gets its lists computed inline, bounded the same way.
+    """
+    store = RelatedProducts.objects.filter(product=product).first()
+    if store is None:
+        # an unlisted (deleted) product never gets a store, refreshing its
+        # mini category on every view would not change that
+        listed = product.PRDISactive is True and not product.PRDISDeleted
+        if listed and product.product_minicategor_id:
+            schedule_related_refresh([product.product_minicategor_id])
+        ranked = list(listed_products().filter(
+            product_minicategor=product.product_minicategor_id).order_by(*RANKING).values_list(
+                'id', 'product_vendor')[:RELATED_PRODUCTS_LIMIT * 4]) if product.product_minicategor_id else []
+        if product.pk not in [pk for pk, _ in ranked]:
+            ranked.append((product.pk, product.product_vendor_id))
+        related_ids, supplier_ids = rank_lists(ranked)[product.pk]
+    else:
+        related_ids, supplier_ids = store.related_ids, store.supplier_ids
+
+    products = listed_products().select_related(
+        'product_vendor').in_bulk(set(related_ids) | set(supplier_ids))
+    return ([products[pk] for pk in related_ids if pk in products],
+            [products[pk] for pk in supplier_ids if pk in products])
@@ -0,0 +1,244 @@
+import re
+
+from django.db import connection, OperationalError, ProgrammingError
+
+from categories.models import SuperCategory
+from .models import Product, ProductSearchDocument
+
+
+DOCUMENT_TABLE = 'products_productsearchdocument'
+SQLITE_FTS_TABLE = 'products_productsearch_fts'
+
+# tsvector expression used by the GIN index created in migration 0069,
+# postgres only uses the index when the query repeats it verbatim
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class SearchBackend:
+    """
+    Runs a ranked, prefix matching query against ProductSearchDocument and
+    returns product ids. every word of the query has to match (AND) and
+    each word is matched as a prefix, so "app" finds "apple".
+    """
+
+    def filters(self, supercategory_id):
+        sql = ["d.is_listed = %s"]
+        params = [True]
+        if supercategory_id is not None:
+            sql.append("d.supercategory_id = %s")
+            params.append(supercategory_id)
+        return sql, params
+
+    def match(self, tokens):
+        raise NotImplementedError
+
+    def run(self, tokens, supercategory_id, ordered, limit=None, offset=0):
+        from_sql, where, params = self.match(tokens)
+        extra_where, extra_params = self.filters(supercategory_id)
+        where = where + extra_where
+        params = params + extra_params
+        if not ordered:
+            sql = f"SELECT COUNT(*) FROM {from_sql} WHERE {' AND '.join(where)}"
+        else:
+            order, order_params = self.order(tokens)
+            sql = f"SELECT d.product_id FROM {from_sql} WHERE {' AND '.join(where)} ORDER BY {order}"
+            params = params + order_params
+            if limit is not None:
+                sql += " LIMIT %s OFFSET %s"
+                params = params + [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def order(self, tokens):
+        # returns (sql, params) for the ORDER BY clause, best match first
+        raise NotImplementedError
+
+    def count(self, tokens, supercategory_id=None):
+        return self.run(tokens, supercategory_id, False)[0][0]
+
+    def ids(self, tokens, supercategory_id=None, limit=None, offset=0):
+        rows = self.run(tokens, supercategory_id, True, limit, offset)
+        return [row[0] for row in rows]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    # FTS5 external content table kept in sync by triggers on the document table
+
+    def query(self, tokens):
+        return ' '.join('"%s"*' % token for token in tokens)
+
+    def match(self, tokens):
+        from_sql = f"{SQLITE_FTS_TABLE} f INNER JOIN {DOCUMENT_TABLE} d ON d.product_id = f.rowid"
+        return from_sql, [f"{SQLITE_FTS_TABLE} MATCH %s"], [self.query(tokens)]
+
+    def order(self, tokens):
+        # bm25 weights follow the fts column order: name, description, tags, sku
+        return f"bm25({SQLITE_FTS_TABLE}, 10.0, 1.0, 4.0, 8.0), d.product_id DESC", []
+
+
+class PostgresSearchBackend(SearchBackend):
+
+    def query(self, tokens):
+        return ' & '.join('%s:*' % token for token in tokens)
+
+    def match(self, tokens):
+        from_sql = f"{DOCUMENT_TABLE} d, to_tsquery('simple', %s) query"
+        # the from clause parameter comes before the where clause ones
+        return from_sql, [f"({POSTGRES_VECTOR}) @@ query"], [self.query(tokens)]
+
+    def order(self, tokens):
+        return f"ts_rank(({POSTGRES_VECTOR}), query) DESC, d.product_id DESC", []
+
+
+class MySQLSearchBackend(SearchBackend):
+
+    def query(self, tokens):
+        return ' '.join('+%s*' % token for token in tokens)
+
+    def match(self, tokens):
+        where = "MATCH(d.name, d.description, d.tags, d.sku) AGAINST (%s IN BOOLEAN MODE)"
+        return f"{DOCUMENT_TABLE} d", [where], [self.query(tokens)]
+
+    def order(self, tokens):
+        # name and sku matches count twice, they have their own FULLTEXT index
+        sql = (
+            "(2 * MATCH(d.name, d.sku) AGAINST (%s IN BOOLEAN MODE) + "
+            "MATCH(d.name, d.description, d.tags, d.sku) AGAINST (%s IN BOOLEAN MODE)) DESC, "
+            "d.product_id DESC"
+        )
+        return sql, [self.query(tokens)] * 2
+
+
+class LikeSearchBackend(SearchBackend):
+    # used when the database has no full-text support we know about
+
+    def match(self, tokens):
+        where = []
+        params = []
+        for token in tokens:
+            where.append(
+                "(LOWER(d.name) LIKE %s OR LOWER(d.description) LIKE %s OR LOWER(d.tags) LIKE %s OR LOWER(d.sku) LIKE %s)")
+            params += ['%' + token + '%'] * 4
+        return f"{DOCUMENT_TABLE} d", where, params
+
+    def order(self, tokens):
+        return "d.product_id DESC", []
+
+
+def sqlite_fts_available():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'sqlite':
+            _backend = SQLiteSearchBackend() if sqlite_fts_available() else LikeSearchBackend()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == 'mysql':
+            _backend = MySQLSearchBackend()
+        else:
+            _backend = LikeSearchBackend()
+    return _backend
+
+
+class SearchResults:
+    """
+    Lazy, sliceable result set so it can be handed to Paginator: count()
+    and each page are one indexed query each, the page is then hydrated
+    with a single id__in query in rank order.
+    """
+
+    def __init__(self, word, supercategory_id=None):
+        self.tokens = tokenize(word)
+        self.supercategory_id = supercategory_id
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = get_backend().count(
+                self.tokens, self.supercategory_id) if self.tokens else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = item.stop if item.stop is not None else self.count()
+        if not self.tokens or stop <= start:
+            return []
+        ids = get_backend().ids(
+            self.tokens, self.supercategory_id, limit=stop - start, offset=start)
+        products = Product.objects.select_related(
+            'product_vendor', 'product_supercategory').in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+def listed_products(supercategory_id=None):
+    # what an empty query lists, like product_name__icontains="" did
+    qs = Product.objects.filter(PRDISDeleted=False, PRDISactive=True)
+    if supercategory_id is not None:
+        qs = qs.filter(product_supercategory_id=supercategory_id)
+    return qs.select_related('product_vendor', 'product_supercategory').order_by('-id')
+
+
+def search_products(word, category=None):
+    supercategory_id = None
+    if category:
+        supercategory_id = SuperCategory.objects.filter(
+            name=category).values_list('id', flat=True).first()
+        if supercategory_id is None:
+            return Product.objects.none()
+    if not tokenize(word):
+        return listed_products(supercategory_id)
+    return SearchResults(word, supercategory_id)
+
+
+def rebuild_index(batch_size=500):
+    """
+    Refills ProductSearchDocument from the Product table, used by the
+    rebuild_search_index command and the initial migration.
+    """
+    ProductSearchDocument.objects.all().delete()
+    documents = []
+    count = 0
+    for product in Product.objects.all().iterator(chunk_size=batch_size):
+        documents.append(ProductSearchDocument(
+            product=product, **ProductSearchDocument.values_for(product)))
+        if len(documents) >= batch_size:
+            ProductSearchDocument.objects.bulk_create(documents)
+            count += len(documents)
+            documents = []
+    if documents:
+        ProductSearchDocument.objects.bulk_create(documents)
+        count += len(documents)
+    if connection.vendor == 'sqlite' and sqlite_fts_available():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+        except (OperationalError, ProgrammingError):
+            pass
+    return count
@@ -0,0 +1,27 @@
+from celery import shared_task
+
+from .derivatives import build_derivatives
+from .images import encode_staged_image
+from .related import refresh_minicategory, refresh_all
+
+
+@shared_task
+def refresh_related_products(minicategory_ids):
+    for minicategory_id in minicategory_ids:
+        refresh_minicategory(minicategory_id)
+
+
+@shared_task
+def refresh_all_related_products():
+    return refresh_all()
+
+
+@shared_task
+def encode_image(encoding_id):
+    return encode_staged_image(encoding_id)
+
+
+@shared_task
+def build_image_derivatives(sources):
+    for source in sources:
+        build_derivatives(source)
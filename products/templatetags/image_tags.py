@@ -0,0 +1,14 @@
+from django import template
+
+from products.derivatives import srcset_attributes
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, slot='card'):
+    """
+    Emits the src, srcset and sizes attributes of an <img> for an image
+    field, e.g. <img {% srcset product.product_image 'card' %} alt="" />
+    """
+    return srcset_attributes(image, slot)
@@ -1,3 +1,40 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Product, ProductRating, rebuild_rating_stats
+from .utils import rating_average
+
+
+class RatingAverageTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            product_name='apple', product_description='apple', PRDPrice=10)
+
+    def rate(self, rate, times):
+        for _ in range(times):
+            ProductRating.objects.create(PRDIProduct=self.product, rate=rate)
+
+    def test_halves_round_up(self):
+        self.assertEqual(rating_average(82, 80), 21)
+        self.assertEqual(rating_average(0, 0), 0)
+
+    def test_incremental_and_rebuilt_averages_agree_on_a_half(self):
+        # 78 one star and 2 two star ratings: 82 * 20 / 80 = 20.5
+        self.rate(1, 78)
+        self.rate(2, 2)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.feedbak_sum, self.product.feedbak_number), (82, 80))
+        self.assertEqual(self.product.feedbak_average, 21)
+        rebuild_rating_stats()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.feedbak_average, 21)
+
+    def test_stale_save_keeps_the_rating_counters(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.rate(5, 1)
+        stale.product_name = 'green apple'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_name, 'green apple')
+        self.assertEqual((self.product.feedbak_number, self.product.start_5), (1, 1))
+        self.assertEqual(self.product.feedbak_average, 100)
@@ -1,6 +1,7 @@
 from django.utils.text import slugify
 import random
 import string
+from decimal import Decimal, ROUND_HALF_UP
 
 
 from django.conf import settings
@@ -22,3 +23,14 @@ def create_shortcode(instance):
     if qs_exists:
         return create_shortcode(instance)
     return new_slug
+
+
+def rating_average(total, number):
+    """
+    The stored feedbak_average: the mean rating in percent of five stars,
+    rounded half up (2.5 -> 3). The only place it is worked out, the
+    incremental update, the rebuild and the migration all call it.
+    """
+    if not number:
+        return 0
+    return int((Decimal(total * 20) / number).quantize(Decimal(1), rounding=ROUND_HALF_UP))
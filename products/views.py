@@ -1,5 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from .models import Product, ProductImage, ProductRating, ProductSize
+from .search import search_products
+from .related import related_products_for
 from django.core.paginator import Paginator
 import random
 from django.http import JsonResponse
@@ -9,9 +11,11 @@ from django.http import HttpResponse, HttpResponseRedirect
 from django.db.models import Sum
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from accounts.models import Profile
+from project.pagecache import cache_anonymous_page
 # Create your views here.
 
 
+@cache_anonymous_page('products', 'vendors')
 def product_details(request, slug):
     if not request.session.has_key('currency'):
         request.session['currency'] = settings.DEFAULT_CURRENCY
@@ -19,53 +23,15 @@ def product_details(request, slug):
     product_detail = get_object_or_404(Product, PRDSlug=slug, PRDISactive=True)
     product_variations = ProductSize.objects.all().filter(PRDIProduct=product_detail)
     product_image = ProductImage.objects.all().filter(PRDIProduct=product_detail)
-    related_products_minicategor = product_detail.product_minicategor
-    related_products = Product.objects.all().filter(
-        product_minicategor=related_products_minicategor, PRDISactive=True)
-    supplier_Products = Product.objects.all().filter(product_vendor=product_detail.product_vendor,
-                                                     product_minicategor=related_products_minicategor, PRDISactive=True)
+    related_products, supplier_Products = related_products_for(product_detail)
 
     # related = ProductAlternative.objects.all().filter(PALNProduct=product_detail)
     # related_products = product_detail.alternative_products.all()
 
     product_feedback = ProductRating.objects.all().filter(
         PRDIProduct=product_detail, active=True)
-    feedback_sum = ProductRating.objects.all().filter(
-        PRDIProduct=product_detail, active=True).aggregate(Sum('rate'))
-    feedbak_number = product_feedback.count()
-
-    try:
-
-        average_rating = int(feedback_sum["rate__sum"]) / feedbak_number
-
-        start_1_sum = ProductRating.objects.all().filter(
-            PRDIProduct=product_detail, active=True, rate=1).count()
-
-        start_2_sum = ProductRating.objects.all().filter(
-            PRDIProduct=product_detail, active=True, rate=2).count()
-
-        start_3_sum = ProductRating.objects.all().filter(
-            PRDIProduct=product_detail, active=True, rate=3).count()
-
-        start_4_sum = ProductRating.objects.all().filter(
-            PRDIProduct=product_detail, active=True, rate=4).count()
-
-        start_5_sum = ProductRating.objects.all().filter(
-            PRDIProduct=product_detail, active=True, rate=5).count()
-
-        start_1 = (start_1_sum / feedbak_number) * 100
-        start_2 = (start_2_sum / feedbak_number) * 100
-        start_3 = (start_3_sum / feedbak_number) * 100
-        start_4 = (start_4_sum / feedbak_number) * 100
-        start_5 = (start_5_sum / feedbak_number) * 100
-
-    except:
-        average_rating = 0
-        start_1 = 0
-        start_2 = 0
-        start_3 = 0
-        start_4 = 0
-        start_5 = 0
+    feedbak_number = product_detail.feedbak_number
+    rating = product_detail.rating_breakdown()
 
     context = {
         'product_detail': product_detail,
@@ -75,13 +41,13 @@ def product_details(request, slug):
         'supplier_Products': supplier_Products,
         # 'related_products': related_products,
         'product_feedback': product_feedback,
-        'average_rating': average_rating,
+        'average_rating': rating['average_rating'],
         'feedbak_number': feedbak_number,
-        "start_1": start_1,
-        "start_2": start_2,
-        "start_3": start_3,
-        "start_4": start_4,
-        "start_5": start_5,
+        "start_1": rating['start_1'],
+        "start_2": rating['start_2'],
+        "start_3": rating['start_3'],
+        "start_4": rating['start_4'],
+        "start_5": rating['start_5'],
 
     }
     return render(request, 'products/shop-product-vendor.html', context)
@@ -105,65 +71,22 @@ def product_search(request):
             category_select = "All Categories"
         request.session["search_category_select"] = category_select
 
-        if category_select == "All Categories":
-            qs = Product.objects.all().filter(
-                product_name__icontains=word, PRDISDeleted=False, PRDISactive=True)
+    if "search_product" in request.session.keys() and "search_category_select" in request.session.keys():
+        category_select = request.session["search_category_select"]
+        qs = search_products(
+            request.session["search_product"],
+            None if category_select == "All Categories" else category_select)
+        if request.method == 'POST':
             request.session["products_count"] = qs.count()
-            paginator = Paginator(qs, 12)
-            page = request.GET.get('page')
-            try:
-                qs = paginator.page(page)
-            except PageNotAnInteger:
-                qs = paginator.page(1)
-            except EmptyPage:
-                qs = paginator.page(paginator.num_page)
-            print("page:", page)
-        else:
-            qs = Product.objects.all().filter(
-                product_name__icontains=word, PRDISDeleted=False, PRDISactive=True, product_supercategory__name=category_select)
-            request.session["products_count"] = qs.count()
-            paginator = Paginator(qs, 12)
-            page = request.GET.get('page')
-            try:
-                qs = paginator.page(page)
-            except PageNotAnInteger:
-                qs = paginator.page(1)
-            except EmptyPage:
-                qs = paginator.page(paginator.num_page)
-            print("page:", page)
 
-        context = {
-            'qs': qs,
-            'page': page,
-        }
-    # if request.GET.get('page') != "1" :
-    if "search_product" in request.session.keys() and "search_product" in request.session.keys():
-        if request.session["search_category_select"] == "All Categories":
-            qs = Product.objects.all().filter(
-                product_name__icontains=request.session["search_product"], PRDISDeleted=False, PRDISactive=True)
-
-            paginator = Paginator(qs, 12)
-            page = request.GET.get('page')
-            try:
-                qs = paginator.page(page)
-            except PageNotAnInteger:
-                qs = paginator.page(1)
-            except EmptyPage:
-                qs = paginator.page(paginator.num_page)
-            print("page:", page)
-        else:
-            qs = Product.objects.all().filter(
-                product_name__icontains=request.session["search_product"], PRDISDeleted=False, PRDISactive=True, product_supercategory__name=request.session["search_category_select"])
-            # print(qs)
-            paginator = Paginator(qs, 12)
-            page = request.GET.get('page')
-            try:
-                qs = paginator.page(page)
-            except PageNotAnInteger:
-                qs = paginator.page(1)
-            except EmptyPage:
-                qs = paginator.page(paginator.num_page)
-            print("page:", page)
+        paginator = Paginator(qs, 12)
+        page = request.GET.get('page')
+        try:
+            qs = paginator.page(page)
+        except PageNotAnInteger:
+            qs = paginator.page(1)
+        except EmptyPage:
+            qs = paginator.page(paginator.num_pages)
 
         context = {
             'qs': qs,
@@ -192,22 +115,6 @@ def product_rating(request):
                 old_rating.client_comment = message
                 old_rating.save()
 
-                product_feedback = ProductRating.objects.all().filter(
-                    PRDIProduct=product, active=True)
-                feedback_sum = ProductRating.objects.all().filter(
-                    PRDIProduct=product, active=True).aggregate(Sum('rate'))
-                feedbak_number = product_feedback.count()
-                try:
-                    if feedback_sum != None or feedback_sum != 0:
-                        average_rating = round(
-                            (int(feedback_sum["rate__sum"]) / feedbak_number) * 20)
-                        product.feedbak_average = average_rating
-                        product.feedbak_number = feedbak_number
-                        product.save()
-
-                except:
-                    pass
-
                 # send_mail(
                 #     "You received a message from {}".format(name),
                 #     f'{message}',
@@ -224,24 +131,6 @@ def product_rating(request):
 
                     client_comment=message,
                 )
-
-                product_feedback = ProductRating.objects.all().filter(
-                    PRDIProduct=product, active=True)
-                feedback_sum = ProductRating.objects.all().filter(
-                    PRDIProduct=product, active=True).aggregate(Sum('rate'))
-                feedbak_number = product_feedback.count()
-                try:
-                    if feedback_sum != None or feedback_sum != 0:
-                        average_rating = round(
-                            (int(feedback_sum["rate__sum"]) / feedbak_number * 20))
-                        product.feedbak_average = average_rating
-                        product.feedbak_number = feedbak_number
-                        product.save()
-
-                except:
-                    product.feedbak_average = int(product_rate) * 20
-                    product.feedbak_number = 1
-                    product.save()
                 # send_mail(
                 #     "You received a message from {}".format(name),
                 #     f'{message}',
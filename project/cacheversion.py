@@ -0,0 +1,30 @@
+"""
+Version numbers kept in the shared cache.
+
+Cached data that has to be dropped in every worker at once (count
+namespaces, page generations, sample pools, the category tree, the site
+chrome, the gazetteer) puts a version number into its keys or compares it
+with what the process holds. Bumping the number is one cache.incr(); the
+old entries are not deleted, they just stop being read.
+
+A missing version starts from the clock in ms, so a number evicted from
+the cache does not restart at a value that still has live entries.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
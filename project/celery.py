@@ -0,0 +1,20 @@
+"""
+Celery application for the background jobs of the site.
+
+Start a worker next to the web processes with:
+
+    celery -A project worker -l info
+
+and the periodic jobs with:
+
+    celery -A project beat -l info
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+app = Celery('project')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,105 @@
+"""
+Site chrome: the layout data every page shows around the view's content
+(site settings, home page theme, contact and support info, social links,
+footer pages and the header/sidebar ads).
+
+Eleven context processors used to query all of it on every request, even
+for renders that never show a header. It is now one snapshot of plain
+lists of model instances, stored in the shared cache under a version
+number that is bumped whenever one of the underlying rows is saved or
+deleted, and memoised per process for that version.
+
+`site_chrome` hands templates lazy values: the snapshot is only read when
+a template touches one of its keys, and the random ad picks are drawn from
+the snapshot in python, so a page costs no query at all for its chrome
+once the snapshot is warm.
+"""
+import random
+
+from django.apps import apps
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .cacheversion import bump_version, get_version
+from .sampling import sample
+
+
+CHROME_TIMEOUT = 60 * 60
+CHROME_VERSION_KEY = 'site-chrome-version'
+
+# context name -> (model, filters)
+LISTS = {
+    'Socail_links': ('settings.SocailLinks', {}),
+    'contact_info': ('settings.ContactInfo', {}),
+    'support_number': ('settings.SupportNumber', {}),
+    'pages_list': ('pages.PagesList', {'active': True}),
+    'home_ads_deal_time_obj': ('home.HomeAdDealTime', {}),
+    'vendor_page_ad_image': ('home.VendorDetailsAdImage', {}),
+    'shop_page_ad': ('home.ShopAdSidebar', {}),
+    'hot_dael': ('home.HotDealAd', {}),
+    'head_text': ('home.HeadTextAd', {}),
+}
+
+# ads shown in random order, context name -> how many (None for all)
+RANDOM_PICKS = {
+    'home_ads_deal_time_obj': 4,
+    'vendor_page_ad_image': 1,
+    'shop_page_ad': 1,
+    'hot_dael': 3,
+    'head_text': None,
+}
+
+def chrome_version():
+    return get_version(CHROME_VERSION_KEY)
+
+
+def invalidate_chrome(*args, **kwargs):
+    bump_version(CHROME_VERSION_KEY)
+
+
+def build_snapshot():
+    snapshot = {}
+    for name, (model, filters) in LISTS.items():
+        snapshot[name] = list(apps.get_model(model).objects.filter(**filters))
+    snapshot['site_info'] = apps.get_model('settings.SiteSetting').objects.all().first()
+    theme = apps.get_model('settings.HomePageTheme').objects.filter(active=True).first()
+    snapshot['home_theme'] = str(theme)
+    return snapshot
+
+
+_loaded = None
+
+
+def get_snapshot():
+    global _loaded
+    version = chrome_version()
+    loaded = _loaded
+    if loaded is None or loaded[0] != version:
+        key = f'site-chrome:{version}'
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = build_snapshot()
+            cache.set(key, snapshot, CHROME_TIMEOUT)
+        loaded = (version, snapshot)
+        _loaded = loaded
+    return loaded[1]
+
+
+def pick(name):
+    rows = get_snapshot()[name]
+    k = RANDOM_PICKS[name]
+    if k is None or k > len(rows):
+        k = len(rows)
+    return random.sample(rows, k)
+
+
+def site_chrome(request):
+    context = {}
+    for name in LISTS:
+        if name in RANDOM_PICKS:
+            context[name] = SimpleLazyObject(lambda name=name: pick(name))
+        else:
+            context[name] = SimpleLazyObject(lambda name=name: get_snapshot()[name])
+    context['site_info'] = SimpleLazyObject(lambda: get_snapshot()['site_info'])
+    context['new_products'] = SimpleLazyObject(lambda: sample('products', 3))
+    return context
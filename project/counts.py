@@ -0,0 +1,73 @@
+"""
+Cached row counts for the "load more" JSON list endpoints.
+
+The views used to run `len(queryset)`, pulling every matching row into
+Python on every click just to report the total. Counts are now done with
+COUNT(*) in the database and kept in the cache under a key made of the
+listing parts (category level, category id, vendor, status ...).
+
+Each namespace carries a generation number that is part of every key, so
+invalidating a namespace is a single cache.incr(): the old entries are not
+deleted, they just stop being read and expire on their own.
+"""
+from django.core.cache import cache
+
+from .cacheversion import bump_version, get_version
+
+
+COUNT_TIMEOUT = 60 * 10
+
+
+def generation_key(namespace):
+    return f'listing-count-gen:{namespace}'
+
+
+def generation(namespace):
+    return get_version(generation_key(namespace))
+
+
+def invalidate(*namespaces):
+    for namespace in namespaces:
+        bump_version(generation_key(namespace))
+
+
+def listing_count(namespace, queryset, *parts):
+    key = 'listing-count:{}:{}:{}'.format(
+        namespace, generation(namespace), ':'.join(str(part) for part in parts))
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def product_count(queryset, level='all', category_id=None, vendor_id=None, status='listed'):
+    return listing_count('products', queryset, level, category_id, vendor_id, status)
+
+
+def vendor_orders_count(queryset, vendor_id, status='All'):
+    return listing_count(f'orders:vendor:{vendor_id}', queryset, status)
+
+
+def user_orders_count(queryset, user_id):
+    return listing_count(f'orders:user:{user_id}', queryset)
+
+
+def vendors_count(queryset):
+    return listing_count('vendors', queryset)
+
+
+def invalidate_product_counts(sender, **kwargs):
+    invalidate('products')
+
+
+def invalidate_user_orders_count(sender, instance, **kwargs):
+    invalidate(f'orders:user:{instance.user_id}')
+
+
+def invalidate_vendor_orders_count(sender, instance, **kwargs):
+    invalidate(f'orders:vendor:{instance.vendor_id}')
+
+
+def invalidate_vendors_count(sender, **kwargs):
+    invalidate('vendors')
@@ -0,0 +1,125 @@
+"""
+Full page cache for anonymous visitors on the catalog pages.
+
+For a visitor who is not logged in and has no cart the home, category,
+product, vendor and blog list pages only vary by the selected currency and
+the active home page theme, so the rendered html is kept in the shared
+cache and served without running the view.
+
+The key holds the version of everything the page was built from: the site
+chrome snapshot, the category tree and a generation number per dependency
+("products", "vendors", "home", "blog") that post_save/post_delete on the
+underlying models bump. A change makes the old entries unreachable at
+once; they expire on their own. Working out the key only reads the cache,
+so a hit never touches the ORM.
+
+Pages carry per-visitor csrf tokens. They are cut out before the page is
+stored and a fresh token for the visitor is put back on every hit.
+"""
+import functools
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from categories.tree import tree_version
+from .cacheversion import bump_version, get_version
+from .chrome import chrome_version, get_snapshot
+
+
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+CSRF_INPUT_RE = re.compile(
+    r'(<input type="hidden" name="csrfmiddlewaretoken" value=")[^"]*(">)')
+CSRF_PLACEHOLDER = '\x00csrf\x00'
+
+
+def generation_key(dependency):
+    return f'page-cache-gen:{dependency}'
+
+
+def generation(dependency):
+    return get_version(generation_key(dependency))
+
+
+def invalidate_pages(*dependencies):
+    for dependency in dependencies:
+        bump_version(generation_key(dependency))
+
+
+def receiver_for(*dependencies):
+    # a signal receiver that drops the pages built from `dependencies`
+    def receiver(sender, instance, *args, **kwargs):
+        invalidate_pages(*dependencies)
+    return receiver
+
+
+def is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # an open order, or the session cart of orders.cart.SessionCart
+    if request.session.get('cart_id') or request.session.get('cart'):
+        return False
+    # pending flash messages are rendered into the page
+    if 'messages' in request.COOKIES or '_messages' in request.session:
+        return False
+    return True
+
+
+def page_key(request, dependencies):
+    currency = request.session.get('currency', settings.DEFAULT_CURRENCY)
+    theme = get_snapshot().get('home_theme')
+    versions = [chrome_version(), tree_version(), generation('currencies')]
+    versions += [generation(dependency) for dependency in dependencies]
+    raw = '|'.join(str(part) for part in [
+        request.get_full_path(), currency, theme] + versions)
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def store(key, response):
+    content = response.content.decode(response.charset)
+    content = CSRF_INPUT_RE.sub(r'\1' + CSRF_PLACEHOLDER + r'\2', content)
+    cache.set(key, (response.get('Content-Type'), content), PAGE_CACHE_TIMEOUT)
+
+
+def restore(request, entry):
+    content_type, content = entry
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(content, content_type=content_type)
+
+
+def cache_anonymous_page(*dependencies):
+    """
+    View decorator. `dependencies` names the generations the page is built
+    from besides the site chrome and the category tree.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            key = page_key(request, dependencies)
+            entry = cache.get(key)
+            if entry is not None:
+                return restore(request, entry)
+            response = view(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies and is_cacheable(request)):
+                store(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+# exchange rates change the prices printed on every cached page
+post_save.connect(receiver_for('currencies'), sender='currencies.Currency',
+                  weak=False, dispatch_uid='page-cache-save-currency')
+post_delete.connect(receiver_for('currencies'), sender='currencies.Currency',
+                    weak=False, dispatch_uid='page-cache-delete-currency')
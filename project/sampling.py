@@ -0,0 +1,125 @@
+"""
+Random sampling without ORDER BY RANDOM().
+
+The home page, the blog and several context processors picked rows with
+`order_by("?")`, which makes the database read and sort the whole table on
+every request. Instead each pool keeps the ids of the rows it can draw
+from (and an optional weight per row) in process memory and draws samples
+with the random module; only the drawn rows are loaded, with one id__in
+query.
+
+A pool is reloaded when its timeout runs out or when one of its rows is
+saved or deleted. The invalidation goes through a version number in the
+shared cache so that every worker process notices it.
+"""
+import random
+import time
+
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
+
+from .cacheversion import bump_version, get_version
+
+
+POOL_TIMEOUT = 60 * 15
+
+
+class SamplePool:
+
+    def __init__(self, name, model, filters=None, weight=None, weight_scale=1,
+                 timeout=POOL_TIMEOUT):
+        self.name = name
+        self.model = model
+        self.filters = filters or {}
+        # a row is drawn in proportion to 1 + its `weight` column / weight_scale
+        self.weight = weight
+        self.weight_scale = weight_scale
+        self.timeout = timeout
+        self._loaded = None
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+    def version_key(self):
+        return f'sample-pool:{self.name}'
+
+    def version(self):
+        return get_version(self.version_key())
+
+    def invalidate(self, *args, **kwargs):
+        bump_version(self.version_key())
+
+    def load(self):
+        queryset = self.get_model().objects.filter(**self.filters).order_by()
+        if self.weight:
+            rows = list(queryset.values_list('id', self.weight))
+            ids = [pk for pk, _ in rows]
+            weights = [max(float(weight or 0), 0) / self.weight_scale + 1 for _, weight in rows]
+        else:
+            ids = list(queryset.values_list('id', flat=True))
+            weights = None
+        return ids, weights
+
+    def members(self):
+        version = self.version()
+        loaded = self._loaded
+        if loaded is None or loaded[0] != version or loaded[1] < time.monotonic():
+            ids, weights = self.load()
+            loaded = (version, time.monotonic() + self.timeout, ids, weights)
+            self._loaded = loaded
+        return loaded[2], loaded[3]
+
+    def sample_ids(self, k=None):
+        ids, weights = self.members()
+        if k is None or k > len(ids):
+            k = len(ids)
+        if not weights:
+            return random.sample(ids, k)
+        # weighted sampling without replacement (Efraimidis-Spirakis): keep
+        # the k largest random() ** (1 / weight) keys
+        keyed = ((random.random() ** (1.0 / weight), pk) for pk, weight in zip(ids, weights))
+        return [pk for _, pk in sorted(keyed, reverse=True)[:k]]
+
+    def sample(self, k=None, queryset=None):
+        """
+        Returns up to `k` model instances in random order. `queryset` can
+        add select_related() and friends, it is filtered by the drawn ids.
+        """
+        ids = self.sample_ids(k)
+        if not ids:
+            return []
+        if queryset is None:
+            queryset = self.get_model().objects.all()
+        objects = queryset.in_bulk(ids)
+        return [objects[pk] for pk in ids if pk in objects]
+
+
+POOLS = {}
+
+
+def register(name, model, filters=None, weight=None, weight_scale=1, timeout=POOL_TIMEOUT):
+    pool = SamplePool(name, model, filters, weight, weight_scale, timeout)
+    POOLS[name] = pool
+    post_save.connect(pool.invalidate, sender=model, weak=False,
+                      dispatch_uid=f'sample-pool-save-{name}')
+    post_delete.connect(pool.invalidate, sender=model, weak=False,
+                        dispatch_uid=f'sample-pool-delete-{name}')
+    return pool
+
+
+def sample(name, k=None, queryset=None):
+    return POOLS[name].sample(k, queryset)
+
+
+# better rated products come up more often: feedbak_average is the rating in
+# percent, so a five star product is drawn six times as often as an unrated
+# one. ratings are written with update(), the pool sees them after its timeout
+register('products', 'products.Product', {'PRDISactive': True},
+         weight='feedbak_average', weight_scale=20)
+register('super_categories', 'categories.SuperCategory')
+register('main_categories', 'categories.MainCategory')
+register('home_ad_middlebar', 'home.HomeAdMiddlebar')
+register('home_ad_supplier', 'home.HomeAdSupplier')
+register('home_ad_daily', 'home.HomeAdDaily')
+register('home_ad_deal_time', 'home.HomeAdDealTime')
+register('posts', 'blog.Post')
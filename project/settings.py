@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
+from celery.schedules import crontab
 from django.utils.translation import ugettext_lazy as _
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -102,18 +103,8 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'currencies.context_processors.currencies',
                 'categories.context_processors.category_obj',
-                'products.context_processors.new_products_obj',
                 'orders.context_processors.orders_cart_obj',
-                'home.context_processors.DealTime_obj',
-                'home.context_processors.vendor_details_ad_image',
-                'home.context_processors.shop_ad_sidebar',
-                'home.context_processors.hot_deal_ad',
-                'home.context_processors.head_text_ad',
-                'settings.context_processors.socail_links_settings',
-                'settings.context_processors.contact_info_settings',
-                'settings.context_processors.support_number_settings',
-                'settings.context_processors.site_settings',
-                'pages.context_processors.pages_list_obj',
+                'project.chrome.site_chrome',
 
             ],
         },
@@ -147,6 +138,100 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# every worker process has its own local-memory cache, in production point
+# this to a shared memcached/redis server so invalidations reach all workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'nest-default',
+    }
+}
+
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+#         'LOCATION': '127.0.0.1:11211',
+#     }
+# }
+
+# sessions are read through the cache so the anonymous page cache
+# (project.pagecache) can serve a hit without a database query
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Digital downloads (accounts.downloads)
+# signed download links stay valid this many seconds
+DOWNLOAD_URL_MAX_AGE = 60 * 30
+# None streams the file from django, 'x-sendfile' (apache mod_xsendfile) or
+# 'x-accel-redirect' (nginx, with an internal location for
+# DOWNLOAD_ACCEL_PREFIX aliased to MEDIA_ROOT) hand it to the web server
+DOWNLOAD_OFFLOAD = None
+DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Celery
+# https://docs.celeryproject.org/en/stable/django/first-steps-with-django.html
+# tasks run inline until a broker and a worker are set up, set
+# CELERY_TASK_ALWAYS_EAGER = False in production
+
+CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    # ratings move the ranking without a catalog change, re-rank nightly
+    'refresh-related-products': {
+        'task': 'products.tasks.refresh_all_related_products',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    # abandoned carts and old finished orders, see orders/archive.py
+    'archive-orders': {
+        'task': 'orders.tasks.archive_orders',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    # retries of the checkout side effects, see orders/outbox.py
+    'drain-outbox': {
+        'task': 'orders.tasks.drain_outbox',
+        'schedule': 60.0,
+    },
+    # states and cities of the checkout form, see orders/gazetteer.py
+    'refresh-locations': {
+        'task': 'orders.tasks.refresh_locations',
+        'schedule': crontab(hour=5, minute=0, day_of_week='sunday'),
+    },
+}
+
+# unfinished orders untouched this long are deleted, finished orders older
+# than ORDER_ARCHIVE_DAYS move to the archive tables
+ABANDONED_CART_DAYS = 30
+ORDER_ARCHIVE_DAYS = 365 * 2
+
+# checkout mails and shipments are queued in OutboxJob; a failing job is
+# retried with backoff OUTBOX_MAX_ATTEMPTS times, done jobs are deleted
+# after OUTBOX_KEEP_DAYS
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_LEASE = 60 * 5
+OUTBOX_KEEP_DAYS = 30
+
+# outbound calls to the gateways and Aramex, see orders/gateways.py;
+# (connect, read) timeouts in seconds per upstream
+GATEWAY_TIMEOUTS = {
+    'default': (3.05, 15),
+    'aramex': (3.05, 20),
+    'myfatoorah': (3.05, 20),
+}
+GATEWAY_POOL_SIZE = 10
+GATEWAY_RETRIES = 2
+GATEWAY_BREAKER_THRESHOLD = 5
+GATEWAY_BREAKER_RESET = 30
+
+# cached Aramex rate quotes, see orders/rates.py; seconds a quote is kept
+# and the kg the cart weight is rounded up to
+RATE_QUOTE_TIMEOUT = 60 * 60 * 6
+RATE_WEIGHT_STEP = 0.5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,66 @@
+import base64
+import datetime
+import decimal
+
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from products.models import Product
+from .pagination import InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor, paginate
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        date = datetime.datetime(2026, 10, 18, 11, 20, 30, 123456, tzinfo=datetime.timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor('-date', date, 7)),
+                         ('-date', date.isoformat(), 7))
+        self.assertEqual(decode_cursor(encode_cursor('PRDPrice', decimal.Decimal('9.90'), 3)),
+                         ('PRDPrice', '9.90', 3))
+        self.assertEqual(decode_cursor(encode_cursor('PRDPrice', None, 3)), ('PRDPrice', None, 3))
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor('-date', '???>>>', 1)
+        self.assertNotIn('=', cursor)
+        self.assertTrue(set(cursor) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'))
+
+    def test_tampered_cursors(self):
+        for cursor in ['not a cursor', '%%%', encode_cursor('-date', 'x', 1)[:-3],
+                       base64.urlsafe_b64encode(b'["-date","x","one"]').decode(),
+                       base64.urlsafe_b64encode(b'{"a":1}').decode()]:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+class KeysetPaginatorTests(TestCase):
+
+    def setUp(self):
+        # two pairs of equal prices and a NULL, the id breaks the ties
+        for name, price in [('a', 5), ('b', 3), ('c', 5), ('d', None), ('e', 3)]:
+            Product.objects.create(product_name=name, product_description=name, PRDPrice=price)
+        self.queryset = Product.objects.values('id', 'product_name', 'PRDPrice')
+
+    def walk(self, order_by, page_size=2):
+        paginator = KeysetPaginator(self.queryset, order_by, page_size)
+        names, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            names += [row['product_name'] for row in page.data]
+            if not page.has_next:
+                return names
+            cursor = page.next_cursor
+
+    def test_walks_every_row_once_in_order(self):
+        self.assertEqual(self.walk('PRDPrice'), ['d', 'b', 'e', 'a', 'c'])
+        self.assertEqual(self.walk('-PRDPrice'), ['c', 'a', 'e', 'b', 'd'])
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        cursor = KeysetPaginator(self.queryset, 'PRDPrice', 2).page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(self.queryset, '-PRDPrice', 2).page(cursor)
+
+    def test_bad_cursor_starts_over(self):
+        first = KeysetPaginator(self.queryset, 'PRDPrice', 2).page()
+        for cursor in ['garbage', encode_cursor('PRDPrice', 'not a number', 1)]:
+            request = RequestFactory().get('/', {'cursor': cursor})
+            page = paginate(request, self.queryset, 'PRDPrice', 2)
+            self.assertEqual(page.data, first.data)
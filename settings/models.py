@@ -1,5 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from django.db.models.signals import post_save, post_delete
+from project.chrome import invalidate_chrome
 # Create your models here.
 
 
@@ -113,3 +115,9 @@ class HomePageTheme(models.Model):
 
         verbose_name = _("Home Page Theme")
         verbose_name_plural = _("Home Pages Theme ")
+
+
+# the site chrome snapshot (project.chrome) holds these rows
+for chrome_model in (SocailLinks, ContactInfo, SupportNumber, SiteSetting, HomePageTheme):
+    post_save.connect(invalidate_chrome, sender=chrome_model)
+    post_delete.connect(invalidate_chrome, sender=chrome_model)
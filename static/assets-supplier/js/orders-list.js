@@ -14,17 +14,20 @@ window.onload = function () {
 
 
     let visible = 5;
+    let cursor = null;
     const handleGetData = (sorted, sortedStatus) => {
         $.ajax({
             type: "GET",
             url: `/supplier-orders-list-ajax/`,
             data: {
                 "num_products": visible,
+                "cursor": cursor,
                 "order_by": mySelect.value,
                 'order_by_status': selectStatus.value,
             },
             success: function (response) {
                 const data = response.data;
+                cursor = response.next_cursor;
                 console.log(data);
                 const maxSize = response.max
                 emptyBox.classList.add("not-visible")
@@ -103,12 +106,14 @@ window.onload = function () {
     $('.mySelect').on('change', function () {
 
         visible = 5;
+        cursor = null;
         handleGetData(true);
     })
 
     $('.select-status').on('change', function () {
 
         visible = 5;
+        cursor = null;
         handleGetData(true);
     })
 
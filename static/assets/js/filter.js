@@ -12,18 +12,21 @@ window.onload = function () {
 
 
     let visible = 10;
+    let cursor = null;
     const handleGetData = (sorted) => {
         $.ajax({
             type: "GET",
             url: `/shop-ajax/`,
             data: {
                 "num_products": visible,
+                "cursor": cursor,
                 "order_by": mySelect.value,
                 "CAT_id": categoryID,
                 "cat_type": categoryType
             },
             success: function (response) {
                 const data = response.data;
+                cursor = response.next_cursor;
                 //console.log(data);
                 const maxSize = response.max
                 emptyBox.classList.add("not-visible")
@@ -65,8 +68,8 @@ window.onload = function () {
                                         <div class="product-img-action-wrap">
                                             <div class="product-img product-img-zoom">
                                                 <a href="/product-details/${product.PRDSlug}">
-                                                    <img class="default-img" src="/media/${product.product_image}" width="182" height="182" style="width:182px;height:182px;" alt="${product.product_name}" />
-                                                    <img class="hover-img" src="/media/${product.product_image}" width="182" height="182" style="width:182px;height:182px;" alt="${product.product_name}" />
+                                                    <img class="default-img" src="${product.product_image_src}" srcset="${product.product_image_srcset}" sizes="182px" width="182" height="182" style="width:182px;height:182px;" alt="${product.product_name}" />
+                                                    <img class="hover-img" src="${product.product_image_src}" srcset="${product.product_image_srcset}" sizes="182px" width="182" height="182" style="width:182px;height:182px;" alt="${product.product_name}" />
                                                 </a>
                                             </div>
                                             <div class="product-action-1">
@@ -131,6 +134,7 @@ window.onload = function () {
     $('.mySelect').on('change', function () {
 
         visible = 10;
+        cursor = null;
         handleGetData(true);
     })
 
@@ -144,6 +148,7 @@ window.onload = function () {
                 console.log(childern[i].value);
 
                 visible = 10;
+                cursor = null;
                 categoryID = childern[i].value;
                 categoryType = "mini";
                 console.log(childern[i])
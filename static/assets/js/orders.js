@@ -13,15 +13,18 @@ window.onload = function () {
 
 
     let visible = 10;
+    let cursor = null;
     const handleGetOrders = (sorted) => {
         $.ajax({
             type: "GET",
             url: `/orders-ajax/`,
             data: {
                 "num_products": visible,
+                "cursor": cursor,
             },
             success: function (response) {
                 const data = response.data;
+                cursor = response.next_cursor;
 
                 const maxSize = response.max
                 emptyBox.classList.add("not-visible")
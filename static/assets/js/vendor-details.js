@@ -15,17 +15,20 @@ window.onload = function () {
 
 
     let visible = 10;
+    let cursor = null;
     const handleGetVendorDetails = (sorted) => {
         $.ajax({
             type: "GET",
             url: `/vendor-details-ajax/`,
             data: {
                 "num_products": visible,
+                "cursor": cursor,
                 "order_by": mySelect.value,
                 "vendor_slug": vendorSlug,
             },
             success: function (response) {
                 const data = response.data;
+                cursor = response.next_cursor;
 
                 const maxSize = response.max
                 emptyBox.classList.add("not-visible")
@@ -65,8 +68,8 @@ window.onload = function () {
                                 <div class="product-img-action-wrap">
                                     <div class="product-img product-img-zoom">
                                         <a href="/product-details/${product.PRDSlug}">
-                                            <img class="default-img" width="182" height="182" style="width:182px;height:182px;" src="/media/${product.product_image}" alt="${product.product_name}" />
-                                            <img class="hover-img" width="182" height="182" style="width:182px;height:182px;" src="/media/${product.product_image}" alt="${product.product_name}" />
+                                            <img class="default-img" width="182" height="182" style="width:182px;height:182px;" src="${product.product_image_src}" srcset="${product.product_image_srcset}" sizes="182px" alt="${product.product_name}" />
+                                            <img class="hover-img" width="182" height="182" style="width:182px;height:182px;" src="${product.product_image_src}" srcset="${product.product_image_srcset}" sizes="182px" alt="${product.product_name}" />
                                         </a>
                                     </div>
                                     <div class="product-action-1">
@@ -139,6 +142,7 @@ window.onload = function () {
     $('.mySelect').on('change', function () {
 
         visible = 10;
+        cursor = null;
         handleGetVendorDetails(true);
     })
 
@@ -14,15 +14,18 @@ window.onload = function () {
 
 
     let visible = 12;
+    let cursor = null;
     const handleGetVendors = (sorted) => {
         $.ajax({
             type: "GET",
             url: `/vendors-ajax/`,
             data: {
                 "num_vendors": visible,
+                "cursor": cursor,
             },
             success: function (response) {
                 const data = response.data;
+                cursor = response.next_cursor;
 
                 const maxSize = response.max
                 emptyBox.classList.add("not-visible")
@@ -6,13 +6,17 @@ from django.contrib.auth.models import User
 from accounts.models import Profile, BankAccount, SocialLink
 from django.contrib.auth import get_user_model
 from products.models import Product, ProductImage, ProductRating, ProductSize
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from categories.models import SuperCategory, MainCategory, SubCategory, MiniCategory
+from categories.tree import get_tree
 from django.views import View
 from PIL import Image
 from django.http import HttpResponseRedirect
-from orders.models import Order, OrderSupplier,  OrderDetailsSupplier, Payment
+from orders.models import Order, OrderSupplier,  OrderDetailsSupplier, Payment, ArchivedOrderSupplier
+from orders.archive import archived_count, archived_supplier_order, paginate_with_archive
 from .utils import vendor_only
+from project.pagination import paginate, clean_order_by
+from project.counts import product_count, vendor_orders_count
 from django.db.models import Sum
 from datetime import datetime, date, timedelta
 from payments.models import VendorPayments
@@ -421,17 +425,11 @@ def supplier_add_product(request):
             request, 'Your Products Has Been Saved !')
         return redirect('supplier_dashboard:supplier-products-list')
 
-    super_category = SuperCategory.objects.all()
-    super_category_first = SuperCategory.objects.all().first()
-    main_category = MainCategory.objects.all().filter(
-        super_category=super_category_first)
-    main_category_first = MainCategory.objects.all().first()
-    sub_category = SubCategory.objects.all().filter(
-        main_category=main_category_first)
-    sub_category_first = SubCategory.objects.all().first()
-    mini_category = MiniCategory.objects.all().filter(
-        sub_category=sub_category_first
-    )
+    tree = get_tree()
+    super_category = tree.supers
+    main_category = tree.supers[0].children if tree.supers else []
+    sub_category = tree.mains[0].children if tree.mains else []
+    mini_category = tree.subs[0].children if tree.subs else []
     # print(sub_category)
     context = {
         "super_category": super_category,
@@ -444,18 +442,18 @@ def supplier_add_product(request):
 
 class CategoriesJsonListView(View):
     def get(self, *args, **kwargs):
-        super_category = list(SuperCategory.objects.all().values())
+        tree = get_tree()
         super_category_ajax = self.request.GET.get('super_category_ajax')
         main_category_ajax = self.request.GET.get('main_category_ajax')
         sub_category_ajax = self.request.GET.get('sub_category_ajax')
 
-        main_category = list(MainCategory.objects.all().filter(
-            super_category__id=super_category_ajax).values())
-
-        sub_category = list(SubCategory.objects.all().filter(
-            main_category__id=main_category_ajax).values())
-        mini_category = list(MiniCategory.objects.all().filter(
-            sub_category__id=sub_category_ajax).values())
+        super_category = [node.as_dict() for node in tree.supers]
+        main_category = [node.as_dict()
+                         for node in tree.children_of('super', super_category_ajax)]
+        sub_category = [node.as_dict()
+                        for node in tree.children_of('main', main_category_ajax)]
+        mini_category = [node.as_dict()
+                         for node in tree.children_of('sub', sub_category_ajax)]
 
         return JsonResponse({"super_category": super_category, "main_category": main_category, "sub_category": sub_category, "mini_category": mini_category, }, safe=False)
 
@@ -468,37 +466,24 @@ def supplier_products_list(request):
 class SupplierProductsJsonListView(View):
     def get(self, *args, **kwargs):
         user = Profile.objects.get(user=self.request.user)
-        upper = int(self.request.GET.get('num_products'))
-        order_by = self.request.GET.get('order_by')
+        order_by = clean_order_by(
+            self.request.GET.get('order_by'), ('date', 'PRDPrice'), '-date')
         order_by_status = self.request.GET.get('order_by_status')
 
-        lower = upper - 5
-        if order_by_status == "All":
-            products_list = list(Product.objects.all().filter(
-                product_vendor=user, PRDISDeleted=False).values().order_by(order_by)[lower:upper])
-
-            products_size = len(Product.objects.all().filter(
-                product_vendor=user, PRDISDeleted=False))
-
-            max_size = True if upper >= products_size else False
-        elif order_by_status == "Active":
-            products_list = list(Product.objects.all().filter(
-                product_vendor=user, PRDISactive=True, PRDISDeleted=False).values().order_by(order_by)[lower:upper])
-
-            products_size = len(Product.objects.all().filter(
-                product_vendor=user, PRDISactive=True, PRDISDeleted=False))
-
-            max_size = True if upper >= products_size else False
-        else:
-            products_list = list(Product.objects.all().filter(
-                product_vendor=user, PRDISactive=False, PRDISDeleted=False).values().order_by(order_by)[lower:upper])
+        products_list = Product.objects.all().filter(
+            product_vendor=user, PRDISDeleted=False)
+        if order_by_status == "Active":
+            products_list = products_list.filter(PRDISactive=True)
+        elif order_by_status != "All":
+            order_by_status = "Inactive"
+            products_list = products_list.filter(PRDISactive=False)
+        products_size = product_count(
+            products_list, vendor_id=user.id, status=order_by_status)
 
-            products_size = len(Product.objects.all().filter(
-                product_vendor=user, PRDISactive=False, PRDISDeleted=False))
+        page = paginate(self.request, products_list.values(), order_by, 5)
+        max_size = not page.has_next
 
-            max_size = True if upper >= products_size else False
-
-        return JsonResponse({"data": products_list,  "max": max_size, "products_size": products_size, }, safe=False)
+        return JsonResponse({"data": page.data,  "max": max_size, "products_size": products_size, "next_cursor": page.next_cursor, }, safe=False)
 
 
 @vendor_only
@@ -869,58 +854,47 @@ def supplier_orders_list(request):
 class SupplierOrdersJsonListView(View):
     def get(self, *args, **kwargs):
         user = Profile.objects.get(user=self.request.user)
-        upper = int(self.request.GET.get('num_products'))
-        order_by = self.request.GET.get('order_by')
+        order_by = clean_order_by(
+            self.request.GET.get('order_by'), ('order_date', 'amount'), '-order_date')
         order_by_status = self.request.GET.get('order_by_status')
 
-        lower = upper - 5
-        if order_by_status == "All":
-            orders_list = list(OrderSupplier.objects.all().filter(
-                vendor=user, is_finished=True).values().order_by(order_by)[lower:upper])
-
-            orders_size = len(OrderSupplier.objects.all().filter(
-                vendor=user, is_finished=True))
-
-            max_size = True if upper >= orders_size else False
-
-        elif order_by_status == "Underway":
-            orders_list = list(OrderSupplier.objects.all().filter(
-                vendor=user, status="Underway", is_finished=True).values().order_by(order_by)[lower:upper])
-
-            orders_size = len(OrderSupplier.objects.all().filter(
-                vendor=user, status="Underway", is_finished=True))
-
-            max_size = True if upper >= orders_size else False
-
-        elif order_by_status == "COMPLETE":
-            orders_list = list(OrderSupplier.objects.all().filter(
-                vendor=user, status="COMPLETE", is_finished=True).values().order_by(order_by)[lower:upper])
-
-            orders_size = len(OrderSupplier.objects.all().filter(
-                vendor=user, status="COMPLETE", is_finished=True))
-
-            max_size = True if upper >= orders_size else False
-
-        else:
-            orders_list = list(OrderSupplier.objects.all().filter(
-                vendor=user, status="Refunded", is_finished=True).values().order_by(order_by)[lower:upper])
-
-            orders_size = len(OrderSupplier.objects.all().filter(
-                vendor=user, status="Refunded", is_finished=True))
-
-            max_size = True if upper >= orders_size else False
-
-        return JsonResponse({"data": orders_list,  "max": max_size, "orders_size": orders_size, }, safe=False)
+        orders_list = OrderSupplier.objects.all().filter(
+            vendor=user, is_finished=True)
+        archived = ArchivedOrderSupplier.objects.filter(vendor=user, is_finished=True)
+        if order_by_status in ("Underway", "COMPLETE"):
+            orders_list = orders_list.filter(status=order_by_status)
+            archived = archived.filter(status=order_by_status)
+        elif order_by_status != "All":
+            order_by_status = "Refunded"
+            orders_list = orders_list.filter(status="Refunded")
+            archived = archived.filter(status="Refunded")
+        archived = archived.values(
+            'id', 'order_date', 'amount', 'weight', 'is_finished', 'status', 'email_client')
+        orders_size = vendor_orders_count(
+            orders_list, user.id, order_by_status) + archived_count(
+            f'orders:vendor:{user.id}', archived, order_by_status)
+
+        # older orders are read from the archive once these run out
+        page = paginate_with_archive(self.request, orders_list.values(), archived, order_by, 5)
+        max_size = not page.has_next
+
+        return JsonResponse({"data": page.data,  "max": max_size, "orders_size": orders_size, "next_cursor": page.next_cursor, }, safe=False)
 
 
 @vendor_only
 def supplier_orders_detail(request, id):
     user = Profile.objects.get(user=request.user)
-    order_supplier = get_object_or_404(
-        OrderSupplier, id=id, is_finished=True, vendor=user)
-    payment_info = Payment.objects.get(order=order_supplier.order)
-    order_details_supplier = OrderDetailsSupplier.objects.all().filter(
-        order_supplier=order_supplier, supplier=request.user)
+    order_supplier = OrderSupplier.objects.filter(
+        id=id, is_finished=True, vendor=user).first()
+    if order_supplier is not None:
+        payment_info = Payment.objects.get(order=order_supplier.order)
+        order_details_supplier = OrderDetailsSupplier.objects.all().filter(
+            order_supplier=order_supplier, supplier=request.user)
+    else:
+        archived = archived_supplier_order(id, user, request.user)
+        if archived is None:
+            raise Http404
+        order_supplier, order_details_supplier, payment_info = archived
 
     context = {
         "order_supplier": order_supplier,
@@ -6,6 +6,10 @@ from django.http import HttpResponseRedirect
 from accounts.models import Profile ,SocialLink
 from django.views.generic import View
 from products.models import Product 
+from project.pagination import paginate, clean_order_by
+from products.derivatives import add_srcset
+from project.counts import product_count, vendors_count
+from project.pagecache import cache_anonymous_page
 # Create your views here.
 
 
@@ -16,16 +20,15 @@ def supplier_list(request):
 class VendorsJsonListView(View):
     def get(self, *args, **kwargs):
 
-        upper = int(self.request.GET.get("num_vendors"))
-        lower = upper - 12
-        vendors = list(Profile.objects.all(
-        ).filter(status="vendor").values().order_by("-date")[lower:upper])
-        vendors_size = len(
+        vendors = Profile.objects.all().filter(status="vendor").values()
+        page = paginate(self.request, vendors, "-date", 12, offset_param="num_vendors")
+        vendors_size = vendors_count(
             Profile.objects.all().filter(status="vendor"))
-        max_size = True if upper >= vendors_size else False
-        return JsonResponse({"data": vendors,  "max": max_size, "vendors_size": vendors_size, }, safe=False)
+        max_size = not page.has_next
+        return JsonResponse({"data": page.data,  "max": max_size, "vendors_size": vendors_size, "next_cursor": page.next_cursor, }, safe=False)
 
 
+@cache_anonymous_page('vendors')
 def vendor_details(request, slug):
     vendor_detail = Profile.objects.filter( slug=slug).first()
     vendor_social_links = SocialLink.objects.filter( vendor_profile=vendor_detail).first()
@@ -39,14 +42,14 @@ def vendor_details(request, slug):
 class VendorDetailsJsonListView(View):
     def get(self, *args, **kwargs):
 
-        upper = int(self.request.GET.get("num_products"))
-        order_by = self.request.GET.get("order_by")
+        order_by = clean_order_by(
+            self.request.GET.get("order_by"), ("date", "PRDPrice"), "-date")
         product_vendor = int(self.request.GET.get("vendor_slug"))
-        lower = upper - 10
-        products = list(Product.objects.all(
-        ).filter(product_vendor=product_vendor , PRDISDeleted = False , PRDISactive = True).values().order_by(order_by)[lower:upper])
-        products_size = len(
-            Product.objects.all().filter(product_vendor=product_vendor ,PRDISDeleted = False , PRDISactive = True))
-
-        max_size = True if upper >= products_size else False
-        return JsonResponse({"data": products,  "max": max_size, "products_size": products_size, }, safe=False)
+        products = Product.objects.all(
+        ).filter(product_vendor=product_vendor , PRDISDeleted = False , PRDISactive = True)
+        page = paginate(self.request, products.values(), order_by, 10)
+        add_srcset(page.data, 'product_image')
+        products_size = product_count(products, vendor_id=product_vendor)
+
+        max_size = not page.has_next
+        return JsonResponse({"data": page.data,  "max": max_size, "products_size": products_size, "next_cursor": page.next_cursor, }, safe=False)